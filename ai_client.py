@@ -1,30 +1,23 @@
 # ai_client.py - Fixed AI API Integration with Better Model Mapping
 
 import os
-import sqlite3
+import time
+import asyncio
 from dotenv import load_dotenv
 import logging
 
-# Import provider-specific libraries
-try:
-    import openai
-except ImportError:
-    openai = None
-
-try:
-    import anthropic
-except ImportError:
-    anthropic = None
-
-try:
-    import google.generativeai as genai
-except ImportError:
-    genai = None
-
-try:
-    import requests
-except ImportError:
-    requests = None
+from model_catalog import CatalogHolder
+from ai_dispatch import AsyncDispatcher
+from conversation_store import estimate_tokens
+from response_cache import make_key
+from failover import (
+    LatencyTracker, FAILOVER_ENABLED, FAILOVER_MAX_ALTERNATIVES, HEDGE_ENABLED
+)
+from provider_scheduler import (
+    ProviderScheduler, ProviderBusy, retry_after_seconds,
+    PRIORITY_INTERACTIVE, PRIORITY_BULK, RATE_LIMIT_MAX_BACKOFF
+)
+from provider_health import ProviderHealth, ProviderUnavailable, PROVIDER_TIMEOUT
 
 load_dotenv()
 
@@ -32,209 +25,124 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Used when a model has no context_window_max_tokens in the catalog
+DEFAULT_CONTEXT_WINDOW = int(os.getenv("DEFAULT_CONTEXT_WINDOW", "8192"))
+
+# Sampling temperature for every chat call; part of the response cache key
+DEFAULT_TEMPERATURE = 0.7
+
+# Times a rate-limited request is put back in the provider's queue before giving up
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "2"))
+
+# Share of the context window the prompt may use, leaving slack for our token estimates being low
+CONTEXT_WINDOW_HEADROOM = 0.9
+
+SUMMARY_PROMPT = (
+    "Update the running summary of a conversation between a user and an AI assistant. "
+    "Keep facts, decisions, names and open questions; drop small talk. "
+    "Reply with the new summary only, in at most 200 words.\n\n"
+    "Current summary:\n{summary}\n\n"
+    "New turns to fold in:\n{turns}"
+)
+
 class AIClient:
-    def __init__(self, db_path):
+    def __init__(self, db_path, catalog=None, dispatcher=None, cache=None, scheduler=None, health=None):
         self.db_path = db_path
-        self._setup_clients()
-        self._create_model_mapping()
-    
-    def _setup_clients(self):
-        """Initialize API clients for different providers"""
-        self.clients = {}
-        
-        # OpenAI
-        if openai and os.getenv("OPENAI_API_KEY"):
-            self.clients['openai'] = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            logger.info("OpenAI client initialized")
-        
-        # Anthropic
-        if anthropic and os.getenv("ANTHROPIC_API_KEY"):
-            self.clients['anthropic'] = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-            logger.info("Anthropic client initialized")
-        
-        # Google
-        if genai and os.getenv("GOOGLE_API_KEY"):
-            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-            self.clients['google'] = genai
-            logger.info("Google AI client initialized")
-        
-        # DeepSeek (uses OpenAI-compatible API)
-        if openai and os.getenv("DEEPSEEK_API_KEY"):
-            self.clients['deepseek'] = openai.OpenAI(
-                api_key=os.getenv("DEEPSEEK_API_KEY"),
-                base_url="https://api.deepseek.com/v1"
-            )
-            logger.info("DeepSeek client initialized")
-        
-        # Together.ai (for Meta/Llama models)
-        if openai and os.getenv("TOGETHER_API_KEY"):
-            self.clients['together'] = openai.OpenAI(
-                api_key=os.getenv("TOGETHER_API_KEY"),
-                base_url="https://api.together.xyz/v1"
-            )
-            logger.info("Together.ai client initialized")
-    
-    def _create_model_mapping(self):
-        """Create mapping from frontend display names to database model names"""
-        self.display_name_mapping = {
-            # Google/Gemini models
-            'Gemini 2.5 Flash': 'Gemini 2.5 Flash Preview 05-20',
-            'Gemini 2.5 Pro': 'Gemini 2.5 Pro Preview',
-            'Gemini 2.0 Flash': 'Gemini 2.0 Flash',
-            'Gemini 1.5 Flash': 'Gemini 1.5 Flash',
-            'Gemini 1.5 Pro': 'Gemini 1.5 Pro',
-            
-            # Anthropic/Claude models
-            'Claude 4 Sonnet': 'Claude Sonnet 4',
-            'Claude Sonnet 4': 'Claude Sonnet 4',
-            'Claude 3.5 Sonnet': 'Claude Sonnet 3.5',
-            'Claude 3 Opus': 'Claude 3 Opus',
-            'Claude 3 Haiku': 'Claude 3 Haiku',
-            
-            # OpenAI models
-            'GPT-4o': 'gpt-4o',
-            'GPT-4o Mini': 'gpt-4o-mini',
-            'o1-mini': 'o1-mini',
-            'o3-mini': 'o3-mini',
-            
-            # DeepSeek models
-            'DeepSeek R1': 'DeepSeek-R1',
-            'DeepSeek Coder': 'deepseek-reasoner',
-            'DeepSeek Coder V2': 'deepseek-reasoner',
-            
-            # Meta/Llama models
-            'Llama 4 Scout': 'Llama-4-Scout-17B-16E-Instruct',
-            'Llama 3.1 70B': 'Llama-3.1-70B-Instruct-Turbo',
-            
-            # Default fallback
-            'Gemini 2.5 Flash': 'Gemini 2.0 Flash',  # Fallback if 2.5 not available
-        }
+        self.catalog = catalog or CatalogHolder(db_path)
+        # Provider calls run on the dispatcher's event loop; its async clients are keyed like _get_provider_key
+        self.dispatcher = dispatcher or AsyncDispatcher()
+        self.clients = self.dispatcher.clients
+        # Optional ResponseCache; identical conversations sent to the same model are answered from it
+        self.cache = cache
+        # Rate limits and queueing per provider key; only used on the dispatcher's loop
+        self.scheduler = scheduler or ProviderScheduler()
+        # Recent latencies per model, for hedging to an equivalent model when a provider is slow
+        self.latency = LatencyTracker()
+        # Error/timeout rates per provider key; a failing provider is skipped until a probe finds it answering
+        self.health = health or ProviderHealth(probe=self._probe, name='ai')
     
     def _resolve_model_name(self, frontend_model_name):
         """Resolve frontend model name to database model name"""
-        # First try direct mapping
-        if frontend_model_name in self.display_name_mapping:
-            db_model_name = self.display_name_mapping[frontend_model_name]
-        else:
-            db_model_name = frontend_model_name
-        
-        # Check if the model exists in database
-        model_info = self._get_model_info(db_model_name)
+        model_info = self.catalog.current.resolve(frontend_model_name)
         if model_info:
-            return db_model_name
-        
-        # Try fuzzy matching for partial names
-        try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            
-            # Try pattern matching
-            model_info = conn.execute(
-                'SELECT * FROM llm_models WHERE model_name LIKE ? AND is_active = 1 LIMIT 1', 
-                (f'%{frontend_model_name}%',)
-            ).fetchone()
-            
-            if model_info:
-                conn.close()
-                return model_info['model_name']
-            
-            # Try case-insensitive exact match
-            model_info = conn.execute(
-                'SELECT * FROM llm_models WHERE LOWER(model_name) = LOWER(?) AND is_active = 1 LIMIT 1', 
-                (frontend_model_name,)
-            ).fetchone()
-            
-            conn.close()
-            
-            if model_info:
-                return model_info['model_name']
-                
-        except Exception as e:
-            logger.error(f"Error resolving model name: {e}")
+            return model_info['model_name']
         
         # Return original name if no resolution found
         return frontend_model_name
     
     def _get_model_info(self, model_name):
-        """Get model information from database - searches across all model tables"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            
-            # Check all model tables
-            tables = ['llm_models', 'image_models', 'audio_models', 'video_models']
-            
-            for table in tables:
-                try:
-                    model_info = conn.execute(
-                        f'SELECT * FROM {table} WHERE model_name = ? AND is_active = 1', 
-                        (model_name,)
-                    ).fetchone()
-                    
-                    if model_info:
-                        conn.close()
-                        return dict(model_info)
-                        
-                except sqlite3.OperationalError:
-                    # Table doesn't exist, continue to next
-                    continue
-            
-            conn.close()
-            return None
-            
-        except Exception as e:
-            logger.error(f"Error getting model info: {e}")
-            return None
+        """Get model information from the catalog snapshot - searches across all model types"""
+        return self.catalog.current.get(model_name)
     
-    def _call_openai_api(self, client, model_name, message, max_tokens=1000):
-        """Call OpenAI or OpenAI-compatible APIs"""
-        try:
-            # Use the api_name if available, otherwise use model_name
-            model_info = self._get_model_info(model_name)
-            api_name = model_info.get('api_name') if model_info else model_name
-            
-            response = client.chat.completions.create(
-                model=api_name,
-                messages=[{"role": "user", "content": message}],
-                max_tokens=max_tokens,
-                temperature=0.7
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            logger.error(f"OpenAI API error: {e}")
-            raise
+    def _get_api_name(self, model_name):
+        """Use the api_name if available, otherwise use model_name"""
+        model_info = self._get_model_info(model_name)
+        return (model_info.get('api_name') if model_info else None) or model_name
     
-    def _call_anthropic_api(self, client, model_name, message, max_tokens=1000):
-        """Call Anthropic Claude API"""
-        try:
-            # Use the api_name if available, otherwise use model_name
-            model_info = self._get_model_info(model_name)
-            api_name = model_info.get('api_name') if model_info else model_name
-            
-            response = client.messages.create(
-                model=api_name,
-                messages=[{"role": "user", "content": message}],
-                max_tokens=max_tokens,
-                temperature=0.7
-            )
-            return response.content[0].text.strip()
-        except Exception as e:
-            logger.error(f"Anthropic API error: {e}")
-            raise
+    def _build_messages(self, message, history=None, summary=None):
+        """
+        Build the provider message list for a prompt
+        
+        Args:
+            message: The user's new message
+            history: Earlier turns as [{'role': 'user'|'assistant', 'content': ...}], oldest first
+            summary: Rolling summary of turns older than history, sent ahead of them
+        """
+        turns = list(history or [])
+        if summary:
+            turns.insert(0, {"role": "user", "content": f"Summary of our conversation so far:\n{summary}"})
+        
+        messages = []
+        for turn in turns + [{"role": "user", "content": message}]:
+            # Providers want alternating turns that start with the user
+            if not messages and turn['role'] != 'user':
+                continue
+            if messages and messages[-1]['role'] == turn['role']:
+                messages[-1] = {"role": turn['role'], "content": messages[-1]['content'] + "\n\n" + turn['content']}
+            else:
+                messages.append({"role": turn['role'], "content": turn['content']})
+        return messages
     
-    def _call_google_api(self, genai_module, model_name, message):
-        """Call Google Gemini API"""
-        try:
-            # Use the api_name if available, otherwise use model_name
-            model_info = self._get_model_info(model_name)
-            api_name = model_info.get('api_name') if model_info else model_name
-            
-            model = genai_module.GenerativeModel(api_name)
-            response = model.generate_content(message)
-            return response.text.strip()
-        except Exception as e:
-            logger.error(f"Google API error: {e}")
-            raise
+    def _pack_history(self, model_name, message, history=None, max_tokens=1000, summary=None):
+        """
+        Keep the newest turns of history that fit the model's context window
+        
+        The budget is the model's context_window_max_tokens (with some headroom)
+        minus the reply's max_tokens, the new message and the summary. Turns are
+        taken newest first using their cached 'tokens' estimate and packing stops
+        at the first one that doesn't fit, so the kept turns stay contiguous.
+        
+        Returns:
+            tuple: (kept history, oldest first; number of older turns dropped)
+        
+        Raises:
+            ValueError: if the new message alone doesn't fit the context window
+        """
+        model_info = self._get_model_info(model_name)
+        context_window = (model_info.get('context_window_max_tokens') if model_info else None) or DEFAULT_CONTEXT_WINDOW
+        
+        budget = int(context_window * CONTEXT_WINDOW_HEADROOM) - max_tokens - estimate_tokens(message)
+        if budget < 0:
+            raise ValueError(
+                f"Message is too long for {model_name}: it has room for about "
+                f"{int(context_window * CONTEXT_WINDOW_HEADROOM) - max_tokens} prompt tokens."
+            )
+        if summary:
+            budget -= estimate_tokens(summary)
+        
+        history = history or []
+        kept = 0
+        for turn in reversed(history):
+            cost = turn.get('tokens') or estimate_tokens(turn['content'])
+            if cost > budget:
+                break
+            budget -= cost
+            kept += 1
+        
+        dropped = len(history) - kept
+        if dropped:
+            logger.info(f"Dropped {dropped} of {len(history)} history turns to fit {model_name}'s context window")
+        return history[dropped:], dropped
     
     def _get_provider_key(self, provider_name):
         """Map provider names to client keys"""
@@ -265,17 +173,12 @@ class AIClient:
         }
         return provider_map.get(provider_name, provider_name.lower())
     
-    def generate_response(self, frontend_model_name, message, max_tokens=1000):
+    def _select_model(self, frontend_model_name):
         """
-        Generate a response using the specified model
+        Resolve a frontend model name to the model and provider client that will serve it
         
-        Args:
-            frontend_model_name: The display name of the model from frontend
-            message: The user's message
-            max_tokens: Maximum tokens in response
-            
         Returns:
-            str: The AI's response
+            tuple: (model_name, provider_name, provider_key)
         """
         # Resolve frontend model name to database model name
         model_name = self._resolve_model_name(frontend_model_name)
@@ -309,74 +212,564 @@ class AIClient:
         if provider_key not in self.clients:
             raise ValueError(f"No API client configured for provider '{provider_name}'. Please check your environment variables.")
         
+        return model_name, provider_name, provider_key
+    
+    def _cache_key(self, model_name, messages, max_tokens):
+        """Response cache key for a call, or None if this model's responses aren't cached"""
+        if not self.cache or not self.cache.is_cacheable(model_name):
+            return None
+        return make_key('chat', model_name, messages, max_tokens=max_tokens, temperature=DEFAULT_TEMPERATURE)
+    
+    def _format_provider_error(self, provider_name, model_name, error):
+        """Turn a provider exception into a helpful message for the chat window"""
+        if isinstance(error, ProviderBusy):
+            return f"⚠️ {provider_name} is at capacity right now. Please try again in a moment."
+        if isinstance(error, ProviderUnavailable):
+            return f"⚠️ {provider_name} is having problems right now. Please try a different model or try again later."
+        if isinstance(error, asyncio.TimeoutError):
+            return f"⚠️ {provider_name} took too long to respond. Please try a different model or try again later."
+        if retry_after_seconds(error) is not None:
+            return f"⚠️ Rate limit exceeded for {provider_name}. Please try again in a moment."
+        error_msg = str(error)
+        if "401" in error_msg or "authentication" in error_msg.lower():
+            return f"⚠️ Authentication error with {provider_name}. Please check your API key configuration."
+        elif "403" in error_msg or "forbidden" in error_msg.lower():
+            return f"⚠️ Access denied to {provider_name}. You may need to upgrade your API plan."
+        elif "429" in error_msg or "rate limit" in error_msg.lower():
+            return f"⚠️ Rate limit exceeded for {provider_name}. Please try again in a moment."
+        elif "model" in error_msg.lower() and "not found" in error_msg.lower():
+            return f"⚠️ Model '{model_name}' not available with {provider_name}. Please try a different model."
+        else:
+            return f"⚠️ Error with {provider_name}: {error_msg}. Please try a different model or check your configuration."
+    
+    def _should_retry(self, provider_key, error, attempt, deadline):
+        """Pause a provider that rate limited us; True if the request should queue again"""
+        wait = retry_after_seconds(error)
+        if wait is None:
+            return False
+        self.scheduler.backoff(provider_key, min(wait, RATE_LIMIT_MAX_BACKOFF))
+        # Not worth queueing again if the provider's pause outlasts the request's deadline
+        return attempt < RATE_LIMIT_RETRIES and time.monotonic() + wait < deadline
+    
+    async def _complete(self, provider_key, api_name, messages, max_tokens, priority, deadline):
+        """
+        dispatcher.complete() inside a scheduler slot, re-queued after a 429;
+        fails fast with ProviderUnavailable while the provider's circuit is open
+        """
+        attempt = 0
+        while True:
+            self.health.check(provider_key)
+            await self.scheduler.acquire(provider_key, priority, deadline)
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(
+                    self.dispatcher.complete(provider_key, api_name, messages, max_tokens, DEFAULT_TEMPERATURE),
+                    PROVIDER_TIMEOUT
+                )
+                self.health.record_success(provider_key, time.monotonic() - started)
+                return result
+            except Exception as e:
+                self.health.record_failure(provider_key, e)
+                if not self._should_retry(provider_key, e, attempt, deadline):
+                    raise
+            finally:
+                self.scheduler.release(provider_key)
+            attempt += 1
+    
+    async def _stream(self, provider_key, api_name, messages, max_tokens, priority, deadline):
+        """
+        dispatcher.stream() holding a scheduler slot until it ends; re-queued
+        after a 429 before any text. The first event must arrive within
+        PROVIDER_TIMEOUT, and its latency is what the provider's health records.
+        """
+        attempt = 0
+        while True:
+            self.health.check(provider_key)
+            await self.scheduler.acquire(provider_key, priority, deadline)
+            events = self.dispatcher.stream(provider_key, api_name, messages, max_tokens, DEFAULT_TEMPERATURE)
+            started = time.monotonic()
+            sent = False
+            try:
+                try:
+                    first_event = await asyncio.wait_for(events.__anext__(), PROVIDER_TIMEOUT)
+                except StopAsyncIteration:
+                    self.health.record_success(provider_key, time.monotonic() - started)
+                    return
+                self.health.record_success(provider_key, time.monotonic() - started)
+                sent = True
+                yield first_event
+                async for event in events:
+                    yield event
+                return
+            except Exception as e:
+                self.health.record_failure(provider_key, e)
+                if not self._should_retry(provider_key, e, attempt, deadline) or sent:
+                    raise
+            finally:
+                await events.aclose()
+                self.scheduler.release(provider_key)
+            attempt += 1
+    
+    def _prepare_call(self, model_name, provider_name, provider_key, message, history, max_tokens, summary):
+        """Everything needed to send one request to one model; raises ValueError if it can't fit"""
+        packed, dropped = self._pack_history(model_name, message, history, max_tokens, summary)
+        messages = self._build_messages(message, packed, summary)
+        return {
+            'model_name': model_name,
+            'provider_name': provider_name,
+            'provider_key': provider_key,
+            'api_name': self._get_api_name(model_name),
+            'messages': messages,
+            'history_dropped': dropped,
+            'cache_key': self._cache_key(model_name, messages, max_tokens)
+        }
+    
+    def _plan_calls(self, model_name, provider_name, provider_key, message, history, max_tokens, summary, failover=True):
+        """
+        The requested model's call, then calls to equivalent models on other
+        providers to fail over or hedge to, most preferred first
+        """
+        calls = [self._prepare_call(model_name, provider_name, provider_key, message, history, max_tokens, summary)]
+        if not failover or not FAILOVER_ENABLED:
+            return calls
+        
+        used_providers = {provider_key}
+        for model in self.catalog.current.alternatives(model_name):
+            if len(calls) > FAILOVER_MAX_ALTERNATIVES:
+                break
+            alt_provider_key = self._get_provider_key(model['provider_name'])
+            # A second model on a provider that's failing is unlikely to do better
+            if alt_provider_key in used_providers or alt_provider_key not in self.clients:
+                continue
+            if not self.health.is_available(alt_provider_key):
+                continue
+            try:
+                calls.append(self._prepare_call(
+                    model['model_name'], model['provider_name'], alt_provider_key,
+                    message, history, max_tokens, summary
+                ))
+            except ValueError:
+                continue  # Message too long for this model's context window
+            used_providers.add(alt_provider_key)
+        return calls
+    
+    async def _complete_call(self, call, max_tokens, priority, deadline):
+        started = time.monotonic()
+        result = await self._complete(call['provider_key'], call['api_name'], call['messages'], max_tokens, priority, deadline)
+        self.latency.observe('complete', call['model_name'], time.monotonic() - started)
+        return result
+    
+    async def _race(self, calls, max_tokens, priority, deadline, hedge):
+        """
+        Run calls[0], moving on to the next call when one fails (failover) and,
+        if hedge is set, also starting the next call when the running ones are
+        slower than the first model's p95 (hedging). The first success wins and
+        the rest are cancelled.
+        
+        Returns:
+            tuple: (call, provider result)
+        """
+        waiting = list(calls)
+        running = {}
+        first_error = None
+        hedge_delay = self.latency.hedge_delay('complete', calls[0]['model_name'])
+        
+        def start_next():
+            call = waiting.pop(0)
+            running[asyncio.ensure_future(self._complete_call(call, max_tokens, priority, deadline))] = call
+        
+        start_next()
         try:
-            # Route to appropriate API based on provider
-            if provider_key == 'openai':
-                return self._call_openai_api(self.clients['openai'], model_name, message, max_tokens)
-            
-            elif provider_key == 'anthropic':
-                return self._call_anthropic_api(self.clients['anthropic'], model_name, message, max_tokens)
-            
-            elif provider_key == 'google':
-                return self._call_google_api(self.clients['google'], model_name, message)
-            
-            elif provider_key == 'deepseek':
-                return self._call_openai_api(self.clients['deepseek'], model_name, message, max_tokens)
-            
-            elif provider_key == 'together':
-                return self._call_openai_api(self.clients['together'], model_name, message, max_tokens)
+            while running:
+                timeout = hedge_delay if hedge and waiting else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"Hedging {calls[0]['model_name']} after {hedge_delay:.1f}s with {waiting[0]['model_name']}")
+                    start_next()
+                    continue
+                for task in done:
+                    call = running.pop(task)
+                    if task.exception() is None:
+                        return call, task.result()
+                    logger.warning(f"{call['model_name']} on {call['provider_name']} failed: {task.exception()}")
+                    first_error = first_error or task.exception()
+                if not running and waiting:
+                    logger.info(f"Failing over to {waiting[0]['model_name']} on {waiting[0]['provider_name']}")
+                    start_next()
+            raise first_error
+        finally:
+            for task in running:
+                task.cancel()
+    
+    async def agenerate(self, frontend_model_name, message, max_tokens=1000, history=None, summary=None,
+                        priority=PRIORITY_INTERACTIVE, deadline=None, failover=True):
+        """
+        Generate a response on the dispatcher's event loop
+        
+        Args:
+            frontend_model_name: The display name of the model from frontend
+            message: The user's message
+            max_tokens: Maximum tokens in response
+            history: Earlier turns of the conversation, oldest first; trimmed to the model's context window
+            summary: Rolling summary of the conversation before history
+            priority: PRIORITY_INTERACTIVE, or PRIORITY_BULK to yield to chat requests when the provider is saturated
+            deadline: time.monotonic() by which the provider call must start; defaults to the scheduler's queue timeout
+            failover: Let an equivalent model on another provider answer if this one fails or,
+                      for interactive requests, is unusually slow
             
-            else:
-                raise ValueError(f"No handler implemented for provider '{provider_name}'")
-                
+        Returns:
+            dict: {'response', 'model', 'provider', 'usage', 'error', 'history_dropped', 'cached'}
+                  where 'response' is a helpful warning message if the provider call
+                  failed, 'model' is the model that actually answered, 'history_dropped'
+                  counts the oldest turns left out and 'cached' is True when the
+                  response came from the response cache
+        """
+        model_name, provider_name, provider_key = self._select_model(frontend_model_name)
+        calls = self._plan_calls(model_name, provider_name, provider_key, message, history, max_tokens, summary, failover)
+        primary = calls[0]
+        
+        if primary['cache_key']:
+            cached = await self.dispatcher.run_in_executor(self.cache.get, primary['cache_key'])
+            if cached:
+                return {
+                    'response': cached['response'],
+                    'model': model_name,
+                    'provider': provider_name,
+                    'usage': None,  # Nothing was spent on the provider
+                    'error': False,
+                    'history_dropped': primary['history_dropped'],
+                    'cached': True
+                }
+        
+        if deadline is None:
+            deadline = time.monotonic() + self.scheduler.queue_timeout
+        hedge = HEDGE_ENABLED and priority == PRIORITY_INTERACTIVE
+        try:
+            call, result = await self._race(calls, max_tokens, priority, deadline, hedge)
         except Exception as e:
             logger.error(f"Error generating response with {provider_name}: {e}")
             # Return a helpful error message instead of crashing
-            error_msg = str(e)
-            if "401" in error_msg or "authentication" in error_msg.lower():
-                return f"⚠️ Authentication error with {provider_name}. Please check your API key configuration."
-            elif "403" in error_msg or "forbidden" in error_msg.lower():
-                return f"⚠️ Access denied to {provider_name}. You may need to upgrade your API plan."
-            elif "429" in error_msg or "rate limit" in error_msg.lower():
-                return f"⚠️ Rate limit exceeded for {provider_name}. Please try again in a moment."
-            elif "model" in error_msg.lower() and "not found" in error_msg.lower():
-                return f"⚠️ Model '{model_name}' not available with {provider_name}. Please try a different model."
-            else:
-                return f"⚠️ Error with {provider_name}: {error_msg}. Please try a different model or check your configuration."
+            return {
+                'response': self._format_provider_error(provider_name, model_name, e),
+                'model': model_name,
+                'provider': provider_name,
+                'usage': None,
+                'error': True,
+                'history_dropped': primary['history_dropped'],
+                'cached': False
+            }
+        
+        if call is not primary:
+            logger.info(f"{model_name} request answered by {call['model_name']} on {call['provider_name']}")
+        if call['cache_key']:
+            await self.dispatcher.run_in_executor(self.cache.put, call['cache_key'], call['model_name'], {'response': result['text']})
+        
+        return {
+            'response': result['text'],
+            'model': call['model_name'],
+            'provider': call['provider_name'],
+            'usage': result['usage'],
+            'error': False,
+            'history_dropped': call['history_dropped'],
+            'cached': False
+        }
     
-    def get_available_models(self):
-        """Get list of available models that have configured API clients"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            
-            available = []
+    async def agenerate_response(self, frontend_model_name, message, max_tokens=1000, history=None):
+        """Async version of generate_response"""
+        result = await self.agenerate(frontend_model_name, message, max_tokens, history)
+        return result['response']
+    
+    def generate(self, frontend_model_name, message, max_tokens=1000, history=None, summary=None):
+        """Sync facade over agenerate: returns the full result record, including usage"""
+        return self.dispatcher.run(self.agenerate(frontend_model_name, message, max_tokens, history, summary))
+    
+    def generate_response(self, frontend_model_name, message, max_tokens=1000, history=None):
+        """
+        Generate a response using the specified model
+        
+        Sync facade over agenerate_response for Flask views: the provider call
+        itself runs on the dispatcher's event loop.
+        
+        Args:
+            frontend_model_name: The display name of the model from frontend
+            message: The user's message
+            max_tokens: Maximum tokens in response
+            history: Earlier turns of the conversation, oldest first
             
-            # Check all model tables (focusing on LLM models for chat)
-            tables = ['llm_models', 'image_models', 'audio_models', 'video_models']
+        Returns:
+            str: The AI's response
+        """
+        return self.dispatcher.run(self.agenerate_response(frontend_model_name, message, max_tokens, history))
+    
+    def stream_response(self, frontend_model_name, message, max_tokens=1000, history=None, summary=None):
+        """
+        Stream a response using the specified model
+        
+        Args:
+            frontend_model_name: The display name of the model from frontend
+            message: The user's message
+            max_tokens: Maximum tokens in response
+            history: Earlier turns of the conversation, oldest first; trimmed to the model's context window
+            summary: Rolling summary of the conversation before history
             
-            for table in tables:
-                try:
-                    models = conn.execute(
-                        f'SELECT model_name, provider_name FROM {table} WHERE is_active = 1'
-                    ).fetchall()
-                    
-                    for model in models:
-                        provider_key = self._get_provider_key(model['provider_name'])
-                        if provider_key in self.clients:
-                            available.append({
-                                'model_name': model['model_name'],
-                                'provider_name': model['provider_name'],
-                                'table': table
-                            })
-                            
-                except sqlite3.OperationalError:
-                    # Table doesn't exist, continue to next
+        Returns:
+            generator of dicts: {'type': 'token', 'text': ...} for each chunk as the
+            provider emits it, then one {'type': 'done', ...} record with the full
+            response, usage, 'history_dropped' and the 'model' that answered (an
+            equivalent model if the requested one failed or was slow to start), or
+            {'type': 'error', 'error': ...} if every provider call fails. Model
+            resolution errors and oversized messages raise ValueError before streaming starts.
+        """
+        model_name, provider_name, provider_key = self._select_model(frontend_model_name)
+        calls = self._plan_calls(model_name, provider_name, provider_key, message, history, max_tokens, summary)
+        primary = calls[0]
+        
+        if primary['cache_key']:
+            cached = self.cache.get(primary['cache_key'])
+            if cached:
+                return self._replay_cached(cached['response'], model_name, provider_name, primary['history_dropped'])
+        
+        events = self._race_stream(calls, max_tokens, time.monotonic() + self.scheduler.queue_timeout, HEDGE_ENABLED)
+        return self._relay_stream(
+            self.dispatcher.iterate(events), model_name, provider_name, primary['history_dropped'], primary['cache_key']
+        )
+    
+    async def _race_stream(self, calls, max_tokens, deadline, hedge):
+        """
+        Streaming counterpart of _race. Calls race to their first event, hedged
+        on the first model's p95 time to first token; the winner is announced
+        with one {'served_by': call} event and then relayed. Once the winner has
+        started sending text there is no failing over.
+        """
+        waiting = list(calls)
+        running = {}  # first-event task -> (call, event stream, started)
+        first_error = None
+        hedge_delay = self.latency.hedge_delay('first_token', calls[0]['model_name'])
+        
+        def start_next():
+            call = waiting.pop(0)
+            events = self._stream(
+                call['provider_key'], call['api_name'], call['messages'], max_tokens, PRIORITY_INTERACTIVE, deadline
+            )
+            running[asyncio.ensure_future(events.__anext__())] = (call, events, time.monotonic())
+        
+        async def discard(task, events):
+            task.cancel()
+            try:
+                await task
+            except (Exception, asyncio.CancelledError):
+                pass
+            await events.aclose()
+        
+        winner = None
+        start_next()
+        try:
+            while running and winner is None:
+                timeout = hedge_delay if hedge and waiting else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"Hedging {calls[0]['model_name']} after {hedge_delay:.1f}s with {waiting[0]['model_name']}")
+                    start_next()
                     continue
+                for task in done:
+                    call, events, started = running.pop(task)
+                    if task.exception() is not None:
+                        logger.warning(f"{call['model_name']} on {call['provider_name']} failed: {task.exception()}")
+                        first_error = first_error or task.exception()
+                    elif winner is None:
+                        self.latency.observe('first_token', call['model_name'], time.monotonic() - started)
+                        winner = (call, events, task.result())
+                    else:
+                        await events.aclose()
+                if winner is None and not running and waiting:
+                    logger.info(f"Failing over to {waiting[0]['model_name']} on {waiting[0]['provider_name']}")
+                    start_next()
+        finally:
+            for task, (_, events, _) in list(running.items()):
+                await discard(task, events)
+        
+        if winner is None:
+            raise first_error
+        
+        call, events, first_event = winner
+        try:
+            yield {'served_by': call}
+            yield first_event
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+    
+    async def abroadcast(self, frontend_model_names, message, max_tokens=1000, deadline=60):
+        """
+        Send one prompt to several models concurrently and yield each result as it finishes
+        
+        Args:
+            frontend_model_names: Display names of the models from frontend
+            message: The user's message
+            max_tokens: Maximum tokens in each response
+            deadline: Seconds to wait for the whole broadcast; models still running are cancelled
+            
+        Yields:
+            dict: agenerate() records plus 'requested_model', 'latency_ms' and 'timed_out',
+                  fastest model first
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        
+        async def timed_generate(frontend_model_name):
+            call_started = loop.time()
+            try:
+                # One user fanning out to many models shouldn't crowd out everyone else's chats
+                # Each model was picked to be compared, so no stand-ins
+                result = await self.agenerate(
+                    frontend_model_name, message, max_tokens,
+                    priority=PRIORITY_BULK, deadline=time.monotonic() + deadline, failover=False
+                )
+            except ValueError as e:
+                result = {'response': f"⚠️ {e}", 'model': frontend_model_name, 'provider': None, 'usage': None, 'error': True}
+            result['requested_model'] = frontend_model_name
+            result['latency_ms'] = round((loop.time() - call_started) * 1000)
+            result['timed_out'] = False
+            return result
+        
+        tasks = {asyncio.ensure_future(timed_generate(name)): name for name in frontend_model_names}
+        pending = set(tasks)
+        try:
+            while pending:
+                remaining = started + deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
             
-            conn.close()
-            return available
+            # Anything left missed the deadline
+            for task in pending:
+                task.cancel()
+                yield {
+                    'response': f"⚠️ {tasks[task]} did not answer within {deadline} seconds.",
+                    'model': tasks[task],
+                    'provider': None,
+                    'usage': None,
+                    'error': True,
+                    'requested_model': tasks[task],
+                    'latency_ms': round(deadline * 1000),
+                    'timed_out': True
+                }
+        finally:
+            # Also cancel stragglers if the caller stops listening early
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    def broadcast(self, frontend_model_names, message, max_tokens=1000, deadline=60):
+        """Sync facade over abroadcast: yields each model's result as it finishes"""
+        return self.dispatcher.iterate(self.abroadcast(frontend_model_names, message, max_tokens, deadline))
+    
+    async def asummarize(self, frontend_model_name, summary, messages, max_tokens=400):
+        """
+        Fold older chat messages into a conversation's rolling summary
+        
+        Args:
+            frontend_model_name: Model that writes the summary
+            summary: The current summary, or None
+            messages: ConversationStore message rows to fold in, oldest first
             
+        Returns:
+            str: The new summary, or None if the model call failed
+        """
+        turns = "\n".join(
+            f"{'User' if m['sender_type'] == 'user' else 'Assistant'}: {m['message_text']}"
+            for m in messages
+        )
+        prompt = SUMMARY_PROMPT.format(summary=summary or "(none yet)", turns=turns)
+        result = await self.agenerate(frontend_model_name, prompt, max_tokens, priority=PRIORITY_BULK)
+        if result['error']:
+            logger.warning(f"Could not update conversation summary: {result['response']}")
+            return None
+        return result['response']
+    
+    def _replay_cached(self, response, model_name, provider_name, history_dropped=0):
+        """Serve a cached response in the same event shape as a live stream"""
+        yield {'type': 'token', 'text': response}
+        yield {
+            'type': 'done',
+            'response': response,
+            'model': model_name,
+            'provider': provider_name,
+            'usage': None,
+            'history_dropped': history_dropped,
+            'cached': True
+        }
+    
+    def _relay_stream(self, stream, model_name, provider_name, history_dropped=0, cache_key=None):
+        """Forward provider stream events as chat events and finish with a summary record"""
+        chunks = []
+        usage = None
+        try:
+            for event in stream:
+                if 'served_by' in event:
+                    # Failover or a hedge may have handed the request to an equivalent model
+                    call = event['served_by']
+                    if call['model_name'] != model_name:
+                        logger.info(f"{model_name} stream answered by {call['model_name']} on {call['provider_name']}")
+                    model_name, provider_name = call['model_name'], call['provider_name']
+                    history_dropped, cache_key = call['history_dropped'], call['cache_key']
+                elif 'token' in event:
+                    chunks.append(event['token'])
+                    yield {'type': 'token', 'text': event['token']}
+                else:
+                    usage = event['usage']
         except Exception as e:
-            logger.error(f"Error getting available models: {e}")
-            return []
\ No newline at end of file
+            logger.error(f"Error streaming response with {provider_name}: {e}")
+            yield {'type': 'error', 'error': self._format_provider_error(provider_name, model_name, e)}
+            return
+        
+        response = ''.join(chunks).strip()
+        if cache_key:
+            self.cache.put(cache_key, model_name, {'response': response})
+        
+        yield {
+            'type': 'done',
+            'response': response,
+            'model': model_name,
+            'provider': provider_name,
+            'usage': usage,
+            'history_dropped': history_dropped,
+            'cached': False
+        }
+    
+    def get_latency_stats(self):
+        """p50/p95 latency and current hedge delay per model"""
+        return self.latency.stats()
+    
+    def get_health_stats(self):
+        """Circuit state, error/timeout rates and latency percentiles per provider"""
+        return self.health.stats()
+    
+    def _probe(self, provider_key):
+        """Health probe for an open circuit; runs on the health monitor's thread"""
+        self.dispatcher.run(asyncio.wait_for(self.dispatcher.probe(provider_key), PROVIDER_TIMEOUT))
+    
+    def get_scheduler_stats(self):
+        """Per-provider queue and rate-limit state, read on the dispatcher's loop"""
+        async def read_stats():
+            return self.scheduler.stats()
+        return self.dispatcher.run(read_stats())
+    
+    def get_available_models(self):
+        """Get list of available models that have configured API clients whose providers are answering"""
+        available = []
+        
+        for model in self.catalog.current.all_models():
+            provider_key = self._get_provider_key(model['provider_name'])
+            if provider_key in self.clients and self.health.is_available(provider_key):
+                available.append({
+                    'model_name': model['model_name'],
+                    'provider_name': model['provider_name'],
+                    'model_type': model['model_type'],
+                    'table': model['table']
+                })
+        
+        return available
@@ -0,0 +1,321 @@
+# ai_dispatch.py - Async provider dispatch for AIClient
+
+import os
+import asyncio
+import threading
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from provider_sdks import LazyClients, sdk_available, import_sdk
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Gemini's SDK is synchronous, so its calls run on this many executor threads
+DEFAULT_EXECUTOR_WORKERS = int(os.getenv("AI_DISPATCH_EXECUTOR_WORKERS", "32"))
+
+_STREAM_DONE = object()
+
+
+class AsyncDispatcher:
+    """
+    Runs provider calls on one background asyncio event loop.
+
+    The OpenAI-compatible (OpenAI, DeepSeek, Together.ai) and Anthropic calls use
+    the SDKs' async clients, so a single process can keep hundreds of slow LLM
+    calls in flight without tying up a thread per call. Gemini only has a
+    synchronous SDK and runs on a bounded thread pool instead.
+
+    Sync code (Flask views) uses run() / iterate(); async code awaits
+    complete() / stream() directly on the dispatcher's loop.
+    """
+
+    def __init__(self, executor_workers=DEFAULT_EXECUTOR_WORKERS):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix='ai-dispatch')
+        self._setup_clients()
+
+    def _setup_clients(self):
+        """
+        Register async API clients for the providers that have keys; each
+        SDK is imported and its client built on the provider's first call
+        """
+        self.clients = LazyClients()
+
+        def openai_compatible(label, api_key_env, base_url=None):
+            def build():
+                client = import_sdk('openai').AsyncOpenAI(api_key=os.getenv(api_key_env), base_url=base_url)
+                logger.info(f"{label} async client initialized")
+                return client
+            return build
+
+        def build_anthropic():
+            client = import_sdk('anthropic').AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+            logger.info("Anthropic async client initialized")
+            return client
+
+        def build_google():
+            genai = import_sdk('google.generativeai')
+            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            logger.info("Google AI client initialized")
+            return genai
+
+        # OpenAI
+        if os.getenv("OPENAI_API_KEY") and sdk_available('openai'):
+            self.clients.register('openai', openai_compatible('OpenAI', "OPENAI_API_KEY"))
+
+        # Anthropic
+        if os.getenv("ANTHROPIC_API_KEY") and sdk_available('anthropic'):
+            self.clients.register('anthropic', build_anthropic)
+
+        # Google (sync SDK, run through the executor)
+        if os.getenv("GOOGLE_API_KEY") and sdk_available('google.generativeai'):
+            self.clients.register('google', build_google)
+
+        # DeepSeek (uses OpenAI-compatible API)
+        if os.getenv("DEEPSEEK_API_KEY") and sdk_available('openai'):
+            self.clients.register('deepseek', openai_compatible('DeepSeek', "DEEPSEEK_API_KEY", "https://api.deepseek.com/v1"))
+
+        # Together.ai (for Meta/Llama models)
+        if os.getenv("TOGETHER_API_KEY") and sdk_available('openai'):
+            self.clients.register('together', openai_compatible('Together.ai', "TOGETHER_API_KEY", "https://api.together.xyz/v1"))
+
+    # --- Event loop management ---
+
+    @property
+    def loop(self):
+        """The dispatcher's event loop, started on a daemon thread on first use"""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name='ai-dispatch-loop', daemon=True)
+                    thread.start()
+                    self._thread = thread
+                    self._loop = loop
+        return self._loop
+
+    def submit(self, coro):
+        """Schedule a coroutine on the dispatcher loop and return a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the dispatcher loop and block the calling thread until it finishes"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def iterate(self, agen):
+        """Drive an async generator on the dispatcher loop from synchronous code"""
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            # Closing early (e.g. the browser went away) cancels the provider stream too
+            self.run(agen.aclose())
+
+    async def run_in_executor(self, fn, *args, **kwargs):
+        """Run a blocking call on the dispatcher's thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    # --- Provider calls ---
+
+    async def _client(self, provider_key):
+        """The provider's client; the first call builds it on the executor so the SDK import doesn't stall the loop"""
+        if provider_key in self.clients.built():
+            return self.clients[provider_key]
+        return await self.run_in_executor(self.clients.__getitem__, provider_key)
+
+    async def complete(self, provider_key, api_name, messages, max_tokens=1000, temperature=0.7):
+        """
+        Send a chat completion to a provider
+
+        Returns:
+            dict: {'text': ..., 'usage': {'input_tokens': ..., 'output_tokens': ...} or None}
+        """
+        client = await self._client(provider_key)
+        if provider_key in ('openai', 'deepseek', 'together'):
+            return await self._complete_openai(client, api_name, messages, max_tokens, temperature)
+        elif provider_key == 'anthropic':
+            return await self._complete_anthropic(client, api_name, messages, max_tokens, temperature)
+        elif provider_key == 'google':
+            return await self.run_in_executor(self._complete_google, client, api_name, messages)
+        raise ValueError(f"No handler implemented for provider '{provider_key}'")
+
+    async def stream(self, provider_key, api_name, messages, max_tokens=1000, temperature=0.7):
+        """
+        Stream a chat completion from a provider
+
+        Yields:
+            dict: {'token': ...} for each text delta, then one {'usage': ...}
+        """
+        client = await self._client(provider_key)
+        if provider_key in ('openai', 'deepseek', 'together'):
+            events = self._stream_openai(client, api_name, messages, max_tokens, temperature)
+        elif provider_key == 'anthropic':
+            events = self._stream_anthropic(client, api_name, messages, max_tokens, temperature)
+        elif provider_key == 'google':
+            events = self._stream_google(client, api_name, messages)
+        else:
+            raise ValueError(f"No handler implemented for provider '{provider_key}'")
+
+        async for event in events:
+            yield event
+
+    async def probe(self, provider_key):
+        """Cheapest call that proves a provider is answering: list its models"""
+        client = await self._client(provider_key)
+        if provider_key in ('openai', 'deepseek', 'together'):
+            await client.models.list()
+        elif provider_key == 'anthropic':
+            await client.models.list(limit=1)
+        elif provider_key == 'google':
+            await self.run_in_executor(lambda: next(iter(client.list_models()), None))
+        else:
+            raise ValueError(f"No handler implemented for provider '{provider_key}'")
+
+    async def _complete_openai(self, client, api_name, messages, max_tokens, temperature):
+        """Call OpenAI or OpenAI-compatible APIs"""
+        try:
+            response = await client.chat.completions.create(
+                model=api_name,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+            usage = None
+            if response.usage:
+                usage = {
+                    'input_tokens': response.usage.prompt_tokens,
+                    'output_tokens': response.usage.completion_tokens
+                }
+            return {'text': response.choices[0].message.content.strip(), 'usage': usage}
+        except Exception as e:
+            logger.error(f"OpenAI API error: {e}")
+            raise
+
+    async def _complete_anthropic(self, client, api_name, messages, max_tokens, temperature):
+        """Call Anthropic Claude API"""
+        try:
+            response = await client.messages.create(
+                model=api_name,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+            return {
+                'text': response.content[0].text.strip(),
+                'usage': {
+                    'input_tokens': response.usage.input_tokens,
+                    'output_tokens': response.usage.output_tokens
+                }
+            }
+        except Exception as e:
+            logger.error(f"Anthropic API error: {e}")
+            raise
+
+    def _complete_google(self, genai_module, api_name, messages):
+        """Call Google Gemini API (blocking, runs on the executor)"""
+        try:
+            model = genai_module.GenerativeModel(api_name)
+            response = model.generate_content(_to_gemini_contents(messages))
+            return {'text': response.text.strip(), 'usage': _gemini_usage(response)}
+        except Exception as e:
+            logger.error(f"Google API error: {e}")
+            raise
+
+    async def _stream_openai(self, client, api_name, messages, max_tokens, temperature):
+        """Stream from OpenAI or OpenAI-compatible APIs"""
+        try:
+            stream = await client.chat.completions.create(
+                model=api_name,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            usage = None
+            async for chunk in stream:
+                # The final chunk carries usage and no choices
+                if getattr(chunk, 'usage', None):
+                    usage = {
+                        'input_tokens': chunk.usage.prompt_tokens,
+                        'output_tokens': chunk.usage.completion_tokens
+                    }
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield {'token': chunk.choices[0].delta.content}
+            yield {'usage': usage}
+        except Exception as e:
+            logger.error(f"OpenAI streaming API error: {e}")
+            raise
+
+    async def _stream_anthropic(self, client, api_name, messages, max_tokens, temperature):
+        """Stream from Anthropic Claude API"""
+        try:
+            async with client.messages.stream(
+                model=api_name,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature
+            ) as stream:
+                async for text in stream.text_stream:
+                    yield {'token': text}
+                final_message = await stream.get_final_message()
+            yield {'usage': {
+                'input_tokens': final_message.usage.input_tokens,
+                'output_tokens': final_message.usage.output_tokens
+            }}
+        except Exception as e:
+            logger.error(f"Anthropic streaming API error: {e}")
+            raise
+
+    async def _stream_google(self, genai_module, api_name, messages):
+        """Stream from Google Gemini API, pulling each chunk on the executor"""
+        try:
+            model = genai_module.GenerativeModel(api_name)
+            response = await self.run_in_executor(model.generate_content, _to_gemini_contents(messages), stream=True)
+            chunks = iter(response)
+            while True:
+                chunk = await self.run_in_executor(next, chunks, _STREAM_DONE)
+                if chunk is _STREAM_DONE:
+                    break
+                if chunk.text:
+                    yield {'token': chunk.text}
+            yield {'usage': _gemini_usage(response)}
+        except Exception as e:
+            logger.error(f"Google streaming API error: {e}")
+            raise
+
+
+def _to_gemini_contents(messages):
+    """Convert OpenAI-style chat messages to Gemini contents"""
+    if len(messages) == 1:
+        return messages[0]['content']
+    return [
+        {'role': 'model' if message['role'] == 'assistant' else 'user', 'parts': [message['content']]}
+        for message in messages
+    ]
+
+
+def _gemini_usage(response):
+    """Pull token counts off a Gemini response, if it reported any"""
+    usage_metadata = getattr(response, 'usage_metadata', None)
+    if not usage_metadata:
+        return None
+    return {
+        'input_tokens': usage_metadata.prompt_token_count,
+        'output_tokens': usage_metadata.candidates_token_count
+    }
@@ -27,6 +27,10 @@ DATABASE_FILE_PATH = r"C:\Users\green\t3_clone\db\models.db"
 OUTPUT_DIR = "output"
 load_dotenv()
 
+# One keep-alive session for every download, so a test run doesn't handshake per file
+http = requests.Session()
+HTTP_TIMEOUT = (5, 120)  # (connect, read) seconds
+
 PROMPTS = {
     "llm": "Hello! In one sentence, tell me what you are.",
     "image": "A vibrant, photorealistic painting of a robot artist painting a sunset.",
@@ -142,7 +146,7 @@ def handle_openai_request(api_name: str, prompt: str, model_type: str, notes: st
         if model_type == 'image':
             response = client.images.generate(model=api_name, prompt=prompt, n=1, size="1024x1024")
             image_url = response.data[0].url
-            image_bytes = requests.get(image_url).content
+            image_bytes = http.get(image_url, timeout=HTTP_TIMEOUT).content
             saved_path = save_output_file(image_bytes, model_type, api_name)
             print(f"✅ Image Test Successful! Saved to: {saved_path}")
         elif model_type == 'audio':
@@ -187,7 +191,7 @@ def handle_cartesia_request(api_name: str, prompt: str, model_type: str, notes:
     try:
         headers = {"X-API-Key": api_key, "Content-Type": "application/json"}
         payload = {"model_id": api_name, "transcript": prompt, "output_format": "mp3"}
-        response = requests.post("https://api.cartesia.ai/v1/text-to-speech", headers=headers, json=payload)
+        response = http.post("https://api.cartesia.ai/v1/text-to-speech", headers=headers, json=payload, timeout=HTTP_TIMEOUT)
         response.raise_for_status()
         saved_path = save_output_file(response.content, model_type, api_name)
         print(f"✅ Audio Test Successful! Saved to: {saved_path}")
@@ -204,7 +208,7 @@ def handle_togetherai_request(api_name: str, prompt: str, model_type: str, notes
         if model_type == 'image':
             response = client.images.generate(model=api_name, prompt=prompt, n=1, size="1024x1024")
             image_url = response.data[0].url
-            image_bytes = requests.get(image_url).content
+            image_bytes = http.get(image_url, timeout=HTTP_TIMEOUT).content
             saved_path = save_output_file(image_bytes, model_type, api_name)
             print(f"✅ Image Test Successful! Saved to: {saved_path}")
         elif model_type == 'llm':
@@ -1,12 +1,14 @@
 # Updated app.py - Enhanced Database Integration for T3 Chat
 
-from flask import Flask, render_template, request, jsonify, send_from_directory, abort
+from flask import Flask, render_template, request, jsonify, send_from_directory, send_file, abort, Response, stream_with_context
 from flask_login import LoginManager, login_required, current_user
 import random
 import time
 import os
-import sqlite3
-import re
+import json
+import gzip
+import hashlib
+import threading
 from datetime import timedelta
 from functools import wraps
 from dotenv import load_dotenv
@@ -14,12 +16,25 @@ from dotenv import load_dotenv
 # Import our AI clients
 from ai_client import AIClient
 from media_client import MediaClient
+from model_catalog import CatalogHolder
+from model_schema import MODEL_TYPE_TABLES, provider_rank
+from schema_migrations import migrate_databases, latest_version
+from conversation_store import ConversationStore
+from response_cache import ResponseCache
+from database.lib.database_manager import get_connection, pool_stats
+from password_hasher import password_hasher
+from usage_meter import UsageMeter, token_limit
+from provider_sdks import preload_sdks
+from media_jobs import MediaJobs, MediaJobsBusy, FINISHED as MEDIA_JOB_FINISHED
+from media_store import MediaStore
+from media_variants import ImageVariants
 
 # --- Load Environment Variables ---
 load_dotenv()
 
 app = Flask(__name__)
-app.config['SECRET_KEY'] = os.urandom(24)
+# Must be the same in every worker process, or a session cookie only works on the worker that set it
+app.config['SECRET_KEY'] = os.getenv('SECRET_KEY') or os.urandom(24)
 app.config['REMEMBER_COOKIE_DURATION'] = timedelta(days=30)
 
 # --- Google OAuth Configuration ---
@@ -32,10 +47,51 @@ DB_DIR = 'db'
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, 'db', 'models.db')
 USER_DB_PATH = os.path.join(BASE_DIR, 'db', 'user.db')
+DATA_DB_PATH = os.path.join(BASE_DIR, 'db', 'data.db')
+CACHE_DB_PATH = os.path.join(BASE_DIR, 'db', 'cache.db')
 
-# Initialize AI Client and Media Client
+# --- Chat History Configuration ---
+# How many earlier turns (user message + reply) are sent to the model with each new message
+CHAT_HISTORY_TURNS = int(os.getenv('CHAT_HISTORY_TURNS', '20'))
+# Model that folds turns which no longer fit the prompt into a per-chat rolling summary; unset to just drop them
+CHAT_SUMMARY_MODEL = os.getenv('CHAT_SUMMARY_MODEL')
+
+# --- Broadcast Configuration ---
+BROADCAST_MAX_MODELS = int(os.getenv('BROADCAST_MAX_MODELS', '8'))
+BROADCAST_DEADLINE_SECONDS = float(os.getenv('BROADCAST_DEADLINE_SECONDS', '60'))
+
+# --- Media Job Configuration ---
+# How long /chat waits for an image or video job before answering with the job to follow instead; 0 never waits.
+# Kept short: the request thread is held the whole time, which is what the job queue is there to avoid.
+MEDIA_SYNC_WAIT = float(os.getenv('MEDIA_SYNC_WAIT', '2'))
+# Stored media never changes under its URL, so browsers may keep it this long without revalidating
+MEDIA_FILE_MAX_AGE = 365 * 24 * 3600
+
+# --- Response Cache Configuration ---
+# Off by default: with it on, identical prompts to the same model are answered from cache even
+# though chat replies are sampled. Image and video models stay uncached (RESPONSE_CACHE_OPT_OUT_TYPES).
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'false').lower() == 'true'
+
+# Shared in-memory snapshot of models.db, read by the routes and both clients
+model_catalog = CatalogHolder(DB_PATH)
+
+# --- Worker Initialization ---
+# 'prefork': create_app() loads the catalog, builds the model payloads and imports provider SDKs
+# before the server forks, so workers share them; 'lazy': each worker does it all on its first request
+WORKER_INIT = os.getenv('WORKER_INIT', 'prefork').lower()
+
+# Per-process services, built in each worker by init_worker()
 ai_client = None
 media_client = None
+conversation_store = None
+response_cache = None
+usage_meter = None
+media_jobs = None
+media_store = None
+
+_shared_state_warmed = False
+_worker_pid = None
+_worker_lock = threading.Lock()
 
 def check_db_exists():
     """Checks if the models database file exists."""
@@ -64,13 +120,11 @@ def check_user_db_exists():
     print(f"User database found at '{USER_DB_PATH}'.")
 
 def get_db_conn():
-    """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """A pooled connection to the models database; close() returns it to the pool."""
+    return get_connection(DB_PATH)
 
 # --- Authentication Setup ---
-from auth import auth as auth_blueprint, User
+from auth import auth as auth_blueprint, load_user as load_cached_user
 
 app.register_blueprint(auth_blueprint)
 
@@ -80,7 +134,8 @@ login_manager.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.get(user_id)
+    # Served from the user cache; only a miss or an expired entry reads user.db
+    return load_cached_user(user_id)
 
 try:
     from google_auth import init_google_auth, is_google_oauth_configured, get_google_login_url
@@ -123,10 +178,8 @@ def admin_required(f):
     return decorated_function
 
 def get_user_db_conn():
-    """Establishes a connection to the user SQLite database."""
-    conn = sqlite3.connect(USER_DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """A pooled connection to the user database; close() returns it to the pool."""
+    return get_connection(USER_DB_PATH)
 
 def format_number_with_comma(value):
     """Formats an integer with a comma as a thousands separator."""
@@ -143,17 +196,17 @@ app.jinja_env.filters['numberformat'] = format_number_with_comma
 @login_required
 def settings():
     """Renders the user settings page with dynamic token usage data."""
-    total_tokens = 10000
-    conn = get_user_db_conn()
-    user_data = conn.execute(
-        'SELECT token_quota FROM user_accounts WHERE user_id = ?',
-        (current_user.id,)
-    ).fetchone()
-    conn.close()
-
-    tokens_used = 0
-    if user_data and user_data['token_quota'] is not None:
-        tokens_used = int(user_data['token_quota'])
+    total_tokens = token_limit(current_user.subscription_plan) or 0
+    if usage_meter:
+        tokens_used = usage_meter.tokens_used(current_user.id)
+    else:
+        conn = get_user_db_conn()
+        user_data = conn.execute(
+            'SELECT token_quota FROM user_accounts WHERE user_id = ?',
+            (current_user.id,)
+        ).fetchone()
+        conn.close()
+        tokens_used = int(user_data['token_quota'] or 0) if user_data else 0
 
     tokens_remaining = total_tokens - tokens_used
     if tokens_remaining < 0:
@@ -171,6 +224,28 @@ def settings():
         progress_percentage=progress_percentage
     )
 
+@app.route('/usage')
+@login_required
+def usage():
+    """The logged-in user's usage per day and per model over the last ?days=, from the daily rollups."""
+    if not usage_meter:
+        return jsonify({'error': 'Usage metering not initialized'}), 500
+    days = request_int_arg('days', 30, 1, 366)
+    return jsonify({
+        'days': days,
+        'tokens_used': usage_meter.tokens_used(current_user.id),
+        'token_limit': token_limit(current_user.subscription_plan),
+        'daily': usage_meter.daily_usage(days, user_id=current_user.id),
+        'models': usage_meter.usage_by('model_name', days, user_id=current_user.id)
+    })
+
+def request_int_arg(name, default, minimum, maximum):
+    """An integer query argument clamped to [minimum, maximum], or the default if missing or invalid."""
+    try:
+        return max(minimum, min(int(request.args.get(name, default)), maximum))
+    except ValueError:
+        return default
+
 def format_model_data(row, model_type='llm'):
     """Enhanced function to format database row into frontend-ready model data."""
     # Convert row to dict for easier access
@@ -262,157 +337,7 @@ def format_model_data(row, model_type='llm'):
 
 def parse_model_display_name(model_name, model_type):
     """Enhanced model name parsing for better display names."""
-    main_name, sub_name = model_name, ''
-    
-    if model_type == 'llm':
-        # GPT models
-        if 'gpt-4o-mini' in model_name.lower():
-            main_name, sub_name = 'GPT-4o', 'Mini'
-        elif 'gpt-4o' in model_name.lower():
-            main_name, sub_name = 'GPT-4o', ''
-        elif 'gpt-4.1-mini' in model_name.lower():
-            main_name, sub_name = 'GPT-4.1', 'Mini'
-        elif 'gpt-4.1-nano' in model_name.lower():
-            main_name, sub_name = 'GPT-4.1', 'Nano'
-        elif 'gpt-4.1' in model_name.lower():
-            main_name, sub_name = 'GPT-4.1', ''
-        elif 'gpt-4.5' in model_name.lower():
-            main_name, sub_name = 'GPT-4.5', 'Preview'
-        
-        # OpenAI o-series
-        elif 'o1-pro' in model_name.lower():
-            main_name, sub_name = 'o1', 'Pro'
-        elif 'o1-mini' in model_name.lower():
-            main_name, sub_name = 'o1', 'Mini'
-        elif 'o3-mini' in model_name.lower():
-            main_name, sub_name = 'o3', 'Mini'
-        elif 'o4-mini' in model_name.lower():
-            main_name, sub_name = 'o4', 'Mini'
-        elif model_name.lower() == 'o3':
-            main_name, sub_name = 'o3', ''
-        
-        # Claude models
-        elif 'Claude Sonnet 4' in model_name:
-            main_name, sub_name = 'Claude 4', 'Sonnet'
-        elif 'Claude Opus 4' in model_name:
-            main_name, sub_name = 'Claude 4', 'Opus'
-        elif 'Claude Sonnet 3.7' in model_name:
-            main_name, sub_name = 'Claude 3.7', 'Sonnet'
-        elif 'Claude Sonnet 3.5' in model_name:
-            main_name, sub_name = 'Claude 3.5', 'Sonnet'
-        elif 'Claude 3 Opus' in model_name:
-            main_name, sub_name = 'Claude 3', 'Opus'
-        elif 'Claude 3 Sonnet' in model_name:
-            main_name, sub_name = 'Claude 3', 'Sonnet'
-        elif 'Claude 3 Haiku' in model_name:
-            main_name, sub_name = 'Claude 3', 'Haiku'
-        elif 'Claude Haiku 3.5' in model_name:
-            main_name, sub_name = 'Claude 3.5', 'Haiku'
-        
-        # Gemini models
-        elif 'Gemini 2.5 Flash' in model_name:
-            main_name, sub_name = 'Gemini 2.5', 'Flash'
-        elif 'Gemini 2.5 Pro' in model_name:
-            main_name, sub_name = 'Gemini 2.5', 'Pro'
-        elif 'Gemini 2.0 Flash' in model_name:
-            main_name, sub_name = 'Gemini 2.0', 'Flash'
-        elif 'Gemini 1.5 Pro' in model_name:
-            main_name, sub_name = 'Gemini 1.5', 'Pro'
-        elif 'Gemini 1.5 Flash' in model_name:
-            main_name, sub_name = 'Gemini 1.5', 'Flash'
-        
-        # DeepSeek models
-        elif 'DeepSeek-R1' in model_name:
-            main_name, sub_name = 'DeepSeek', 'R1'
-        elif 'deepseek-reasoner' in model_name or 'deepseek-coder' in model_name:
-            main_name, sub_name = 'DeepSeek', 'Coder'
-        elif 'DeepSeek-V3' in model_name:
-            main_name, sub_name = 'DeepSeek', 'V3'
-        
-        # Llama models
-        elif 'Llama-4-Scout' in model_name:
-            main_name, sub_name = 'Llama 4', 'Scout'
-        elif 'Llama-4-Maverick' in model_name:
-            main_name, sub_name = 'Llama 4', 'Maverick'
-        elif 'Llama-3.3-70B' in model_name:
-            main_name, sub_name = 'Llama 3.3', '70B'
-        elif 'Llama-3.2-90B' in model_name:
-            main_name, sub_name = 'Llama 3.2', '90B Vision'
-        elif 'Llama-3.2-11B' in model_name:
-            main_name, sub_name = 'Llama 3.2', '11B Vision'
-        elif 'Llama-3.2-3B' in model_name:
-            main_name, sub_name = 'Llama 3.2', '3B'
-        elif 'Llama-3.1-405B' in model_name:
-            main_name, sub_name = 'Llama 3.1', '405B'
-        elif 'Llama-3.1-70B' in model_name:
-            main_name, sub_name = 'Llama 3.1', '70B'
-        elif 'Llama-3.1-8B' in model_name:
-            main_name, sub_name = 'Llama 3.1', '8B'
-        elif 'Llama-Vision-Free' in model_name:
-            main_name, sub_name = 'Llama Vision', 'Free'
-        
-        # Other models with generic parsing
-        else:
-            # Try to extract version numbers and model types
-            if '/' in model_name:
-                model_name = model_name.split('/')[-1]  # Take the part after the last slash
-            
-            # Look for patterns like ModelName-VersionNumber
-            match = re.match(r'([a-zA-Z0-9\._\-]+?)[\-\s]+([\d\.]+[a-zA-Z]*(?:\-[a-zA-Z0-9]+)*)', model_name, re.IGNORECASE)
-            if match and len(match.groups()) >= 2:
-                base_name = match.groups()[0].replace('-', ' ').replace('_', ' ')
-                version_part = match.groups()[1]
-                main_name = ' '.join(word.capitalize() for word in base_name.split())
-                sub_name = version_part.upper() if len(version_part) <= 5 else version_part.capitalize()
-    
-    elif model_type == 'image':
-        if 'FLUX.1.1' in model_name and 'pro' in model_name.lower():
-            main_name, sub_name = 'FLUX.1.1', 'Pro'
-        elif 'FLUX.1' in model_name:
-            if 'schnell' in model_name.lower():
-                main_name, sub_name = 'FLUX.1', 'Schnell'
-            elif 'dev' in model_name.lower():
-                main_name, sub_name = 'FLUX.1', 'Dev'
-            elif 'redux' in model_name.lower():
-                main_name, sub_name = 'FLUX.1', 'Redux'
-            elif 'depth' in model_name.lower():
-                main_name, sub_name = 'FLUX.1', 'Depth'
-            elif 'canny' in model_name.lower():
-                main_name, sub_name = 'FLUX.1', 'Canny'
-            else:
-                main_name, sub_name = 'FLUX.1', ''
-        elif 'Imagen 3' in model_name:
-            main_name, sub_name = 'Imagen', '3'
-        elif 'gpt-image-1' in model_name:
-            main_name, sub_name = 'GPT Image', '1'
-        elif 'Gemini 2.0 Flash' in model_name and 'Image' in model_name:
-            main_name, sub_name = 'Gemini 2.0', 'Image Gen'
-    
-    elif model_type == 'audio':
-        if 'sonic-2' in model_name.lower():
-            main_name, sub_name = 'Sonic', '2'
-        elif 'sonic' in model_name.lower():
-            main_name, sub_name = 'Sonic', '1'
-        elif 'gpt-4o-audio' in model_name:
-            main_name, sub_name = 'GPT-4o', 'Audio'
-        elif 'gpt-4o-mini-audio' in model_name:
-            main_name, sub_name = 'GPT-4o Mini', 'Audio'
-        elif 'gpt-4o-realtime' in model_name:
-            main_name, sub_name = 'GPT-4o', 'Realtime'
-        elif 'gpt-4o-mini-realtime' in model_name:
-            main_name, sub_name = 'GPT-4o Mini', 'Realtime'
-        elif 'Gemini 2.5' in model_name and 'TTS' in model_name:
-            main_name, sub_name = 'Gemini 2.5', 'TTS'
-        elif 'Gemini 2.5' in model_name and 'Audio' in model_name:
-            main_name, sub_name = 'Gemini 2.5', 'Audio'
-        elif 'Gemini 2.0 Flash Live' in model_name:
-            main_name, sub_name = 'Gemini 2.0', 'Live'
-    
-    elif model_type == 'video':
-        if 'Veo 2' in model_name:
-            main_name, sub_name = 'Veo', '2'
-
-    return main_name, sub_name
+    return model_catalog.current.display_names.parse(model_name, model_type)
 
 def get_model_capabilities(row, model_name, model_type):
     """Enhanced capability detection based on database fields and model characteristics."""
@@ -471,38 +396,45 @@ def chat():
         if not message: 
             return jsonify({'error': 'Empty message'}), 400
         
-        # Handle different media types
-        if media_type == 'image':
-            if not media_client:
-                return jsonify({'error': 'Media client not initialized. Please check your API keys.'}), 500
-            
-            try:
-                result = media_client.generate_image(model, message)
-                if isinstance(result, str):  # Error message
-                    return jsonify({'error': result}), 500
-                return jsonify(result)
-            except Exception as e:
-                return jsonify({'error': f'Image generation failed: {str(e)}'}), 500
+        if quota_exhausted():
+            return quota_exhausted_response()
         
-        elif media_type == 'video':
-            if not media_client:
+        # Handle different media types
+        if media_type in ('image', 'video'):
+            if not media_jobs:
                 return jsonify({'error': 'Media client not initialized. Please check your API keys.'}), 500
-            
-            try:
-                result = media_client.generate_video(model, message)
-                if isinstance(result, str):  # Error message
-                    return jsonify({'error': result}), 500
-                return jsonify(result)
-            except Exception as e:
-                return jsonify({'error': f'Video generation failed: {str(e)}'}), 500
+            # Runs as a background job; answered here if it finishes within MEDIA_SYNC_WAIT
+            return submit_media_job(media_type, model, message, data.get('params'), wait=MEDIA_SYNC_WAIT)
         
         else:  # Default to LLM (text)
             if not ai_client:
                 return jsonify({'error': 'AI client not initialized. Please check your API keys.'}), 500
             
+            chat_id = data.get('chat_id')
+            session = None
+            history = []
+            if chat_id:
+                session = get_user_chat(chat_id)
+                if not session:
+                    return jsonify({'error': 'Chat not found'}), 404
+                # Turns already folded into the summary aren't sent again
+                summarized_through = session.get('summary_through') if CHAT_SUMMARY_MODEL else None
+                history = conversation_store.history_for_model(chat_id, CHAT_HISTORY_TURNS * 2, after=summarized_through)
+            
+            if data.get('stream'):
+                return stream_chat_response(model, message, chat_id, history, session)
+            
             try:
-                response = ai_client.generate_response(model, message)
-                return jsonify({'response': response, 'type': 'text'})
+                result = ai_client.generate(model, message, history=history, summary=get_chat_summary(session))
+                record_usage(current_user.id, result)
+                if not result['error']:
+                    chat_id = save_chat_turn(chat_id, message, result)
+                    fold_chat_summary(session, history, result['history_dropped'])
+                # 'model' is the model that answered, which failover or a hedge may have changed
+                return jsonify({
+                    'response': result['response'], 'type': 'text', 'chat_id': chat_id, 'cached': result['cached'],
+                    'model': result['model'], 'provider': result['provider']
+                })
             except ValueError as e:
                 return jsonify({'error': str(e)}), 400
             except Exception as e:
@@ -513,119 +445,403 @@ def chat():
         print(f"Error in chat endpoint: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
-@app.route('/models/categorized')
+def sse_event(payload):
+    """Formats a dict as a single Server-Sent Events message."""
+    return f"data: {json.dumps(payload)}\n\n"
+
+def get_user_chat(chat_id):
+    """Returns a chat session if it exists and belongs to the logged-in user, else None."""
+    if not conversation_store:
+        return None
+    session = conversation_store.get_session(chat_id)
+    if session and session['user_id'] == current_user.id:
+        return session
+    return None
+
+def get_chat_summary(session):
+    """The chat's rolling summary, if summaries are enabled and one has been written."""
+    if not CHAT_SUMMARY_MODEL or not session:
+        return None
+    return session.get('summary')
+
+def fold_chat_summary(session, history, history_dropped):
+    """
+    Folds turns that no longer reach the model into the chat's rolling summary, in the background.
+    Runs when the packer dropped turns or the history window is full, so older turns have slid out of it.
+    """
+    if not CHAT_SUMMARY_MODEL or not session:
+        return
+    if not history_dropped and len(history) < CHAT_HISTORY_TURNS * 2:
+        return
+    
+    chat_id = session['chat_id']
+    if history_dropped < len(history):
+        # Everything older than the oldest turn that was still sent
+        before, inclusive = history[history_dropped]['timestamp'], False
+    else:
+        before, inclusive = history[-1]['timestamp'], True
+    
+    async def fold():
+        dispatcher = ai_client.dispatcher
+        messages = await dispatcher.run_in_executor(
+            conversation_store.messages_to_summarize,
+            chat_id, session.get('summary_through'), before, inclusive, CHAT_HISTORY_TURNS * 2
+        )
+        if not messages:
+            return
+        summary = await ai_client.asummarize(CHAT_SUMMARY_MODEL, session.get('summary'), messages)
+        if summary:
+            conversation_store.update_summary(chat_id, summary, messages[-1]['timestamp'])
+    
+    ai_client.dispatcher.submit(fold())
+
+def save_chat_turn(chat_id, message, result):
+    """Queues a user message and the model's reply for storage, starting a new chat if needed."""
+    if not conversation_store:
+        return chat_id
+    if not chat_id:
+        chat_id = conversation_store.create_session(current_user.id, title=message[:80])
+    usage = result.get('usage') or {}
+    conversation_store.append_turn(
+        chat_id, message, result['response'],
+        model_used=result['model'],
+        tokens_used=usage.get('output_tokens') or 0
+    )
+    return chat_id
+
+# --- Usage Accounting ---
+def record_usage(user_id, result, model=None):
+    """Meters one AIClient/MediaClient result against the user's token quota; media errors come back as strings."""
+    if not usage_meter:
+        return
+    if isinstance(result, str):
+        usage_meter.record(user_id, model, None, status_code='error')
+        return
+    if result.get('error'):
+        status_code = 'error'
+    elif result.get('cached'):
+        status_code = 'cached'
+    else:
+        status_code = '200'
+    usage_meter.record(user_id, result.get('model') or model, result.get('usage'), status_code=status_code)
+
+def quota_exhausted():
+    """True if the logged-in user has spent their plan's tokens; checked against the in-memory counter."""
+    if not usage_meter:
+        return False
+    return usage_meter.tokens_remaining(current_user.id, current_user.subscription_plan) == 0
+
+def quota_exhausted_response():
+    limit = token_limit(current_user.subscription_plan)
+    return jsonify({'error': f"You've used all {limit:,} tokens in your {current_user.subscription_plan} plan."}), 429
+
+# --- Media Jobs ---
+def record_media_job_usage(job, result):
+    """MediaJobs on_finish hook: meters the generation for the user who submitted it."""
+    record_usage(job['user_id'], result, job['model_name'])
+
+def media_job_record(job):
+    """A job as the API returns it, with the URLs to follow it."""
+    record = {key: job[key] for key in ('job_id', 'media_type', 'model_name', 'status', 'created_at') if key in job}
+    record['finished_at'] = job.get('finished_at')
+    record['status_url'] = f"/media/jobs/{job['job_id']}"
+    record['events_url'] = f"/media/jobs/{job['job_id']}/events"
+    if job.get('status') == 'succeeded':
+        record['result'] = job['result']
+    elif job.get('status') == 'failed':
+        record['error'] = job['error']
+    return record
+
+def submit_media_job(media_type, model, prompt, params=None, wait=0):
+    """
+    Queues a generation for the logged-in user. With wait, answers like the old synchronous
+    /chat if the job finishes in time; otherwise 202 with the job to poll or subscribe to.
+    """
+    try:
+        job = media_jobs.submit(current_user.id, media_type, model, prompt, params)
+    except MediaJobsBusy as e:
+        return jsonify({'error': str(e)}), 503
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    deadline = time.monotonic() + wait
+    while job['status'] not in MEDIA_JOB_FINISHED and time.monotonic() < deadline:
+        job = media_jobs.wait(job['job_id'], since_status=job['status'], timeout=deadline - time.monotonic())
+    
+    if job['status'] == 'succeeded':
+        return jsonify(dict(job['result'], job_id=job['job_id']))
+    if job['status'] == 'failed':
+        return jsonify({'error': job['error'], 'job_id': job['job_id']}), 500
+    return jsonify(dict(media_job_record(job), type='job')), 202
+
+@app.route('/media/jobs', methods=['POST'])
 @login_required
-def get_categorized_models():
-    """Enhanced endpoint to fetch all categorized models from the database with full model information."""
-    conn = get_db_conn()
+def create_media_job():
+    """Starts an image or video generation in the background."""
+    if not media_jobs:
+        return jsonify({'error': 'Media client not initialized. Please check your API keys.'}), 500
+    data = request.get_json() or {}
+    prompt = (data.get('prompt') or data.get('message') or '').strip()
+    if not prompt:
+        return jsonify({'error': 'Empty prompt'}), 400
+    if quota_exhausted():
+        return quota_exhausted_response()
+    return submit_media_job(data.get('mediaType', 'image'), data.get('model'), prompt, data.get('params'))
+
+@app.route('/media/jobs')
+@login_required
+def list_media_jobs():
+    if not media_jobs:
+        return jsonify({'jobs': []})
+    limit = request_int_arg('limit', 20, 1, 100)
+    return jsonify({'jobs': [media_job_record(job) for job in media_jobs.list_for_user(current_user.id, limit)]})
+
+@app.route('/media/jobs/<job_id>')
+@login_required
+def get_media_job(job_id):
+    job = media_jobs.get(job_id, current_user.id) if media_jobs else None
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(media_job_record(job))
+
+@app.route('/media/jobs/<job_id>/result')
+@login_required
+def get_media_job_result(job_id):
+    """The generated media once the job succeeded; 202 while it's still running."""
+    job = media_jobs.get(job_id, current_user.id) if media_jobs else None
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] == 'succeeded':
+        return jsonify(job['result'])
+    if job['status'] in MEDIA_JOB_FINISHED:
+        return jsonify({'error': job['error'] or f"Job {job['status']}", 'status': job['status']}), 409
+    return jsonify(media_job_record(job)), 202
+
+@app.route('/media/jobs/<job_id>/events')
+@login_required
+def media_job_events(job_id):
+    """Server-Sent Events for one job: a 'status' event per change, then 'done' when it finishes."""
+    job = media_jobs.get(job_id, current_user.id) if media_jobs else None
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    user_id = current_user.id
+    
+    def generate():
+        current = job
+        yield sse_event({'type': 'status', 'job': media_job_record(current)})
+        while current['status'] not in MEDIA_JOB_FINISHED:
+            updated = media_jobs.wait(job_id, user_id, since_status=current['status'], timeout=15)
+            if updated is None:
+                return
+            if updated['status'] == current['status']:
+                yield ": keep-alive\n\n"
+                continue
+            current = updated
+            yield sse_event({'type': 'status', 'job': media_job_record(current)})
+        yield sse_event({'type': 'done', 'job': media_job_record(current)})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@app.route('/media/jobs/<job_id>', methods=['DELETE'])
+@login_required
+def cancel_media_job(job_id):
+    """Cancels a job that hasn't started yet."""
+    if not media_jobs or not media_jobs.cancel(job_id, current_user.id):
+        return jsonify({'error': 'Job not found or already started'}), 409
+    return jsonify({'success': True})
+
+@app.route('/media/files/<file_id>')
+@login_required
+def media_file(file_id):
+    """
+    A stored image or video, for a user it was generated for. Range requests let videos seek; the file goes out
+    via the server's sendfile where it has one. Images come as the smallest copy the browser accepts (WebP/AVIF),
+    and ?size=thumb asks for a thumbnail.
+    """
+    size = 'thumb' if request.args.get('size') == 'thumb' else 'full'
+    stored = media_store.get(file_id, size, request.headers.get('Accept', ''), user_id=current_user.id) if media_store else None
+    if not stored:
+        abort(404)
+    # The etag is the content hash (plus the variant), so while it's final the file never needs revalidating
+    response = send_file(stored['path'], mimetype=stored['mime_type'], conditional=True, etag=stored['etag'],
+                         max_age=MEDIA_FILE_MAX_AGE)
+    if stored['final']:
+        response.headers['Cache-Control'] = f'private, max-age={MEDIA_FILE_MAX_AGE}, immutable'
+    else:
+        # Smaller copies are still being encoded; revalidate so the browser picks them up once they exist
+        response.headers['Cache-Control'] = 'private, no-cache'
+    response.headers['Vary'] = 'Accept'
+    return response
+
+def stream_chat_response(model, message, chat_id=None, history=None, session=None):
+    """Streams an LLM reply to the browser as Server-Sent Events, token by token."""
     try:
-        categorized_models = {
-            'llm_models': [],
-            'image_models': [],
-            'audio_models': [],
-            'video_models': []
+        events = ai_client.stream_response(model, message, history=history, summary=get_chat_summary(session))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    user_id = current_user.id
+    
+    def generate():
+        try:
+            for event in events:
+                if event['type'] == 'done':
+                    record_usage(user_id, event)
+                    event['chat_id'] = save_chat_turn(chat_id, message, event)
+                    fold_chat_summary(session, history, event['history_dropped'])
+                yield sse_event(event)
+        except Exception as e:
+            print(f"AI streaming error: {e}")
+            yield sse_event({'type': 'error', 'error': 'Sorry, I encountered an error while processing your request. Please try again or select a different model.'})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Stop nginx from buffering the stream
         }
-        
-        # Define tables and their corresponding keys
-        table_configs = [
-            ('llm_models', 'llm_models'),
-            ('image_models', 'image_models'),
-            ('audio_models', 'audio_models'),
-            ('video_models', 'video_models')
-        ]
-        
-        for table_name, key in table_configs:
-            try:
-                # Check if table exists
-                cursor = conn.execute(
-                    "SELECT name FROM sqlite_master WHERE type='table' AND name=?", 
-                    (table_name,)
-                )
-                if not cursor.fetchone():
-                    print(f"Table {table_name} doesn't exist, skipping...")
-                    continue
-                
-                # Fetch models from table with enhanced ordering
-                query = f'''
-                    SELECT * FROM {table_name} 
-                    WHERE is_active = 1 
-                    ORDER BY 
-                        CASE provider_name 
-                            WHEN 'Anthropic' THEN 1
-                            WHEN 'Google' THEN 2
-                            WHEN 'OpenAI' THEN 3
-                            WHEN 'DeepSeek' THEN 4
-                            WHEN 'Meta' THEN 5
-                            WHEN 'xAI' THEN 6
-                            ELSE 7
-                        END,
-                        COALESCE(usd_per_million_input_tokens, 0) DESC,
-                        model_name
-                '''
-                
-                models = conn.execute(query).fetchall()
-                
-                # Format each model with enhanced data
-                model_type = table_name.replace('_models', '')
-                formatted_models = []
-                for model in models:
-                    try:
-                        formatted_model = format_model_data(model, model_type)
-                        formatted_models.append(formatted_model)
-                    except Exception as e:
-                        model_name = model['model_name'] if 'model_name' in model.keys() else 'unknown'
-                        print(f"Error formatting model {model_name}: {e}")
-                        continue
-                
-                categorized_models[key] = formatted_models
-                print(f"Loaded {len(formatted_models)} models from {table_name}")
-                
-            except sqlite3.OperationalError as e:
-                print(f"Error querying {table_name}: {e}")
-                continue
-        
-        # Log summary
-        total_models = sum(len(models) for models in categorized_models.values())
-        print(f"Total models loaded: {total_models}")
-        
-        return jsonify(categorized_models)
-        
-    except Exception as e:
-        print(f"Error in get_categorized_models: {e}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        conn.close()
+    )
 
-@app.route('/models')
+@app.route('/chats/<chat_id>/messages')
 @login_required
-def get_models_data():
-    """Enhanced endpoint to fetch LLM models with better categorization."""
-    conn = get_db_conn()
+def get_chat_messages(chat_id):
+    """Returns one page of a chat's history, newest page first; pass ?before=<cursor> for older pages."""
+    if not get_user_chat(chat_id):
+        return jsonify({'error': 'Chat not found'}), 404
+    
+    limit = request_int_arg('limit', 50, 1, 200)
+    
     try:
-        # Enhanced query with better ordering
-        db_models = conn.execute('''
-            SELECT * FROM llm_models 
-            WHERE is_active = 1 
-            ORDER BY 
-                CASE provider_name 
-                    WHEN 'Anthropic' THEN 1
-                    WHEN 'Google' THEN 2
-                    WHEN 'OpenAI' THEN 3
-                    WHEN 'DeepSeek' THEN 4
-                    WHEN 'Meta' THEN 5
-                    WHEN 'xAI' THEN 6
-                    ELSE 7
-                END,
-                COALESCE(usd_per_million_input_tokens, 0) DESC,
-                model_name
-        ''').fetchall()
-        
-    except sqlite3.OperationalError as e:
-        print(f"Error querying database: {e}")
-        return jsonify({'error': f"Database query failed: {e}"}), 500
-    finally:
-        conn.close()
+        messages, next_cursor = conversation_store.get_page(chat_id, limit, request.args.get('before'))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    return jsonify({
+        'chat_id': chat_id,
+        'messages': [
+            {
+                'message_id': m['message_id'],
+                'sender_type': m['sender_type'],
+                'message_text': m['message_text'],
+                'timestamp': m['timestamp'],
+                'model_used': m['model_used']
+            }
+            for m in messages
+        ],
+        'next_cursor': next_cursor
+    })
 
+@app.route('/chat/broadcast', methods=['POST'])
+@login_required
+def chat_broadcast():
+    """Sends one message to several LLMs at once and streams back each reply as it finishes."""
+    if not ai_client:
+        return jsonify({'error': 'AI client not initialized. Please check your API keys.'}), 500
+    
+    data = request.get_json() or {}
+    message = data.get('message', '').strip()
+    models = data.get('models') or []
+    
+    if not message:
+        return jsonify({'error': 'Empty message'}), 400
+    if not isinstance(models, list) or not models:
+        return jsonify({'error': 'Please choose at least one model.'}), 400
+    if quota_exhausted():
+        return quota_exhausted_response()
+    
+    # Drop duplicates but keep the order the user picked them in
+    models = list(dict.fromkeys(str(model) for model in models))
+    if len(models) > BROADCAST_MAX_MODELS:
+        return jsonify({'error': f'You can broadcast to at most {BROADCAST_MAX_MODELS} models at once.'}), 400
+    
+    try:
+        deadline = min(float(data.get('timeout', BROADCAST_DEADLINE_SECONDS)), BROADCAST_DEADLINE_SECONDS)
+    except (TypeError, ValueError):
+        deadline = BROADCAST_DEADLINE_SECONDS
+    
+    user_id = current_user.id
+    
+    def generate():
+        started = time.time()
+        try:
+            for result in ai_client.broadcast(models, message, deadline=deadline):
+                record_usage(user_id, result)
+                result['type'] = 'result'
+                yield sse_event(result)
+        except Exception as e:
+            print(f"AI broadcast error: {e}")
+            yield sse_event({'type': 'error', 'error': 'Sorry, I encountered an error while processing your request.'})
+        yield sse_event({'type': 'done', 'total_latency_ms': round((time.time() - started) * 1000)})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+# --- Precomputed Model Payloads ---
+# Serialized (and gzipped) route payloads, rebuilt only when the catalog version changes
+model_payloads = {}
+
+def get_model_payload(name, build):
+    """Returns the serialized payload `build(catalog)` for the current catalog, building it once per catalog version."""
+    catalog = model_catalog.current
+    payload = model_payloads.get(name)
+    if payload is None or payload['version'] != catalog.version:
+        body = json.dumps(build(catalog), separators=(',', ':')).encode('utf-8')
+        payload = {
+            'version': catalog.version,
+            # Content hash, so every worker hands out the same ETag for the same data
+            'etag': hashlib.sha256(body).hexdigest()[:32],
+            'body': body,
+            'gzip': gzip.compress(body, compresslevel=9)
+        }
+        model_payloads[name] = payload
+    return payload
+
+def payload_response(payload):
+    """Serves a precomputed payload with a strong ETag, answering 304 when the client already has it."""
+    use_gzip = 'gzip' in request.accept_encodings
+    etag = payload['etag'] + ('-gzip' if use_gzip else '')
+    
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(payload['gzip'] if use_gzip else payload['body'], mimetype='application/json')
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def build_categorized_models(catalog):
+    """Formatted models of every type, keyed by table name."""
+    categorized_models = {}
+    for model_type, table_name in MODEL_TYPE_TABLES:
+        formatted_models = []
+        for model in catalog.models(model_type):
+            try:
+                formatted_models.append(format_model_data(model, model_type))
+            except Exception as e:
+                print(f"Error formatting model {model.get('model_name', 'unknown')}: {e}")
+                continue
+        categorized_models[table_name] = formatted_models
+    return categorized_models
+
+def build_models_data(catalog):
+    """Formatted LLM models split into popular and the rest."""
     # Enhanced popular model detection
     popular_model_patterns = [
         'Claude Sonnet 4', 'Claude Opus 4', 'Gemini 2.5', 'Gemini 2.0 Flash', 
@@ -635,11 +851,8 @@ def get_models_data():
     popular_models = []
     all_other_models = []
 
-    for row in db_models:
-        # Convert row to dict for easier access
-        row_dict = dict(row) if hasattr(row, 'keys') else row
-        
-        formatted = format_model_data(row, 'llm')
+    for row_dict in catalog.models('llm'):
+        formatted = format_model_data(row_dict, 'llm')
         
         # Check if model matches popular patterns
         is_popular = any(
@@ -668,45 +881,60 @@ def get_models_data():
         else:
             break
 
-    return jsonify({
+    return {
         'popular': popular_models,
         'all': all_other_models,
-    })
+    }
+
+@app.route('/models/categorized')
+@login_required
+def get_categorized_models():
+    """Enhanced endpoint to fetch all categorized models from the catalog with full model information."""
+    try:
+        return payload_response(get_model_payload('categorized', build_categorized_models))
+    except Exception as e:
+        print(f"Error in get_categorized_models: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/models')
+@login_required
+def get_models_data():
+    """Enhanced endpoint to fetch LLM models with better categorization."""
+    return payload_response(get_model_payload('models', build_models_data))
 
 @app.route('/models/available')
 @login_required
 def get_available_models():
-    """Get models that have working API clients with enhanced information."""
+    """Get models that have working API clients and answering providers, with enhanced information."""
     if not ai_client:
         return jsonify({'available': []})
     
     available = ai_client.get_available_models()
+    # Image and video models also drop out while the media client's circuit for their provider is open
+    media_available = {}
+    if media_client:
+        for media_type in ('image', 'video'):
+            media_available[media_type] = {m['model_name'] for m in media_client.get_available_models(media_type)}
     
-    # Enhance available models with database information
+    # Enhance available models with catalog information
     enhanced_available = []
-    conn = get_db_conn()
-    try:
-        for model in available:
-            try:
-                # Get full model info from database
-                table = model.get('table', 'llm_models')
-                model_row = conn.execute(
-                    f'SELECT * FROM {table} WHERE model_name = ? AND is_active = 1',
-                    (model['model_name'],)
-                ).fetchone()
-                
-                if model_row:
-                    model_type = table.replace('_models', '') if '_models' in table else 'llm'
-                    enhanced_model = format_model_data(model_row, model_type)
-                    enhanced_model['table'] = table
-                    enhanced_available.append(enhanced_model)
-                else:
-                    enhanced_available.append(model)
-            except Exception as e:
-                print(f"Error enhancing model {model.get('model_name', 'unknown')}: {e}")
+    catalog = model_catalog.current
+    for model in available:
+        try:
+            model_type = model.get('model_type', 'llm')
+            if model_type in media_available and model['model_name'] not in media_available[model_type]:
+                continue
+            model_row = catalog.get(model['model_name'], model_type)
+            
+            if model_row:
+                enhanced_model = format_model_data(model_row, model_type)
+                enhanced_model['table'] = model['table']
+                enhanced_available.append(enhanced_model)
+            else:
                 enhanced_available.append(model)
-    finally:
-        conn.close()
+        except Exception as e:
+            print(f"Error enhancing model {model.get('model_name', 'unknown')}: {e}")
+            enhanced_available.append(model)
     
     return jsonify({'available': enhanced_available})
 
@@ -722,20 +950,13 @@ def admin_get_models():
     conn = get_db_conn()
     try:
         models = conn.execute('''
-            SELECT * FROM llm_models 
+            SELECT * FROM models
+            WHERE model_type = 'llm'
             ORDER BY provider_name, model_name
         ''').fetchall()
         models_list = [dict(model) for model in models]
         return jsonify({'models': models_list})
-    except sqlite3.OperationalError as e:
-        if "no such table: llm_models" in str(e):
-            try:
-                models = conn.execute('SELECT * FROM models ORDER BY provider_name, model_name').fetchall()
-                models_list = [dict(model) for model in models]
-                return jsonify({'models': models_list})
-            except Exception as e_fallback:
-                 print(f"Error fetching from fallback 'models' table: {e_fallback}")
-                 return jsonify({'error': "Database schema mismatch. 'llm_models' and 'models' tables not found."}), 500
+    except Exception as e:
         print(f"Error fetching models for admin: {e}")
         return jsonify({'error': str(e)}), 500
     finally:
@@ -752,7 +973,9 @@ def admin_get_providers():
                 COUNT(id) AS total_models,
                 SUM(CASE WHEN is_active = 1 THEN 1 ELSE 0 END) AS active_models
             FROM
-                llm_models
+                models
+            WHERE
+                model_type = 'llm'
             GROUP BY
                 provider_name
             ORDER BY
@@ -777,8 +1000,8 @@ def admin_search_models():
     try:
         search_term = f'%{query}%'
         models = conn.execute('''
-            SELECT * FROM llm_models
-            WHERE model_name LIKE ? OR provider_name LIKE ? OR notes LIKE ?
+            SELECT * FROM models
+            WHERE model_type = 'llm' AND (model_name LIKE ? OR provider_name LIKE ? OR notes LIKE ?)
             ORDER BY provider_name, model_name
         ''', (search_term, search_term, search_term)).fetchall()
         
@@ -803,20 +1026,22 @@ def admin_add_model():
         
         conn = get_db_conn()
         try:
-            existing = conn.execute('SELECT id FROM llm_models WHERE model_name = ?', (model_name,)).fetchone()
+            existing = conn.execute(
+                "SELECT id FROM models WHERE model_type = 'llm' AND model_name = ?", (model_name,)
+            ).fetchone()
             if existing:
                 return jsonify({'error': f'Model "{model_name}" already exists.'}), 400
             
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO llm_models (
-                    provider_name, model_name, api_name, context_window_max_tokens,
+                INSERT INTO models (
+                    model_type, provider_name, provider_rank, model_name, api_name, context_window_max_tokens,
                     supports_images_input, supports_pdfs_input, multimodal_input,
                     reasoning_enabled, usd_per_million_input_tokens, 
                     usd_per_million_output_tokens, is_active, notes
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ) VALUES ('llm', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
-                provider_name, model_name, data.get('api_name', model_name),
+                provider_name, provider_rank(provider_name), model_name, data.get('api_name', model_name),
                 data.get('context_window_max_tokens'), bool(data.get('supports_images_input', False)),
                 bool(data.get('supports_pdfs_input', False)), bool(data.get('multimodal_input', False)),
                 bool(data.get('reasoning_enabled', False)), data.get('usd_per_million_input_tokens'),
@@ -824,6 +1049,7 @@ def admin_add_model():
                 data.get('notes', '')
             ))
             conn.commit()
+            model_catalog.reload()
             return jsonify({'success': True, 'message': f'Model "{model_name}" added successfully.'})
         finally:
             conn.close()
@@ -836,8 +1062,9 @@ def admin_add_model():
 def admin_delete_model(model_id):
     conn = get_db_conn()
     try:
-        conn.execute('DELETE FROM llm_models WHERE id = ?', (model_id,))
+        conn.execute('DELETE FROM models WHERE id = ?', (model_id,))
         conn.commit()
+        model_catalog.reload()
         return jsonify({'success': True, 'message': 'Model deleted successfully.'})
     except Exception as e:
         print(f"Error deleting model: {e}")
@@ -845,58 +1072,185 @@ def admin_delete_model(model_id):
     finally:
         conn.close()
 
+@app.route('/admin/http-pools')
+@admin_required
+def admin_http_pools():
+    """Connection pool utilisation for the media providers' HTTP sessions."""
+    if not media_client:
+        return jsonify({'error': 'Media client not initialized'}), 500
+    return jsonify({'pools': media_client.get_http_stats()})
+
+@app.route('/admin/db-pools')
+@admin_required
+def admin_db_pools():
+    """Connections opened and handed out by the SQLite pools in this worker."""
+    return jsonify({'pools': pool_stats()})
+
+@app.route('/admin/password-hasher')
+@admin_required
+def admin_password_hasher():
+    """Queue depth, rejections and timing of the password hashing pool."""
+    return jsonify(password_hasher.stats())
+
+@app.route('/admin/usage')
+@admin_required
+def admin_usage():
+    """Write-behind queue depth of the usage meter."""
+    if not usage_meter:
+        return jsonify({'error': 'Usage metering not initialized'}), 500
+    return jsonify(usage_meter.stats())
+
+@app.route('/admin/usage/spend')
+@admin_required
+def admin_usage_spend():
+    """Usage and cost over the last ?days=, grouped by ?group=provider|model|user; reads the daily rollups only."""
+    if not usage_meter:
+        return jsonify({'error': 'Usage metering not initialized'}), 500
+    days = request_int_arg('days', 30, 1, 366)
+    group = request.args.get('group', 'provider')
+    if group == 'provider':
+        rows = usage_meter.usage_by_provider(days)
+    elif group in ('model', 'user'):
+        rows = usage_meter.usage_by({'model': 'model_name', 'user': 'user_id'}[group], days)
+    else:
+        return jsonify({'error': "group must be 'provider', 'model' or 'user'"}), 400
+    return jsonify({'days': days, 'group': group, 'rows': rows, 'daily': usage_meter.daily_usage(days)})
+
+@app.route('/admin/usage/hourly')
+@admin_required
+def admin_usage_hourly():
+    """Usage and cost per UTC hour over the last ?hours=; reads the hourly rollups only."""
+    if not usage_meter:
+        return jsonify({'error': 'Usage metering not initialized'}), 500
+    hours = request_int_arg('hours', 48, 1, 24 * 31)
+    return jsonify({'hours': hours, 'rows': usage_meter.hourly_usage(hours)})
+
+@app.route('/admin/scheduler')
+@admin_required
+def admin_scheduler():
+    """Rate limits, queue depth and back-offs per LLM provider, and per-model latency for hedging."""
+    if not ai_client:
+        return jsonify({'error': 'AI client not initialized'}), 500
+    return jsonify({'providers': ai_client.get_scheduler_stats(), 'latency': ai_client.get_latency_stats()})
+
+@app.route('/admin/provider-health')
+@admin_required
+def admin_provider_health():
+    """Circuit state, error/timeout rates and latency percentiles per provider, for chat and media clients."""
+    return jsonify({
+        'llm': ai_client.get_health_stats() if ai_client else None,
+        'media': media_client.get_health_stats() if media_client else None
+    })
+
+@app.route('/admin/media-jobs')
+@admin_required
+def admin_media_jobs():
+    """Media job counts, and how many long-running operations this worker is polling."""
+    if not media_jobs:
+        return jsonify({'error': 'Media jobs not initialized'}), 500
+    return jsonify(media_jobs.stats())
+
+@app.route('/admin/media-store')
+@admin_required
+def admin_media_store():
+    """Files and bytes in the generated media store, by type."""
+    if not media_store:
+        return jsonify({'error': 'Media store not initialized'}), 500
+    return jsonify(media_store.stats())
+
+@app.route('/admin/cache')
+@admin_required
+def admin_cache_stats():
+    """Response cache hit/miss counters and sizes."""
+    if not response_cache:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, 'stats': response_cache.stats()})
+
+@app.route('/admin/cache', methods=['DELETE'])
+@admin_required
+def admin_clear_cache():
+    if not response_cache:
+        return jsonify({'error': 'Response cache is disabled'}), 400
+    response_cache.clear()
+    return jsonify({'success': True})
+
 @app.route('/model/<model_name>')
 @login_required
 def get_model_details(model_name):
     """Get detailed information about a specific model with enhanced data."""
-    conn = get_db_conn()
     try:
-        # Search across all model tables
-        tables = ['llm_models', 'image_models', 'audio_models', 'video_models', 'models']
-        model = None
-        model_type = 'llm'
-        
-        for table in tables:
-            try:
-                model = conn.execute(
-                    f'SELECT * FROM {table} WHERE model_name = ? AND is_active = 1', 
-                    (model_name,)
-                ).fetchone()
-                if model:
-                    model_type = table.replace('_models', '') if '_models' in table else 'llm'
-                    break
-            except sqlite3.OperationalError:
-                continue
-        
+        model = model_catalog.current.get(model_name)
         if not model:
             return jsonify({'error': 'Model not found'}), 404
             
-        formatted_model = format_model_data(model, model_type)
+        formatted_model = format_model_data(model, model['model_type'])
         return jsonify(formatted_model)
         
     except Exception as e:
         print(f"Error fetching model details: {e}")
         return jsonify({'error': 'Internal server error'}), 500
-    finally:
-        conn.close()
 
-if __name__ == '__main__':
-    print(f"Starting T3 Chat with database at: {DB_PATH}")
+# --- Application Factory ---
+def warm_shared_state():
+    """Loads what every worker reads but never changes; safe to do before forking."""
+    global _shared_state_warmed
+    if _shared_state_warmed:
+        return
     check_db_exists()
     check_user_db_exists()
     
+    # Apply pending schema migrations once, before any worker starts; everything after this assumes the latest schema
+    applied = migrate_databases(DB_PATH, USER_DB_PATH, DATA_DB_PATH)
+    for database, versions in applied.items():
+        print(f"Migrated {database}.db to schema version {latest_version(database)} (applied {', '.join(map(str, versions))}).")
+    
+    # Load the model catalog once up front so no request pays for it
+    model_catalog.reload()
+    get_model_payload('categorized', build_categorized_models)
+    get_model_payload('models', build_models_data)
+    _shared_state_warmed = True
+
+def init_services():
+    """Builds this process's storage, metering and provider clients; they own threads and connections that don't survive a fork."""
+    global conversation_store, usage_meter, response_cache, ai_client, media_client, media_jobs, media_store
+    
+    # Initialize chat history storage
+    try:
+        conversation_store = ConversationStore(DATA_DB_PATH)
+        print(f"Chat history stored in '{DATA_DB_PATH}'")
+    except Exception as e:
+        print(f"Failed to initialize chat history storage: {e}")
+        print("The app will run but conversations will not be saved.")
+    
+    # Initialize usage accounting
+    try:
+        usage_meter = UsageMeter(DATA_DB_PATH, USER_DB_PATH, catalog=model_catalog)
+        print(f"Token usage recorded in '{DATA_DB_PATH}'")
+    except Exception as e:
+        print(f"Failed to initialize usage metering: {e}")
+        print("The app will run but token usage will not be recorded or limited.")
+    
+    # Initialize the response cache
+    if RESPONSE_CACHE_ENABLED:
+        try:
+            response_cache = ResponseCache(CACHE_DB_PATH)
+            print(f"Response cache stored in '{CACHE_DB_PATH}'")
+        except Exception as e:
+            print(f"Failed to initialize response cache: {e}")
+            print("The app will run without caching responses.")
+    
     # Initialize AI Client
     try:
-        ai_client = AIClient(DB_PATH)
+        ai_client = AIClient(DB_PATH, catalog=model_catalog, cache=response_cache)
         available_models = ai_client.get_available_models()
         print(f"AI Client initialized with {len(available_models)} available models")
         if available_models:
             print("Available LLM models:")
-            llm_models = [m for m in available_models if m.get('table') == 'llm_models'][:5]
+            llm_models = [m for m in available_models if m.get('model_type') == 'llm'][:5]
             for model in llm_models:
                 print(f"  - {model['model_name']} ({model['provider_name']})")
-            if len([m for m in available_models if m.get('table') == 'llm_models']) > 5:
-                llm_count = len([m for m in available_models if m.get('table') == 'llm_models'])
+            if len([m for m in available_models if m.get('model_type') == 'llm']) > 5:
+                llm_count = len([m for m in available_models if m.get('model_type') == 'llm'])
                 print(f"  ... and {llm_count - 5} more LLM models")
         else:
             print("WARNING: No LLM models available. Please check your API keys in .env file.")
@@ -906,7 +1260,7 @@ if __name__ == '__main__':
     
     # Initialize Media Client
     try:
-        media_client = MediaClient(DB_PATH)
+        media_client = MediaClient(DB_PATH, catalog=model_catalog, cache=response_cache)
         available_image_models = media_client.get_available_models('image')
         available_video_models = media_client.get_available_models('video')
         available_audio_models = media_client.get_available_models('audio')
@@ -923,6 +1277,64 @@ if __name__ == '__main__':
         print(f"Failed to initialize Media Client: {e}")
         print("The app will run but image/video/audio generation will be limited.")
     
+    # Generated files are kept locally instead of linking to provider URLs that expire
+    if media_client:
+        try:
+            media_store = MediaStore(DATA_DB_PATH, media_client.http, variants=ImageVariants())
+            media_client.store = media_store
+            print(f"Generated media stored in '{media_store.root}'")
+            if media_store.variants:
+                print(f"  - WebP/AVIF variants and thumbnails encoded by {media_store.variants.workers} processes")
+        except Exception as e:
+            print(f"Failed to initialize media store: {e}")
+            print("The app will run but generated media will link to the providers' URLs.")
+    
+    # Image and video generations run as background jobs
+    if media_client:
+        try:
+            media_jobs = MediaJobs(DATA_DB_PATH, media_client, on_finish=record_media_job_usage)
+            print(f"Media jobs tracked in '{DATA_DB_PATH}' with {media_jobs.workers} workers")
+        except Exception as e:
+            print(f"Failed to initialize media jobs: {e}")
+            print("The app will run but image/video generation will be unavailable.")
+
+def init_worker():
+    """Initializes the current process once: shared state if it wasn't warmed before the fork, then its own services."""
+    global _worker_pid
+    if _worker_pid == os.getpid():
+        return
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+        warm_shared_state()
+        init_services()
+        _worker_pid = os.getpid()
+        print(f"Worker {_worker_pid} initialized.")
+
+@app.before_request
+def ensure_worker_initialized():
+    # A no-op after the first request; catches workers whose server has no post-fork hook (flask run, uwsgi)
+    init_worker()
+
+def create_app():
+    """
+    The app for a WSGI server, e.g. gunicorn -c gunicorn.conf.py 'app:create_app()'.
+    
+    With WORKER_INIT=prefork the catalog, model payloads and configured provider
+    SDKs are loaded here, in the server's master process when it preloads the app.
+    Each worker then starts its own services (writer threads, provider clients,
+    the dispatcher's event loop) from the server's post-fork hook or on its first request.
+    """
+    if WORKER_INIT == 'prefork':
+        print(f"Starting T3 Chat with database at: {DB_PATH}")
+        warm_shared_state()
+        preload_sdks()
+    return app
+
+if __name__ == '__main__':
+    print(f"Starting T3 Chat with database at: {DB_PATH}")
+    init_worker()
+    
     os.makedirs('static', exist_ok=True)
     os.makedirs('db', exist_ok=True)
     
@@ -1,22 +1,33 @@
 # File: auth.py
 
 import uuid
-from flask import Blueprint, render_template, request, flash, redirect, url_for
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask_login import login_user, logout_user, login_required, current_user, UserMixin
 import sqlite3
+from flask import Blueprint, render_template, request, flash, redirect, url_for, session
+from flask_login import login_user, logout_user, login_required, current_user, UserMixin
 import os
+import time
+import threading
+from collections import OrderedDict
 from datetime import datetime
 
+from database.lib.database_manager import get_connection
+from password_hasher import password_hasher, HasherBusy
+
 # --- Database Configuration ---
 DB_DIR = 'db'
 USER_DB_PATH = os.path.join(DB_DIR, 'user.db')
 
+# --- User Cache Configuration ---
+# How long a loaded user is trusted before user.db is read again
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '60'))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+# Also keep the user's fields in the (signed) session cookie, so even a cache miss skips user.db
+USER_SESSION_FIELDS = os.getenv('USER_SESSION_FIELDS', 'false').lower() == 'true'
+SESSION_USER_KEY = '_user_fields'
+
 def get_user_db_conn():
-    """Establishes a connection to the user SQLite database."""
-    conn = sqlite3.connect(USER_DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """A pooled connection to the user database; close() returns it to the pool."""
+    return get_connection(USER_DB_PATH)
 
 # --- User Model for Flask-Login ---
 class User(UserMixin):
@@ -44,6 +55,98 @@ class User(UserMixin):
         )
         return user
 
+    def to_fields(self):
+        return {'id': self.id, 'email': self.email, 'name': self.name, 'subscription_plan': self.subscription_plan}
+
+# --- User Cache ---
+class UserCache:
+    """
+    Bounded LRU of user fields keyed by user_id, each entry trusted for `ttl` seconds.
+
+    Flask-Login loads the user on every authenticated request; this keeps that
+    from being a user.db query each time. Anything that changes a user_accounts
+    row must call invalidate(user_id).
+    """
+
+    def __init__(self, ttl=USER_CACHE_TTL, max_size=USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # user_id -> (expires_at, fields)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """The user, from cache if fresh, otherwise from user.db"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                # A fresh object per request, so nothing leaks between requests
+                return User(**entry[1])
+
+        user = User.get(user_id)
+        if user:
+            self.put(user)
+        return user
+
+    def put(self, user):
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl, user.to_fields())
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+user_cache = UserCache()
+
+def remember_user(user):
+    """Caches a just-loaded user and, if enabled, signs its fields into the session cookie."""
+    user_cache.put(user)
+    if USER_SESSION_FIELDS:
+        session[SESSION_USER_KEY] = dict(user.to_fields(), loaded_at=time.time())
+
+def invalidate_user(user_id):
+    """Drops cached copies of a user after their user_accounts row changed."""
+    user_cache.invalidate(user_id)
+    if USER_SESSION_FIELDS:
+        fields = session.get(SESSION_USER_KEY)
+        if fields and fields.get('id') == user_id:
+            session.pop(SESSION_USER_KEY, None)
+
+def load_user(user_id):
+    """Flask-Login user loader: session fields, then the user cache, then user.db."""
+    if USER_SESSION_FIELDS:
+        fields = session.get(SESSION_USER_KEY)
+        if fields and fields.get('id') == user_id and time.time() - fields.get('loaded_at', 0) < USER_CACHE_TTL:
+            return User(**{key: value for key, value in fields.items() if key != 'loaded_at'})
+
+    user = user_cache.get(user_id)
+    if user and USER_SESSION_FIELDS:
+        session[SESSION_USER_KEY] = dict(user.to_fields(), loaded_at=time.time())
+    return user
+
+def rehash_password_later(user_id, password):
+    """Re-hashes a password made with an outdated method, off the request path."""
+    future = password_hasher.hash_async(password)
+
+    def store(future):
+        if future.exception():
+            return
+        conn = get_user_db_conn()
+        try:
+            conn.execute(
+                'UPDATE user_accounts SET hashed_password = ? WHERE user_id = ?',
+                (future.result(), user_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    future.add_done_callback(store)
+
 # --- Auth Blueprint ---
 auth = Blueprint('auth', __name__)
 
@@ -60,14 +163,25 @@ def login():
         user_data = conn.execute(
             'SELECT * FROM user_accounts WHERE email = ?', (email,)
         ).fetchone()
-        
-        if not user_data or not check_password_hash(user_data['hashed_password'], password):
+        conn.close()
+
+        try:
+            # Google-only accounts have no password hash
+            password_ok = bool(user_data and user_data['hashed_password']) and \
+                password_hasher.verify(user_data['hashed_password'], password)
+        except HasherBusy:
+            flash('Too many sign-ins right now, please try again in a moment.', 'error')
+            return redirect(url_for('auth.login'))
+
+        if not password_ok:
             flash('Please check your login details and try again.', 'error')
-            conn.close()
             return redirect(url_for('auth.login'))
-        
-        conn.close()
+
+        if password_hasher.needs_rehash(user_data['hashed_password']):
+            rehash_password_later(user_data['user_id'], password)
+
         user_obj = User.get(user_data['user_id'])
+        remember_user(user_obj)
         login_user(user_obj, remember=True)
         
         return redirect(url_for('index'))
@@ -98,31 +212,46 @@ def signup():
             user_data = conn.execute(
                 'SELECT user_id FROM user_accounts WHERE email = ?', (email,)
             ).fetchone()
-            
-            if user_data:
-                flash('Email address already exists.', 'error')
-                return redirect(url_for('auth.signup'))
-            
-            new_user_id = str(uuid.uuid4())
-            hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
-            
+        finally:
+            conn.close()
+
+        if user_data:
+            flash('Email address already exists.', 'error')
+            return redirect(url_for('auth.signup'))
+
+        # Hash before checking out the connection for the insert, so it isn't held while hashing
+        new_user_id = str(uuid.uuid4())
+        try:
+            hashed_password = password_hasher.hash(password)
+        except HasherBusy:
+            flash('Too many sign-ups right now, please try again in a moment.', 'error')
+            return redirect(url_for('auth.signup'))
+
+        conn = get_user_db_conn()
+        try:
             conn.execute(
                 '''INSERT INTO user_accounts (user_id, email, name, hashed_password)
                    VALUES (?, ?, ?, ?)''',
                 (new_user_id, email, name, hashed_password)
             )
             conn.commit()
-
-            user_obj = User.get(new_user_id)
-            login_user(user_obj, remember=True)
-            return redirect(url_for('index'))
+        except sqlite3.IntegrityError:
+            # Signed up with the same email while this one was hashing
+            flash('Email address already exists.', 'error')
+            return redirect(url_for('auth.signup'))
         finally:
             conn.close()
 
+        user_obj = User.get(new_user_id)
+        remember_user(user_obj)
+        login_user(user_obj, remember=True)
+        return redirect(url_for('index'))
+
     return render_template('signup.html')
 
 @auth.route('/logout')
 @login_required
 def logout():
+    invalidate_user(current_user.id)
     logout_user()
     return redirect(url_for('auth.login'))
\ No newline at end of file
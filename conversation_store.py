@@ -0,0 +1,312 @@
+# conversation_store.py - Persisted chat history in data.db
+
+import sqlite3
+import threading
+import atexit
+import uuid
+import logging
+from datetime import datetime, timezone
+
+from database.lib.database_manager import get_connection
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_COLUMNS = 'rowid, message_id, chat_id, sender_type, message_text, timestamp, tokens_used, token_estimate, model_used'
+
+
+def estimate_tokens(text):
+    """Rough prompt-token count for a message: ~4 characters per token plus per-message overhead"""
+    return (len(text or '') + 3) // 4 + 4
+
+
+def _now():
+    """UTC timestamp in SQLite's CURRENT_TIMESTAMP format, with microseconds so turns sort in order"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def encode_cursor(message):
+    """Opaque keyset cursor pointing at a message"""
+    return f"{message['timestamp']}|{message['rowid']}"
+
+
+def decode_cursor(cursor):
+    timestamp, rowid = cursor.rsplit('|', 1)
+    return timestamp, int(rowid)
+
+
+class ConversationStore:
+    """
+    Appends chat turns to data.db and reads back recent history.
+
+    Writes are queued and committed by one background writer thread in
+    batched transactions, so a /chat request never waits on a disk sync.
+    Reads are keyset-paginated on (chat_id, timestamp), so loading the
+    latest page costs the same for a 10-message chat as for a 50,000-message one.
+    Messages still waiting in the write queue are merged into reads.
+    """
+
+    def __init__(self, db_path, batch_size=64, flush_interval=0.5):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending_sessions = {}  # chat_id -> session row
+        self._pending_messages = []  # message rows in append order
+        self._pending_estimates = {}  # message_id -> token estimate backfilled for older rows
+        self._pending_summaries = {}  # chat_id -> (summary, summary_through)
+        self._closed = False
+
+        self._writer = threading.Thread(target=self._writer_loop, name='conversation-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _read(self, sql, params):
+        """Rows of one query, on a pooled connection checked out just for it"""
+        conn = get_connection(self.db_path)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    # --- Writes ---
+
+    def create_session(self, user_id, title=None, system_prompt=None):
+        """Start a new chat and return its chat_id"""
+        chat_id = str(uuid.uuid4())
+        with self._lock:
+            self._pending_sessions[chat_id] = {
+                'chat_id': chat_id,
+                'user_id': user_id,
+                'title': title,
+                'created_at': _now(),
+                'system_prompt': system_prompt
+            }
+        self._wakeup.set()
+        return chat_id
+
+    def append(self, chat_id, sender_type, message_text, model_used=None, tokens_used=0):
+        """Queue one message for the next batched write and return its message_id"""
+        message = {
+            'message_id': str(uuid.uuid4()),
+            'chat_id': chat_id,
+            'sender_type': sender_type,
+            'message_text': message_text,
+            'timestamp': _now(),
+            'tokens_used': tokens_used or 0,
+            # Cached once so building later prompts never re-counts old turns
+            'token_estimate': tokens_used or estimate_tokens(message_text),
+            'model_used': model_used
+        }
+        with self._lock:
+            self._pending_messages.append(message)
+            queued = len(self._pending_messages)
+        if queued >= self.batch_size:
+            self._wakeup.set()
+        return message['message_id']
+
+    def append_turn(self, chat_id, user_message, ai_response, model_used=None, tokens_used=0):
+        """Queue a user message and the AI reply to it"""
+        self.append(chat_id, 'user', user_message)
+        self.append(chat_id, 'ai', ai_response, model_used=model_used, tokens_used=tokens_used)
+
+    def update_summary(self, chat_id, summary, summary_through):
+        """Queue a new rolling summary covering every message up to summary_through"""
+        with self._lock:
+            self._pending_summaries[chat_id] = (summary, summary_through)
+        self._wakeup.set()
+
+    def flush(self):
+        """Write everything queued so far in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                sessions = list(self._pending_sessions.values())
+                messages = list(self._pending_messages)
+                estimates = dict(self._pending_estimates)
+                summaries = dict(self._pending_summaries)
+            if not sessions and not messages and not estimates and not summaries:
+                return
+
+            try:
+                conn = get_connection(self.db_path)
+                try:
+                    with conn:
+                        conn.executemany(
+                            '''INSERT OR IGNORE INTO chat_sessions (chat_id, user_id, title, created_at, system_prompt)
+                               VALUES (:chat_id, :user_id, :title, :created_at, :system_prompt)''',
+                            sessions
+                        )
+                        conn.executemany(
+                            '''INSERT OR IGNORE INTO chat_messages
+                               (message_id, chat_id, sender_type, message_text, timestamp, tokens_used, token_estimate, model_used)
+                               VALUES (:message_id, :chat_id, :sender_type, :message_text, :timestamp, :tokens_used, :token_estimate, :model_used)''',
+                            messages
+                        )
+                        conn.executemany(
+                            'UPDATE chat_messages SET token_estimate = ? WHERE message_id = ?',
+                            [(estimate, message_id) for message_id, estimate in estimates.items()]
+                        )
+                        # Never let a slow summary job overwrite a newer one
+                        conn.executemany(
+                            '''UPDATE chat_sessions SET summary = ?, summary_through = ?
+                               WHERE chat_id = ? AND (summary_through IS NULL OR summary_through < ?)''',
+                            [(summary, through, chat_id, through) for chat_id, (summary, through) in summaries.items()]
+                        )
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write {len(messages)} chat messages: {e}")
+                return
+
+            # Only drop rows from the queue once they are committed, so reads never miss them
+            with self._lock:
+                for session in sessions:
+                    self._pending_sessions.pop(session['chat_id'], None)
+                del self._pending_messages[:len(messages)]
+                for message_id in estimates:
+                    self._pending_estimates.pop(message_id, None)
+                for chat_id, summary in summaries.items():
+                    if self._pending_summaries.get(chat_id) == summary:
+                        del self._pending_summaries[chat_id]
+
+    def _writer_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Flush outstanding writes and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join(timeout=5)
+        self.flush()
+
+    # --- Reads ---
+
+    def get_session(self, chat_id):
+        """Fetch a chat session by id, or None"""
+        with self._lock:
+            session = self._pending_sessions.get(chat_id)
+            pending_summary = self._pending_summaries.get(chat_id)
+
+        if session:
+            session = dict(session)
+        else:
+            rows = self._read('SELECT * FROM chat_sessions WHERE chat_id = ?', (chat_id,))
+            if not rows:
+                return None
+            session = dict(rows[0])
+
+        if pending_summary:
+            session['summary'], session['summary_through'] = pending_summary
+        return session
+
+    def get_page(self, chat_id, limit=50, before=None):
+        """
+        Read one page of a chat, newest messages first.
+
+        Args:
+            chat_id: The chat to read
+            limit: Page size
+            before: Cursor from a previous page; omit for the latest messages
+
+        Returns:
+            tuple: (messages oldest-first, cursor for the next older page or None)
+        """
+        # Pagination cursors point at committed rows, so make sure everything is on disk
+        self.flush()
+
+        if before:
+            timestamp, rowid = decode_cursor(before)
+            rows = self._read(
+                f'''SELECT {MESSAGE_COLUMNS} FROM chat_messages
+                    WHERE chat_id = ? AND (timestamp, rowid) < (?, ?)
+                    ORDER BY timestamp DESC, rowid DESC
+                    LIMIT ?''',
+                (chat_id, timestamp, rowid, limit)
+            )
+        else:
+            rows = self._read(
+                f'''SELECT {MESSAGE_COLUMNS} FROM chat_messages
+                    WHERE chat_id = ?
+                    ORDER BY timestamp DESC, rowid DESC
+                    LIMIT ?''',
+                (chat_id, limit)
+            )
+
+        messages = [dict(row) for row in rows]
+        next_cursor = encode_cursor(messages[-1]) if len(messages) == limit else None
+        messages.reverse()
+        return messages, next_cursor
+
+    def recent_messages(self, chat_id, limit=40):
+        """The last `limit` messages of a chat, oldest first, including ones not yet written"""
+        with self._lock:
+            pending = [dict(m) for m in self._pending_messages if m['chat_id'] == chat_id]
+
+        pending = pending[-limit:]
+        rows = []
+        if len(pending) < limit:
+            rows = self._read(
+                f'''SELECT {MESSAGE_COLUMNS} FROM chat_messages
+                    WHERE chat_id = ?
+                    ORDER BY timestamp DESC, rowid DESC
+                    LIMIT ?''',
+                (chat_id, limit)
+            )
+
+        # A flush can land between the two reads above, so de-duplicate by message_id
+        seen = {m['message_id'] for m in pending}
+        stored = [dict(row) for row in reversed(rows) if row['message_id'] not in seen]
+        return (stored + pending)[-limit:]
+
+    def history_for_model(self, chat_id, limit=40, after=None):
+        """
+        Recent messages in the role/content shape AIClient expects, oldest first
+
+        Each turn also carries its cached 'tokens' estimate and 'timestamp'.
+        Messages at or before `after` (already folded into a summary) are skipped.
+        """
+        history = []
+        backfill = {}
+        for m in self.recent_messages(chat_id, limit):
+            if after and m['timestamp'] <= after:
+                continue
+            tokens = m.get('token_estimate')
+            if not tokens:
+                # Row written before estimates were cached; count it once and store it
+                tokens = estimate_tokens(m['message_text'])
+                backfill[m['message_id']] = tokens
+            history.append({
+                'role': 'user' if m['sender_type'] == 'user' else 'assistant',
+                'content': m['message_text'],
+                'tokens': tokens,
+                'timestamp': m['timestamp']
+            })
+
+        if backfill:
+            with self._lock:
+                self._pending_estimates.update(backfill)
+        return history
+
+    def messages_to_summarize(self, chat_id, after, before, inclusive=False, limit=40):
+        """
+        Messages newer than `after` and older than `before` (or up to and including
+        it when inclusive), oldest first: the turns a rolling summary still has to absorb.
+        At most the newest `limit` of them are returned.
+        """
+        self.flush()
+        upper = '<=' if inclusive else '<'
+        rows = self._read(
+            f'''SELECT {MESSAGE_COLUMNS} FROM chat_messages
+                WHERE chat_id = ? AND timestamp > ? AND timestamp {upper} ?
+                ORDER BY timestamp DESC, rowid DESC
+                LIMIT ?''',
+            (chat_id, after or '', before, limit)
+        )
+        return [dict(row) for row in reversed(rows)]
@@ -1,6 +1,17 @@
 import sqlite3
 import os
+import time
+import threading
 import logging
+from contextlib import contextmanager
+
+# Pool settings
+SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHED_STATEMENTS: int = int(os.getenv("SQLITE_CACHED_STATEMENTS", "256"))
+SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_HEALTH_CHECK_SECONDS: float = float(os.getenv("SQLITE_HEALTH_CHECK_SECONDS", "30"))
+# Idle connections kept per database file and process; more are opened under load and closed on return
+SQLITE_POOL_SIZE: int = int(os.getenv("SQLITE_POOL_SIZE", "8"))
 
 # Database functions
 def load_db_script(script_name: str) -> str:
@@ -14,7 +25,7 @@ def database_check_success(operation: str, database: str, succ: dict[str, str],
         logger.info(f"\"{operation}\" on {database} was a Success.")
     else:
         logger.critical(f"Failed to {operation} on {database}!")
-        logger.info(f"Failure output: {succ["reason"]}")
+        logger.info(f"Failure output: {succ['reason']}")
         exit(1)
     
     return
@@ -83,18 +94,215 @@ class Models_DB:
         self.DB_DIR = 'database'
         self.DB_PATH = os.path.join(self.DB_DIR, 'models.db')
         
+        # Only connections currently checked out; the pool owns the actual handles
         self.conns: dict[int, sqlite3.Connection] = {}
+        self._next_id: int = 0
+        self._lock: threading.Lock = threading.Lock()
 
-    def get_db_conn(self) -> sqlite3.Connection:
-        conn: sqlite3.Connection = sqlite3.connect(self.DB_PATH)
-        conn.row_factory = sqlite3.Row
+    def get_db_conn(self) -> tuple[int, sqlite3.Connection]:
+        conn: sqlite3.Connection = get_connection(self.DB_PATH)
 
-        id = len(self.conns.keys())
-        self.conns[id] = conn
+        with self._lock:
+            id = self._next_id
+            self._next_id += 1
+            self.conns[id] = conn
         return id, conn
     
     def destroy_conn(self, id) -> None:
-        self.conns[id].close()
-        self.conns[id] = None
+        with self._lock:
+            conn: sqlite3.Connection | None = self.conns.pop(id, None)
+        if conn is not None:
+            conn.close() # Back to the pool
+
+        return
+
+# Connection pool
+class PooledConnection(sqlite3.Connection):
+    """
+    A pooled connection: close() hands it back to its pool instead of closing it.
+
+    Code written as connect/use/close keeps working unchanged. As with a real
+    close, an uncommitted transaction is rolled back when it is closed.
+    """
+
+    pool: "ConnectionPool | None" = None
+    pid: int = 0
+    in_use: bool = False
+    idle_since: float = 0.0
+
+    def close(self) -> None:
+        if self.pool is None:
+            super().close()
+            return
+        self.pool.release(self)
+
+    def discard(self) -> None:
+        """Really close the underlying SQLite connection"""
+        super().close()
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections to one database file, per process.
+
+    Every connection is opened in WAL mode with synchronous=NORMAL, memory-mapped
+    reads and a larger prepared-statement cache, so readers never wait on a
+    writer and repeat queries skip re-preparing. Each connection() checks out a
+    connection no one else holds, nested calls on one thread included, so an
+    inner `with conn:` never commits an outer caller's transaction. close()
+    puts it back for any thread to reuse; at most `size` idle connections are
+    kept and any beyond that are really closed, so short-lived request threads
+    never leave connections behind. An idle connection is health-checked
+    before reuse and reopened if broken. After a fork the child opens its own
+    connections rather than sharing the parent's.
+    """
+
+    def __init__(self, db_path: str, size: int=SQLITE_POOL_SIZE, mmap_size: int=SQLITE_MMAP_SIZE,
+                 cached_statements: int=SQLITE_CACHED_STATEMENTS,
+                 busy_timeout_ms: int=SQLITE_BUSY_TIMEOUT_MS,
+                 health_check_seconds: float=SQLITE_HEALTH_CHECK_SECONDS) -> None:
+        self.db_path: str = db_path
+        self.size: int = size
+        self.mmap_size: int = mmap_size
+        self.cached_statements: int = cached_statements
+        self.busy_timeout_ms: int = busy_timeout_ms
+        self.health_check_seconds: float = health_check_seconds
+
+        self._lock: threading.Lock = threading.Lock()
+        self._reset_for_process()
+
+    def _reset_for_process(self) -> None:
+        self._pid: int = os.getpid()
+        self._idle: list[PooledConnection] = []  # most recently used last
+        self._in_use: int = 0
+        self._stats: dict[str, int] = {"opened": 0, "acquired": 0, "reconnected": 0, "discarded": 0}
+
+    def _open(self) -> PooledConnection:
+        conn: PooledConnection = sqlite3.connect(
+            self.db_path,
+            factory=PooledConnection,
+            cached_statements=self.cached_statements,
+            timeout=self.busy_timeout_ms / 1000,
+            # Checked out by one thread at a time, but not always the one that opened it
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.pool = self
+        conn.pid = os.getpid()
+
+        with self._lock:
+            self._stats["opened"] += 1
+        return conn
+
+    def _healthy(self, conn: PooledConnection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn: PooledConnection) -> None:
+        try:
+            conn.discard()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._stats["discarded"] += 1
+
+    def connection(self) -> PooledConnection:
+        """A connection of the caller's own; pair each call with close() (or use connect())"""
+        if os.getpid() != self._pid:
+            # Forked: never touch the parent's SQLite handles
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._reset_for_process()
+
+        while True:
+            with self._lock:
+                conn: PooledConnection | None = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._open()
+                break
+            if time.monotonic() - conn.idle_since <= self.health_check_seconds or self._healthy(conn):
+                break
+            self._discard(conn)
+            with self._lock:
+                self._stats["reconnected"] += 1
+
+        conn.in_use = True
+        with self._lock:
+            self._in_use += 1
+            self._stats["acquired"] += 1
+        return conn
+
+    def release(self, conn: PooledConnection) -> None:
+        if conn.pid != os.getpid():
+            # Opened before a fork: the parent's handle, so just drop it
+            conn.discard()
+            return
+        if not conn.in_use:
+            return  # Closed twice
+        conn.in_use = False
+
+        healthy: bool = True
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                healthy = False
+
+        with self._lock:
+            self._in_use -= 1
+            if healthy and len(self._idle) < self.size:
+                conn.idle_since = time.monotonic()
+                self._idle.append(conn)
+                return
+        self._discard(conn)
+
+    @contextmanager
+    def connect(self):
+        """with pool.connect() as conn: ... - acquire and release around a block"""
+        conn: PooledConnection = self.connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close_all(self) -> None:
+        """Close every idle connection; ones checked out right now go back to the pool as usual"""
+        with self._lock:
+            connections: list[PooledConnection] = self._idle
+            self._idle = []
+        for conn in connections:
+            self._discard(conn)
+
+    def stats(self) -> dict[str, int | str]:
+        with self._lock:
+            return dict(self._stats, db_path=self.db_path, size=self.size, idle=len(self._idle),
+                        in_use=self._in_use, open_connections=len(self._idle) + self._in_use)
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock: threading.Lock = threading.Lock()
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """The process-wide pool for a database file"""
+    key: str = os.path.abspath(db_path)
+    pool: ConnectionPool | None = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(key)
+                _pools[key] = pool
+    return pool
+
+def get_connection(db_path: str) -> PooledConnection:
+    """A pooled connection to db_path; close() returns it to the pool"""
+    return get_pool(db_path).connection()
 
-        return
\ No newline at end of file
+def pool_stats() -> list[dict[str, int | str]]:
+    return [pool.stats() for pool in list(_pools.values())]
@@ -10,6 +10,8 @@ CREATE TABLE IF NOT EXISTS chat_sessions (
     title TEXT,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     system_prompt TEXT,
+    summary TEXT, -- Rolling summary of turns that no longer fit a model's context window
+    summary_through TIMESTAMP, -- Timestamp of the newest message folded into summary
     FOREIGN KEY (user_id) REFERENCES user_accounts(user_id)
 );
 
@@ -21,10 +23,14 @@ CREATE TABLE IF NOT EXISTS chat_messages (
     message_text TEXT NOT NULL,
     timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     tokens_used INTEGER NOT NULL DEFAULT 0,
+    token_estimate INTEGER, -- Cached prompt-token count used to pack history into the context window
     model_used TEXT,
     FOREIGN KEY (chat_id) REFERENCES chat_sessions(chat_id)
 );
 
+-- Keyset pagination of a chat's history reads this index newest-first
+CREATE INDEX IF NOT EXISTS idx_chat_messages_chat_time ON chat_messages (chat_id, timestamp);
+
 -- Table: usage_metrics
 CREATE TABLE IF NOT EXISTS usage_metrics (
     usage_id TEXT PRIMARY KEY, -- UUID
@@ -32,10 +38,110 @@ CREATE TABLE IF NOT EXISTS usage_metrics (
     timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     model_name TEXT NOT NULL,
     tokens_used INTEGER NOT NULL,
-    status_code TEXT NOT NULL,
+    status_code TEXT NOT NULL, -- '200', 'cached' or 'error'
+    input_tokens INTEGER NOT NULL DEFAULT 0, -- Prompt tokens as reported by the provider
+    output_tokens INTEGER NOT NULL DEFAULT 0, -- Completion tokens as reported by the provider
+    cost_usd REAL NOT NULL DEFAULT 0, -- Priced with the model's usd_per_million_*_tokens at the time of use
     FOREIGN KEY (user_id) REFERENCES user_accounts(user_id)
 );
 
+-- Per-user usage over a time range reads this index
+CREATE INDEX IF NOT EXISTS idx_usage_metrics_user_time ON usage_metrics (user_id, timestamp);
+
+-- Table: usage_rollup_hourly
+-- usage_metrics summed per user, model and UTC hour ('YYYY-MM-DD HH'); updated with every usage flush
+CREATE TABLE IF NOT EXISTS usage_rollup_hourly (
+    user_id TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    hour TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    cached INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    tokens_used INTEGER NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, model_name, hour)
+);
+
+CREATE INDEX IF NOT EXISTS idx_usage_rollup_hourly_hour ON usage_rollup_hourly (hour);
+
+-- Table: usage_rollup_daily
+-- Same as usage_rollup_hourly per UTC day ('YYYY-MM-DD')
+CREATE TABLE IF NOT EXISTS usage_rollup_daily (
+    user_id TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    day TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    cached INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    tokens_used INTEGER NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, model_name, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_usage_rollup_daily_day ON usage_rollup_daily (day);
+
+-- Table: media_jobs
+-- Image and video generations run in the background; every worker process reads job state from here
+CREATE TABLE IF NOT EXISTS media_jobs (
+    job_id TEXT PRIMARY KEY, -- UUID
+    user_id TEXT NOT NULL, -- Foreign key to user_accounts.user_id (in user.db)
+    media_type TEXT NOT NULL CHECK (media_type IN ('image', 'video')),
+    model_name TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    params TEXT, -- JSON of extra generation parameters
+    status TEXT NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'polling', 'succeeded', 'failed', 'cancelled')),
+    result TEXT, -- JSON MediaClient result once succeeded
+    error TEXT, -- Message for the user once failed
+    provider_operation TEXT, -- JSON handle of the provider's long-running operation while polling
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES user_accounts(user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_media_jobs_user_created ON media_jobs (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_media_jobs_status ON media_jobs (status);
+
+-- Table: media_files
+-- Generated images and videos stored on disk under MEDIA_STORE_DIR, named by the SHA-256 of their bytes
+CREATE TABLE IF NOT EXISTS media_files (
+    id TEXT PRIMARY KEY, -- SHA-256 of the file's content, hex
+    session_id TEXT,
+    filename TEXT, -- Name in the provider's URL, if it had one
+    file_type TEXT CHECK (file_type IN ('image', 'video')),
+    file_url TEXT, -- Provider URL the file was downloaded from; NULL for inline results
+    mime_type TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    variants_done BOOLEAN NOT NULL DEFAULT 0 -- 1 once encoding finished, failed or was skipped; until then it may still change
+);
+
+-- Table: media_variants
+-- Smaller copies of a stored image, written next to it as <sha256>.<size>.<webp|avif>
+CREATE TABLE IF NOT EXISTS media_variants (
+    file_id TEXT NOT NULL, -- Foreign key to media_files.id
+    size TEXT NOT NULL CHECK (size IN ('full', 'thumb')),
+    mime_type TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    PRIMARY KEY (file_id, size, mime_type),
+    FOREIGN KEY (file_id) REFERENCES media_files(id)
+);
+
+-- Table: media_file_owners
+-- Users a stored file was generated for; only they are served it
+CREATE TABLE IF NOT EXISTS media_file_owners (
+    file_id TEXT NOT NULL, -- Foreign key to media_files.id
+    user_id TEXT NOT NULL, -- Foreign key to user_accounts.user_id (in user.db)
+    PRIMARY KEY (file_id, user_id)
+);
+
 -- Table: model_capabilities
 CREATE TABLE IF NOT EXISTS model_capabilities (
     model_id TEXT PRIMARY KEY, -- UUID
@@ -49,3 +155,6 @@ CREATE TABLE IF NOT EXISTS model_capabilities (
     usd_per_1k_tokens FLOAT NOT NULL,
     is_active BOOLEAN NOT NULL DEFAULT 1
 );
+
+-- Schema version, as applied by schema_migrations.py
+PRAGMA user_version = 3;
@@ -9,5 +9,19 @@ CREATE TABLE IF NOT EXISTS user_accounts (
     subscription_plan TEXT NOT NULL DEFAULT 'free',
     token_quota INTEGER,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    timezone TEXT
-);
\ No newline at end of file
+    timezone TEXT,
+    google_id VARCHAR(255)
+);
+
+-- Google sign-in tokens (google_auth.py)
+CREATE TABLE IF NOT EXISTS oauth_tokens (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    provider VARCHAR(50) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    token TEXT NOT NULL,
+    user_id VARCHAR(255),
+    FOREIGN KEY (user_id) REFERENCES user_accounts (user_id)
+);
+
+-- Schema version, as applied by schema_migrations.py
+PRAGMA user_version = 1;
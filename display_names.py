@@ -0,0 +1,194 @@
+# display_names.py - Rule table that turns model names into (main, sub) display names
+
+import re
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Table in models.db with extra rules; they are tried before the built-in ones
+RULES_TABLE = 'display_name_rules'
+
+# How a rule's pattern is matched against the model name
+MATCH_TYPES = ('contains', 'icontains', 'iequals', 'regex')
+
+# (model_type, match_type, pattern, main_name, sub_name), first match wins
+BUILTIN_RULES = (
+    # GPT models
+    ('llm', 'icontains', 'gpt-4o-mini', 'GPT-4o', 'Mini'),
+    ('llm', 'icontains', 'gpt-4o', 'GPT-4o', ''),
+    ('llm', 'icontains', 'gpt-4.1-mini', 'GPT-4.1', 'Mini'),
+    ('llm', 'icontains', 'gpt-4.1-nano', 'GPT-4.1', 'Nano'),
+    ('llm', 'icontains', 'gpt-4.1', 'GPT-4.1', ''),
+    ('llm', 'icontains', 'gpt-4.5', 'GPT-4.5', 'Preview'),
+
+    # OpenAI o-series
+    ('llm', 'icontains', 'o1-pro', 'o1', 'Pro'),
+    ('llm', 'icontains', 'o1-mini', 'o1', 'Mini'),
+    ('llm', 'icontains', 'o3-mini', 'o3', 'Mini'),
+    ('llm', 'icontains', 'o4-mini', 'o4', 'Mini'),
+    ('llm', 'iequals', 'o3', 'o3', ''),
+
+    # Claude models
+    ('llm', 'contains', 'Claude Sonnet 4', 'Claude 4', 'Sonnet'),
+    ('llm', 'contains', 'Claude Opus 4', 'Claude 4', 'Opus'),
+    ('llm', 'contains', 'Claude Sonnet 3.7', 'Claude 3.7', 'Sonnet'),
+    ('llm', 'contains', 'Claude Sonnet 3.5', 'Claude 3.5', 'Sonnet'),
+    ('llm', 'contains', 'Claude 3 Opus', 'Claude 3', 'Opus'),
+    ('llm', 'contains', 'Claude 3 Sonnet', 'Claude 3', 'Sonnet'),
+    ('llm', 'contains', 'Claude 3 Haiku', 'Claude 3', 'Haiku'),
+    ('llm', 'contains', 'Claude Haiku 3.5', 'Claude 3.5', 'Haiku'),
+
+    # Gemini models
+    ('llm', 'contains', 'Gemini 2.5 Flash', 'Gemini 2.5', 'Flash'),
+    ('llm', 'contains', 'Gemini 2.5 Pro', 'Gemini 2.5', 'Pro'),
+    ('llm', 'contains', 'Gemini 2.0 Flash', 'Gemini 2.0', 'Flash'),
+    ('llm', 'contains', 'Gemini 1.5 Pro', 'Gemini 1.5', 'Pro'),
+    ('llm', 'contains', 'Gemini 1.5 Flash', 'Gemini 1.5', 'Flash'),
+
+    # DeepSeek models
+    ('llm', 'contains', 'DeepSeek-R1', 'DeepSeek', 'R1'),
+    ('llm', 'regex', r'deepseek-reasoner|deepseek-coder', 'DeepSeek', 'Coder'),
+    ('llm', 'contains', 'DeepSeek-V3', 'DeepSeek', 'V3'),
+
+    # Llama models
+    ('llm', 'contains', 'Llama-4-Scout', 'Llama 4', 'Scout'),
+    ('llm', 'contains', 'Llama-4-Maverick', 'Llama 4', 'Maverick'),
+    ('llm', 'contains', 'Llama-3.3-70B', 'Llama 3.3', '70B'),
+    ('llm', 'contains', 'Llama-3.2-90B', 'Llama 3.2', '90B Vision'),
+    ('llm', 'contains', 'Llama-3.2-11B', 'Llama 3.2', '11B Vision'),
+    ('llm', 'contains', 'Llama-3.2-3B', 'Llama 3.2', '3B'),
+    ('llm', 'contains', 'Llama-3.1-405B', 'Llama 3.1', '405B'),
+    ('llm', 'contains', 'Llama-3.1-70B', 'Llama 3.1', '70B'),
+    ('llm', 'contains', 'Llama-3.1-8B', 'Llama 3.1', '8B'),
+    ('llm', 'contains', 'Llama-Vision-Free', 'Llama Vision', 'Free'),
+
+    # Image models
+    ('image', 'regex', r'(?=.*FLUX\.1\.1)(?i:.*pro)', 'FLUX.1.1', 'Pro'),
+    ('image', 'regex', r'(?=.*FLUX\.1)(?i:.*schnell)', 'FLUX.1', 'Schnell'),
+    ('image', 'regex', r'(?=.*FLUX\.1)(?i:.*dev)', 'FLUX.1', 'Dev'),
+    ('image', 'regex', r'(?=.*FLUX\.1)(?i:.*redux)', 'FLUX.1', 'Redux'),
+    ('image', 'regex', r'(?=.*FLUX\.1)(?i:.*depth)', 'FLUX.1', 'Depth'),
+    ('image', 'regex', r'(?=.*FLUX\.1)(?i:.*canny)', 'FLUX.1', 'Canny'),
+    ('image', 'contains', 'FLUX.1', 'FLUX.1', ''),
+    ('image', 'contains', 'Imagen 3', 'Imagen', '3'),
+    ('image', 'contains', 'gpt-image-1', 'GPT Image', '1'),
+    ('image', 'regex', r'(?=.*Gemini 2\.0 Flash).*Image', 'Gemini 2.0', 'Image Gen'),
+
+    # Audio models
+    ('audio', 'icontains', 'sonic-2', 'Sonic', '2'),
+    ('audio', 'icontains', 'sonic', 'Sonic', '1'),
+    ('audio', 'contains', 'gpt-4o-audio', 'GPT-4o', 'Audio'),
+    ('audio', 'contains', 'gpt-4o-mini-audio', 'GPT-4o Mini', 'Audio'),
+    ('audio', 'contains', 'gpt-4o-realtime', 'GPT-4o', 'Realtime'),
+    ('audio', 'contains', 'gpt-4o-mini-realtime', 'GPT-4o Mini', 'Realtime'),
+    ('audio', 'regex', r'(?=.*Gemini 2\.5).*TTS', 'Gemini 2.5', 'TTS'),
+    ('audio', 'regex', r'(?=.*Gemini 2\.5).*Audio', 'Gemini 2.5', 'Audio'),
+    ('audio', 'contains', 'Gemini 2.0 Flash Live', 'Gemini 2.0', 'Live'),
+
+    # Video models
+    ('video', 'contains', 'Veo 2', 'Veo', '2'),
+)
+
+# Fallback for LLMs no rule knows: "ModelName-1.5-Suffix" -> ("Model Name", "1.5-Suffix")
+_GENERIC_LLM_NAME = re.compile(r'([a-zA-Z0-9\._\-]+?)[\-\s]+([\d\.]+[a-zA-Z]*(?:\-[a-zA-Z0-9]+)*)', re.IGNORECASE)
+
+# Memoized results kept per parser before the memo is reset
+MEMO_LIMIT = 4096
+
+
+def compile_rule(match_type, pattern):
+    """
+    Compile one rule into a matcher called as matcher(name, lowercased_name)
+
+    Plain substring and equality rules stay plain string operations, which are
+    cheaper than a regex search; only 'regex' rules are compiled to a regex.
+    """
+    if match_type == 'contains':
+        return lambda name, lower: pattern in name
+    if match_type == 'icontains':
+        pattern_lower = pattern.lower()
+        return lambda name, lower: pattern_lower in lower
+    if match_type == 'iequals':
+        pattern_lower = pattern.lower()
+        return lambda name, lower: lower == pattern_lower
+    if match_type == 'regex':
+        search = re.compile(pattern).search
+        return lambda name, lower: search(name) is not None
+    raise ValueError(f"Unknown display name match type '{match_type}'")
+
+
+def parse_generic_llm_name(model_name):
+    """Best-effort (main, sub) for an LLM name that no rule matched"""
+    # Take the part after the last slash
+    match = _GENERIC_LLM_NAME.match(model_name.split('/')[-1])
+    if not match:
+        return model_name, ''
+    base_name = match.group(1).replace('-', ' ').replace('_', ' ')
+    version_part = match.group(2)
+    main_name = ' '.join(word.capitalize() for word in base_name.split())
+    sub_name = version_part.upper() if len(version_part) <= 5 else version_part.capitalize()
+    return main_name, sub_name
+
+
+class DisplayNameParser:
+    """
+    Ordered, precompiled (main, sub) display-name rules per model type.
+
+    Rules are tried in order and the first whose pattern matches wins. LLM
+    names that match nothing go through the generic "Name-Version" parse;
+    other types keep the raw name. Results are memoized per name.
+    """
+
+    def __init__(self, rules=BUILTIN_RULES):
+        self._rules = {}
+        for model_type, match_type, pattern, main_name, sub_name in rules:
+            self._rules.setdefault(model_type, []).append(
+                (compile_rule(match_type, pattern), main_name, sub_name or '')
+            )
+        self._memo = {}
+
+    @classmethod
+    def load(cls, conn):
+        """Rules from the database table, ahead of the built-in ones"""
+        try:
+            rows = conn.execute(
+                f'''SELECT model_type, match_type, pattern, main_name, sub_name
+                    FROM {RULES_TABLE} WHERE is_active = 1
+                    ORDER BY priority, id'''
+            ).fetchall()
+        except sqlite3.OperationalError:
+            # Table doesn't exist; the built-in rules cover the shipped catalog
+            return cls()
+
+        db_rules = []
+        for row in rows:
+            rule = tuple(row)
+            try:
+                compile_rule(rule[1], rule[2])
+            except (ValueError, re.error) as e:
+                logger.warning(f"Skipping display name rule {rule}: {e}")
+                continue
+            db_rules.append(rule)
+        return cls(tuple(db_rules) + BUILTIN_RULES)
+
+    def parse(self, model_name, model_type):
+        """(main_name, sub_name) for a model"""
+        key = (model_type, model_name)
+        result = self._memo.get(key)
+        if result is not None:
+            return result
+
+        result = None
+        lower = model_name.lower()
+        for matches, main_name, sub_name in self._rules.get(model_type, ()):
+            if matches(model_name, lower):
+                result = (main_name, sub_name)
+                break
+        if result is None:
+            result = parse_generic_llm_name(model_name) if model_type == 'llm' else (model_name, '')
+
+        if len(self._memo) >= MEMO_LIMIT:
+            self._memo.clear()
+        self._memo[key] = result
+        return result
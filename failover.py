@@ -0,0 +1,72 @@
+# failover.py - Latency tracking and the hedging/failover policy for AIClient
+
+import os
+import threading
+from collections import deque
+
+# Try equivalent models on other providers when the chosen one errors. Off by default: it bills
+# a second call and sends the user's prompt to a provider they didn't pick.
+FAILOVER_ENABLED = os.getenv("FAILOVER_ENABLED", "false").lower() == "true"
+# Alternatives tried per request, after the model the user picked
+FAILOVER_MAX_ALTERNATIVES = int(os.getenv("FAILOVER_MAX_ALTERNATIVES", "2"))
+# Also send an interactive request to an alternative when the first provider is slower than usual;
+# only with FAILOVER_ENABLED, and off by default for the same reasons
+HEDGE_ENABLED = FAILOVER_ENABLED and os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+# The hedge fires at the model's p95 latency, clamped to [HEDGE_MIN_DELAY, HEDGE_MAX_DELAY];
+# until there are LATENCY_MIN_SAMPLES samples it uses HEDGE_DEFAULT_DELAY
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "1"))
+HEDGE_MAX_DELAY = float(os.getenv("HEDGE_MAX_DELAY", "20"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "8"))
+LATENCY_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+
+class LatencyTracker:
+    """
+    Recent latency samples per (kind, model), for p95-based hedge delays.
+
+    kind is 'complete' (whole response) or 'first_token' (streams), since
+    the two aren't comparable. Only successful calls are sampled.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def observe(self, kind, model_name, seconds):
+        with self._lock:
+            samples = self._samples.get((kind, model_name))
+            if samples is None:
+                samples = self._samples[(kind, model_name)] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, kind, model_name, percent):
+        """The given percentile in seconds, or None with too few samples"""
+        with self._lock:
+            samples = sorted(self._samples.get((kind, model_name), ()))
+        if len(samples) < LATENCY_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+    def hedge_delay(self, kind, model_name):
+        """Seconds to wait on a model before hedging to an alternative"""
+        p95 = self.percentile(kind, model_name, 95)
+        if p95 is None:
+            return HEDGE_DEFAULT_DELAY
+        return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, p95))
+
+    def stats(self):
+        with self._lock:
+            keys = list(self._samples)
+        report = {}
+        for kind, model_name in keys:
+            p50 = self.percentile(kind, model_name, 50)
+            p95 = self.percentile(kind, model_name, 95)
+            report.setdefault(model_name, {})[kind] = {
+                'samples': len(self._samples[(kind, model_name)]),
+                'p50_ms': round(p50 * 1000) if p50 is not None else None,
+                'p95_ms': round(p95 * 1000) if p95 is not None else None,
+                'hedge_delay_ms': round(self.hedge_delay(kind, model_name) * 1000)
+            }
+        return report
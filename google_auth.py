@@ -7,22 +7,20 @@ from datetime import datetime
 from flask import Blueprint, request, redirect, url_for, flash, current_app
 from flask import session as flask_session # For session access
 from flask_login import login_user # current_user is not directly used here but good to have if needed
-from flask_dance.contrib.google import make_google_blueprint, google
-from flask_dance.consumer import oauth_authorized
 import json
 
+from database.lib.database_manager import get_connection
+
 # Import the User class from auth.py
-from auth import User # Assuming auth.py is in the same directory or Python path
+from auth import User, invalidate_user # Assuming auth.py is in the same directory or Python path
 
 # --- Database Configuration ---
 DB_DIR = 'db'
 USER_DB_PATH = os.path.join(DB_DIR, 'user.db')
 
 def get_user_db_conn():
-    """Establishes a connection to the user SQLite database."""
-    conn = sqlite3.connect(USER_DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """A pooled connection to the user database; close() returns it to the pool."""
+    return get_connection(USER_DB_PATH)
 
 # --- Create Google OAuth Blueprint ---
 def create_google_blueprint():
@@ -35,6 +33,10 @@ def create_google_blueprint():
         print("Please set GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET in your .env file")
         return None
 
+    # Flask-Dance (and requests-oauthlib under it) is only imported when Google login is configured
+    from flask_dance.contrib.google import make_google_blueprint
+    from flask_dance.consumer import oauth_authorized
+
     google_bp = make_google_blueprint(
         client_id=google_client_id,
         client_secret=google_client_secret,
@@ -46,26 +48,11 @@ def create_google_blueprint():
         # No 'redirect_url' here: let Flask-Dance use its default, e.g., /auth/google/authorized
         # This default MUST be in your Google Cloud Console authorized redirect URIs.
     )
+    oauth_authorized.connect(google_logged_in, sender=google_bp)
     return google_bp
 
 # --- OAuth Token Storage (Simple SQLite Implementation) ---
-def create_oauth_table():
-    conn = get_user_db_conn()
-    try:
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS oauth_tokens (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                provider VARCHAR(50) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                token TEXT NOT NULL,
-                user_id VARCHAR(255),
-                FOREIGN KEY (user_id) REFERENCES user_accounts (user_id)
-            )
-        ''')
-        conn.commit()
-    finally:
-        conn.close()
-
+# oauth_tokens and user_accounts.google_id are created by schema_migrations.py
 def store_oauth_token(provider, token, user_id=None):
     conn = get_user_db_conn()
     try:
@@ -101,6 +88,7 @@ def get_oauth_token(provider, user_id=None): # Not actively used in this flow, b
 
 # --- Google Authentication Functions ---
 def get_google_user_info():
+    from flask_dance.contrib.google import google
     if not google.authorized:
         print("DEBUG: get_google_user_info - Google session not authorized.")
         return None
@@ -182,6 +170,7 @@ def update_user_google_info(user, google_info):
                 (google_info['google_id'], google_info['name'], user.id)
             )
             conn.commit()
+            invalidate_user(user.id)  # The cached copy still has the old name
             print(f"DEBUG: User {user.id} Google info updated in DB.")
         else:
             print(f"DEBUG: User {user.id} Google info already up-to-date or no change needed.")
@@ -191,7 +180,7 @@ def update_user_google_info(user, google_info):
         conn.close()
 
 # --- OAuth Event Handlers ---
-@oauth_authorized.connect
+# Connected to Flask-Dance's oauth_authorized signal in create_google_blueprint()
 def google_logged_in(blueprint, token):
     print("DEBUG: google_logged_in signal handler called.")
     if not token:
@@ -271,26 +260,6 @@ def google_logged_in(blueprint, token):
 
 # --- Initialize Google Auth ---
 def init_google_auth(app):
-    create_oauth_table()
-    conn = get_user_db_conn()
-    try:
-        cursor = conn.execute("PRAGMA table_info(user_accounts)")
-        columns = [column[1] for column in cursor.fetchall()]
-        if 'google_id' not in columns:
-            print("Adding google_id column to user_accounts table...")
-            conn.execute('ALTER TABLE user_accounts ADD COLUMN google_id VARCHAR(255)')
-            conn.commit()
-            print("Google ID column added successfully.")
-        if 'subscription_plan' not in columns:
-            print("Adding subscription_plan column to user_accounts table...")
-            conn.execute("ALTER TABLE user_accounts ADD COLUMN subscription_plan VARCHAR(50) DEFAULT 'free'")
-            conn.commit()
-            print("Subscription plan column added successfully.")
-    except Exception as e:
-        print(f"Error checking/adding columns to user_accounts table: {e}")
-    finally:
-        conn.close()
-
     google_bp = create_google_blueprint()
     if google_bp:
         app.register_blueprint(google_bp, url_prefix="/auth")
@@ -0,0 +1,22 @@
+# gunicorn.conf.py - Multi-process production server: gunicorn -c gunicorn.conf.py 'app:create_app()'
+
+import os
+import multiprocessing
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Streaming replies hold a thread for their whole length, so each worker gets several
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+
+# With WORKER_INIT=prefork the app is loaded once in the master, so the catalog and
+# provider SDKs are shared by every worker; 'lazy' loads everything in each worker
+preload_app = os.getenv('WORKER_INIT', 'prefork').lower() == 'prefork'
+
+
+def post_worker_init(worker):
+    """Start the worker's own services before it takes requests, rather than on its first one"""
+    import app
+    if app.WORKER_INIT == 'prefork':
+        app.init_worker()
@@ -0,0 +1,167 @@
+# http_pool.py - Pooled keep-alive HTTP sessions for provider APIs
+
+import os
+import time
+import threading
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from provider_sdks import sdk_available, import_sdk
+
+# httpx is only imported when an SDK client first asks for it; it only speaks HTTP/2 when h2 is installed
+HTTPX_AVAILABLE = sdk_available('httpx')
+HTTP2_AVAILABLE = HTTPX_AVAILABLE and sdk_available('h2')
+
+logger = logging.getLogger(__name__)
+
+# Connections kept alive per provider host
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+# Image and video generation can legitimately take minutes
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "180"))
+
+
+class ProviderSessions:
+    """
+    One pooled, keep-alive HTTP session per provider.
+
+    Raw REST calls go through request() / get() / post() on a requests.Session
+    whose connection pool is reused across calls, so only the first request to
+    a provider pays for the TCP and TLS handshakes. Every call gets a
+    (connect, read) timeout unless the caller passes its own.
+
+    SDK clients (openai.OpenAI etc.) can share the same limits and timeouts via
+    httpx_client(), which also negotiates HTTP/2 when h2 is installed.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, connect_timeout=HTTP_CONNECT_TIMEOUT,
+                 read_timeout=HTTP_READ_TIMEOUT, pool_sizes=None):
+        self.pool_size = pool_size
+        self.pool_sizes = pool_sizes or {}  # provider_key -> pool size override
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.timeout = (connect_timeout, read_timeout)
+        self._sessions = {}
+        self._adapters = {}
+        self._httpx_clients = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _pool_size_for(self, provider_key):
+        env_size = os.getenv(f"HTTP_POOL_SIZE_{provider_key.upper()}")
+        if env_size:
+            return int(env_size)
+        return self.pool_sizes.get(provider_key, self.pool_size)
+
+    def session(self, provider_key):
+        """The provider's shared requests.Session, created on first use"""
+        session = self._sessions.get(provider_key)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(provider_key)
+                if session is None:
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self._pool_size_for(provider_key))
+                    session = requests.Session()
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._adapters[provider_key] = adapter
+                    self._stats[provider_key] = {
+                        'requests': 0,
+                        'errors': 0,
+                        'in_flight': 0,
+                        'peak_in_flight': 0,
+                        'total_seconds': 0.0
+                    }
+                    self._sessions[provider_key] = session
+        return session
+
+    def request(self, provider_key, method, url, **kwargs):
+        """Send a request on the provider's pooled session"""
+        session = self.session(provider_key)
+        kwargs.setdefault('timeout', self.timeout)
+
+        stats = self._stats[provider_key]
+        with self._lock:
+            stats['requests'] += 1
+            stats['in_flight'] += 1
+            stats['peak_in_flight'] = max(stats['peak_in_flight'], stats['in_flight'])
+        started = time.monotonic()
+        try:
+            return session.request(method, url, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                stats['in_flight'] -= 1
+                stats['total_seconds'] += time.monotonic() - started
+
+    def get(self, provider_key, url, **kwargs):
+        return self.request(provider_key, 'GET', url, **kwargs)
+
+    def post(self, provider_key, url, **kwargs):
+        return self.request(provider_key, 'POST', url, **kwargs)
+
+    def httpx_client(self, provider_key):
+        """
+        A pooled httpx.Client for an SDK client's http_client argument,
+        or None if httpx isn't installed (the SDK then uses its own default)
+        """
+        if not HTTPX_AVAILABLE:
+            return None
+        httpx = import_sdk('httpx')
+        with self._lock:
+            client = self._httpx_clients.get(provider_key)
+            if client is None:
+                pool_size = self._pool_size_for(provider_key)
+                client = httpx.Client(
+                    http2=HTTP2_AVAILABLE,
+                    limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                    timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+                )
+                self._httpx_clients[provider_key] = client
+        return client
+
+    def stats(self):
+        """Per-provider request counts, latency and connection pool utilisation"""
+        with self._lock:
+            report = {}
+            for provider_key, stats in self._stats.items():
+                # urllib3 counts every connection it had to open; the rest of the requests reused one
+                pools = self._adapters[provider_key].poolmanager.pools
+                opened = 0
+                idle = 0
+                for host in pools.keys():
+                    pool = pools[host]
+                    opened += pool.num_connections
+                    # The queue is padded with None up to maxsize; real entries are idle keep-alive connections
+                    idle += sum(1 for conn in list(pool.pool.queue) if conn) if pool.pool else 0
+                requests_made = stats['requests']
+                report[provider_key] = {
+                    'requests': requests_made,
+                    'errors': stats['errors'],
+                    'in_flight': stats['in_flight'],
+                    'peak_in_flight': stats['peak_in_flight'],
+                    'pool_size': self._pool_size_for(provider_key),
+                    'connections_opened': opened,
+                    'connections_idle': idle,
+                    'connection_reuse_rate': round(1 - opened / requests_made, 3) if requests_made else None,
+                    'avg_latency_ms': round(stats['total_seconds'] / requests_made * 1000) if requests_made else None
+                }
+            for provider_key in self._httpx_clients:
+                report.setdefault(provider_key, {})['sdk_http2'] = HTTP2_AVAILABLE
+            return report
+
+    def close(self):
+        """Close every pooled connection"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            for client in self._httpx_clients.values():
+                client.close()
+            self._sessions.clear()
+            self._adapters.clear()
+            self._httpx_clients.clear()
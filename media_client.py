@@ -1,30 +1,17 @@
 # media_client.py - Image and Video API Integration
 
 import os
-import sqlite3
+import time
+import base64
 from dotenv import load_dotenv
 import logging
-import requests
-import base64
-from io import BytesIO
-from PIL import Image
-import json
-
-# Import provider-specific libraries
-try:
-    import openai
-except ImportError:
-    openai = None
 
-try:
-    import anthropic
-except ImportError:
-    anthropic = None
-
-try:
-    import google.generativeai as genai
-except ImportError:
-    genai = None
+from model_catalog import CatalogHolder
+from http_pool import ProviderSessions
+from response_cache import make_key
+from provider_health import ProviderHealth, ProviderUnavailable
+from provider_sdks import LazyClients, sdk_available, import_sdk
+from media_store import MEDIA_URL_PREFIX
 
 load_dotenv()
 
@@ -32,61 +19,75 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Provider image URLs expire (OpenAI's after an hour), so without a MediaStore cached images live no longer than that
+IMAGE_CACHE_TTL = float(os.getenv("IMAGE_CACHE_TTL", "3600"))
+
+# Gemini REST API, for Veo's long-running operations that the google.generativeai SDK doesn't cover
+GEMINI_API_BASE = 'https://generativelanguage.googleapis.com/v1beta'
+# How often a synchronous generate_video() checks on its operation, and how long it waits in total
+VIDEO_POLL_INTERVAL = float(os.getenv("VIDEO_POLL_INTERVAL", "5"))
+VIDEO_TIMEOUT = float(os.getenv("VIDEO_TIMEOUT", "600"))
+
 class MediaClient:
-    def __init__(self, db_path):
+    def __init__(self, db_path, catalog=None, http=None, cache=None, health=None, store=None):
         self.db_path = db_path
+        self.catalog = catalog or CatalogHolder(db_path)
+        # Keep-alive connection pools shared by every request to the same provider
+        self.http = http or ProviderSessions()
+        # Optional ResponseCache for identical image prompts
+        self.cache = cache
+        # Error/timeout rates per provider key, kept apart from chat since media endpoints fail separately
+        self.health = health or ProviderHealth(probe=self._probe, name='media')
+        # Optional MediaStore; generated files are copied into it so results don't depend on provider URLs
+        self.store = store
         self._setup_clients()
     
     def _setup_clients(self):
-        """Initialize API clients for different providers"""
-        self.clients = {}
+        """Register API clients for the providers that have keys; each is built, and its SDK imported, on first use"""
+        self.clients = LazyClients()
         
-        # OpenAI
-        if openai and os.getenv("OPENAI_API_KEY"):
-            self.clients['openai'] = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        def build_openai():
+            client = import_sdk('openai').OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                http_client=self.http.httpx_client('openai'),
+                timeout=self.http.read_timeout
+            )
             logger.info("OpenAI client initialized for media")
+            return client
         
-        # Google
-        if genai and os.getenv("GOOGLE_API_KEY"):
+        def build_google():
+            genai = import_sdk('google.generativeai')
             genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-            self.clients['google'] = genai
             logger.info("Google AI client initialized for media")
+            return genai
         
-        # Together.ai (for Black Forest Labs models)
-        if openai and os.getenv("TOGETHER_API_KEY"):
-            self.clients['together'] = openai.OpenAI(
+        def build_together():
+            client = import_sdk('openai').OpenAI(
                 api_key=os.getenv("TOGETHER_API_KEY"),
-                base_url="https://api.together.xyz/v1"
+                base_url="https://api.together.xyz/v1",
+                http_client=self.http.httpx_client('together'),
+                timeout=self.http.read_timeout
             )
             logger.info("Together.ai client initialized for media")
+            return client
+        
+        # OpenAI
+        if os.getenv("OPENAI_API_KEY") and sdk_available('openai'):
+            self.clients.register('openai', build_openai)
+        
+        # Google
+        if os.getenv("GOOGLE_API_KEY") and sdk_available('google.generativeai'):
+            self.clients.register('google', build_google)
+        
+        # Together.ai (for Black Forest Labs models)
+        if os.getenv("TOGETHER_API_KEY") and sdk_available('openai'):
+            self.clients.register('together', build_together)
     
     def _get_model_info(self, model_name, model_type):
-        """Get model information from database"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            
-            table_map = {
-                'image': 'image_models',
-                'video': 'video_models',
-                'audio': 'audio_models'
-            }
-            
-            table = table_map.get(model_type)
-            if not table:
-                return None
-            
-            model_info = conn.execute(
-                f'SELECT * FROM {table} WHERE model_name = ? AND is_active = 1', 
-                (model_name,)
-            ).fetchone()
-            
-            conn.close()
-            return dict(model_info) if model_info else None
-            
-        except Exception as e:
-            logger.error(f"Error getting model info: {e}")
+        """Get model information from the catalog snapshot"""
+        if model_type not in ('image', 'video', 'audio'):
             return None
+        return self.catalog.current.get(model_name, model_type)
     
     def _get_provider_key(self, provider_name):
         """Map provider names to client keys"""
@@ -112,10 +113,16 @@ class MediaClient:
                 n=kwargs.get('n', 1)
             )
             
+            usage = getattr(response, 'usage', None)
             return {
                 'type': 'image',
                 'images': [img.url for img in response.data],
-                'model': model_name
+                'model': model_name,
+                # Only token-priced image models (gpt-image-1) report usage
+                'usage': {
+                    'input_tokens': usage.input_tokens,
+                    'output_tokens': usage.output_tokens
+                } if usage else None
             }
         except Exception as e:
             logger.error(f"OpenAI Image API error: {e}")
@@ -130,11 +137,16 @@ class MediaClient:
             model = genai_module.GenerativeModel(api_name)
             response = model.generate_content(prompt)
             
-            # For Gemini image generation, the response format may vary
-            # This is a placeholder implementation
+            # Gemini returns generated images inline, as bytes in the response parts
+            images = [
+                f"data:{part.inline_data.mime_type};base64,{base64.b64encode(part.inline_data.data).decode('ascii')}"
+                for candidate in getattr(response, 'candidates', None) or []
+                for part in candidate.content.parts
+                if getattr(part, 'inline_data', None) and part.inline_data.data
+            ]
             return {
                 'type': 'image',
-                'images': [response.text if hasattr(response, 'text') else str(response)],
+                'images': images or [response.text if hasattr(response, 'text') else str(response)],
                 'model': model_name
             }
         except Exception as e:
@@ -148,7 +160,8 @@ class MediaClient:
             api_name = model_info.get('api_name') if model_info else model_name
             
             # Together.ai uses a different endpoint for image generation
-            response = requests.post(
+            response = self.http.post(
+                'together',
                 "https://api.together.xyz/v1/images/generations",
                 headers={
                     "Authorization": f"Bearer {os.getenv('TOGETHER_API_KEY')}",
@@ -184,6 +197,18 @@ class MediaClient:
             model_info = self._get_model_info(model_name, 'video')
             api_name = model_info.get('api_name') if model_info else model_name
             
+            if self.is_long_running(model_name):
+                # Veo answers with an operation; wait for it here since the caller wants the video
+                operation = self._start_google_video_operation(api_name, prompt, **kwargs)
+                deadline = time.monotonic() + VIDEO_TIMEOUT
+                while True:
+                    result = self._poll_google_video_operation(operation, model_name)
+                    if result is not None:
+                        return result
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"Video generation with {model_name} took longer than {VIDEO_TIMEOUT:.0f}s")
+                    time.sleep(VIDEO_POLL_INTERVAL)
+            
             model = genai_module.GenerativeModel(api_name)
             
             # For video generation, we might need different parameters
@@ -206,6 +231,89 @@ class MediaClient:
             logger.error(f"Google Video API error: {e}")
             raise
     
+    def _start_google_video_operation(self, api_name, prompt, **kwargs):
+        """Start a Veo generation; returns the operation name to poll"""
+        parameters = {key: kwargs[key] for key in ('aspectRatio', 'durationSeconds', 'negativePrompt') if key in kwargs}
+        response = self.http.post(
+            'google',
+            f"{GEMINI_API_BASE}/models/{api_name}:predictLongRunning",
+            headers={'x-goog-api-key': os.getenv('GOOGLE_API_KEY')},
+            json={'instances': [{'prompt': prompt}], 'parameters': parameters}
+        )
+        if response.status_code != 200:
+            raise Exception(f"HTTP {response.status_code}: {response.text}")
+        return response.json()['name']
+    
+    def _poll_google_video_operation(self, operation, model_name):
+        """The finished video result, or None while the operation is still running"""
+        response = self.http.get(
+            'google',
+            f"{GEMINI_API_BASE}/{operation}",
+            headers={'x-goog-api-key': os.getenv('GOOGLE_API_KEY')}
+        )
+        if response.status_code != 200:
+            raise Exception(f"HTTP {response.status_code}: {response.text}")
+        data = response.json()
+        if not data.get('done'):
+            return None
+        if 'error' in data:
+            raise Exception(data['error'].get('message') or str(data['error']))
+        samples = data.get('response', {}).get('generateVideoResponse', {}).get('generatedSamples', [])
+        return {
+            'type': 'video',
+            'videos': [sample['video']['uri'] for sample in samples if sample.get('video')],
+            'model': model_name
+        }
+    
+    def is_long_running(self, model_name, model_type='video'):
+        """Whether the model answers with an operation to poll rather than the media itself"""
+        if model_type != 'video':
+            return False
+        model_info = self._get_model_info(model_name, 'video')
+        return bool(model_info) and self._get_provider_key(model_info['provider_name']) == 'google' \
+            and (model_info.get('api_name') or '').startswith('veo')
+    
+    def start_video(self, model_name, prompt, **kwargs):
+        """
+        Start a long-running video generation without waiting for it
+        
+        Returns:
+            dict: {'provider_key', 'operation', 'model'} to pass to poll_video()
+        """
+        model_info = self._get_model_info(model_name, 'video')
+        if not model_info or not self.is_long_running(model_name):
+            raise ValueError(f"Video model '{model_name}' doesn't run as an operation")
+        provider_key = self._get_provider_key(model_info['provider_name'])
+        if provider_key not in self.clients:
+            raise ValueError(f"No API client configured for provider '{model_info['provider_name']}'")
+        
+        self.health.check(provider_key)
+        started = time.monotonic()
+        try:
+            operation = self._start_google_video_operation(model_info.get('api_name') or model_name, prompt, **kwargs)
+        except Exception as e:
+            self.health.record_failure(provider_key, e)
+            raise
+        self.health.record_success(provider_key, time.monotonic() - started)
+        return {'provider_key': provider_key, 'operation': operation, 'model': model_name}
+    
+    def poll_video(self, operation):
+        """Check on an operation from start_video(): the video result once it's done, else None"""
+        try:
+            result = self._poll_google_video_operation(operation['operation'], operation['model'])
+        except Exception as e:
+            self.health.record_failure(operation['provider_key'], e)
+            raise
+        return self._store_result(result, operation['provider_key']) if result else result
+    
+    def _store_result(self, result, provider_key):
+        """Copy a result's generated files into the MediaStore, if there is one"""
+        if not self.store:
+            return result
+        # Veo's download links need the API key; other providers' URLs are pre-signed
+        headers = {'x-goog-api-key': os.getenv('GOOGLE_API_KEY')} if provider_key == 'google' else None
+        return self.store.ingest(result, provider_key, headers=headers)
+    
     def generate_image(self, model_name, prompt, **kwargs):
         """
         Generate an image using the specified model
@@ -228,18 +336,41 @@ class MediaClient:
         if provider_key not in self.clients:
             raise ValueError(f"No API client configured for provider '{provider_name}'")
         
+        cache_key = None
+        if self.cache and self.cache.is_cacheable(model_name, 'image'):
+            cache_key = make_key('image', model_name, prompt, **kwargs)
+            cached = self.cache.get(cache_key)
+            if cached:
+                return dict(cached, cached=True)
+        
         try:
-            if provider_key == 'openai':
-                return self._call_openai_image_api(self.clients['openai'], model_name, prompt, **kwargs)
-            elif provider_key == 'google':
-                return self._call_google_image_api(self.clients['google'], model_name, prompt, **kwargs)
-            elif provider_key == 'together':
-                return self._call_together_image_api(self.clients['together'], model_name, prompt, **kwargs)
-            else:
-                raise ValueError(f"No image handler implemented for provider '{provider_name}'")
+            self.health.check(provider_key)
+            started = time.monotonic()
+            try:
+                if provider_key == 'openai':
+                    result = self._call_openai_image_api(self.clients['openai'], model_name, prompt, **kwargs)
+                elif provider_key == 'google':
+                    result = self._call_google_image_api(self.clients['google'], model_name, prompt, **kwargs)
+                elif provider_key == 'together':
+                    result = self._call_together_image_api(self.clients['together'], model_name, prompt, **kwargs)
+                else:
+                    raise ValueError(f"No image handler implemented for provider '{provider_name}'")
+            except Exception as e:
+                self.health.record_failure(provider_key, e)
+                raise
+            self.health.record_success(provider_key, time.monotonic() - started)
+            result = self._store_result(result, provider_key)
+            
+            if cache_key:
+                # Stored copies don't expire, so they can stay cached as long as any other response
+                stored = self.store and all(url.startswith(MEDIA_URL_PREFIX) for url in result.get('images', []))
+                self.cache.put(cache_key, model_name, result, ttl=None if stored else IMAGE_CACHE_TTL)
+            return result
                 
         except Exception as e:
             logger.error(f"Error generating image with {provider_name}: {e}")
+            if isinstance(e, ProviderUnavailable):
+                return f"⚠️ {provider_name} is having problems right now. Please try a different model or try again later."
             error_msg = str(e)
             if "401" in error_msg or "authentication" in error_msg.lower():
                 return f"⚠️ Authentication error with {provider_name}. Please check your API key configuration."
@@ -273,13 +404,23 @@ class MediaClient:
             raise ValueError(f"No API client configured for provider '{provider_name}'")
         
         try:
-            if provider_key == 'google':
-                return self._call_google_video_api(self.clients['google'], model_name, prompt, **kwargs)
-            else:
-                raise ValueError(f"No video handler implemented for provider '{provider_name}'")
+            self.health.check(provider_key)
+            started = time.monotonic()
+            try:
+                if provider_key == 'google':
+                    result = self._call_google_video_api(self.clients['google'], model_name, prompt, **kwargs)
+                else:
+                    raise ValueError(f"No video handler implemented for provider '{provider_name}'")
+            except Exception as e:
+                self.health.record_failure(provider_key, e)
+                raise
+            self.health.record_success(provider_key, time.monotonic() - started)
+            return self._store_result(result, provider_key)
                 
         except Exception as e:
             logger.error(f"Error generating video with {provider_name}: {e}")
+            if isinstance(e, ProviderUnavailable):
+                return f"⚠️ {provider_name} is having problems right now. Please try a different model or try again later."
             error_msg = str(e)
             if "401" in error_msg or "authentication" in error_msg.lower():
                 return f"⚠️ Authentication error with {provider_name}. Please check your API key configuration."
@@ -290,39 +431,32 @@ class MediaClient:
             else:
                 return f"⚠️ Error with {provider_name}: {error_msg}. Please try a different model or check your configuration."
     
+    def _probe(self, provider_key):
+        """Health probe for an open circuit: list the provider's models"""
+        client = self.clients[provider_key]
+        if provider_key == 'google':
+            next(iter(client.list_models()), None)
+        else:
+            client.models.list()
+    
+    def get_health_stats(self):
+        """Circuit state, error/timeout rates and latency percentiles per provider"""
+        return self.health.stats()
+    
+    def get_http_stats(self):
+        """Connection pool utilisation per provider"""
+        return self.http.stats()
+    
     def get_available_models(self, model_type):
-        """Get list of available models by type"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            
-            table_map = {
-                'image': 'image_models',
-                'video': 'video_models',
-                'audio': 'audio_models'
-            }
-            
-            table = table_map.get(model_type)
-            if not table:
-                return []
-            
-            models = conn.execute(
-                f'SELECT model_name, provider_name FROM {table} WHERE is_active = 1'
-            ).fetchall()
-            
-            available = []
-            for model in models:
-                provider_key = self._get_provider_key(model['provider_name'])
-                if provider_key in self.clients:
-                    available.append({
-                        'model_name': model['model_name'],
-                        'provider_name': model['provider_name'],
-                        'type': model_type
-                    })
-            
-            conn.close()
-            return available
-            
-        except Exception as e:
-            logger.error(f"Error getting available {model_type} models: {e}")
-            return []
\ No newline at end of file
+        """Get list of available models by type whose providers are answering"""
+        available = []
+        for model in self.catalog.current.models(model_type):
+            provider_key = self._get_provider_key(model['provider_name'])
+            if provider_key in self.clients and self.health.is_available(provider_key):
+                available.append({
+                    'model_name': model['model_name'],
+                    'provider_name': model['provider_name'],
+                    'type': model_type
+                })
+        
+        return available
@@ -0,0 +1,482 @@
+# media_jobs.py - Image and video generation as background jobs, tracked in data.db
+
+import os
+import json
+import time
+import uuid
+import atexit
+import threading
+import logging
+from datetime import datetime, timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from database.lib.database_manager import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Generations running at once per process; each holds a thread while its provider call is open
+MEDIA_JOB_WORKERS = int(os.getenv("MEDIA_JOB_WORKERS", "4"))
+# Jobs a process accepts beyond the running ones before turning new ones away
+MEDIA_JOB_QUEUE = int(os.getenv("MEDIA_JOB_QUEUE", "64"))
+# How often the shared poller checks on long-running provider operations (Veo videos)
+MEDIA_POLL_INTERVAL = float(os.getenv("MEDIA_POLL_INTERVAL", "5"))
+# A job not finished after this long is failed
+MEDIA_JOB_TIMEOUT = float(os.getenv("MEDIA_JOB_TIMEOUT", "1800"))
+# Failed checks in a row (network errors, 5xx) after which a polling job is given up on
+MEDIA_POLL_MAX_FAILURES = int(os.getenv("MEDIA_POLL_MAX_FAILURES", "5"))
+# Each process refreshes updated_at of the jobs it holds every poll; an unfinished job
+# not refreshed for this long belongs to a process that stopped, and another one takes it over
+MEDIA_JOB_ORPHAN_AFTER = float(os.getenv("MEDIA_JOB_ORPHAN_AFTER", "30"))
+
+# Caps on what a request may ask a provider for
+MEDIA_MAX_IMAGES = int(os.getenv("MEDIA_MAX_IMAGES", "4"))
+MEDIA_MAX_VIDEO_SECONDS = int(os.getenv("MEDIA_MAX_VIDEO_SECONDS", "8"))
+
+# Generation parameters a request may pass through to the provider: name -> allowed values,
+# or (minimum, maximum) to clamp a number to. Anything else is rejected.
+MEDIA_PARAMS = {
+    'image': {
+        'n': (1, MEDIA_MAX_IMAGES),
+        'size': ('256x256', '512x512', '1024x1024', '1792x1024', '1024x1792'),
+        'quality': ('standard', 'hd'),
+        'width': (256, 1536),
+        'height': (256, 1536),
+        'steps': (1, 50),
+    },
+    'video': {
+        'durationSeconds': (1, MEDIA_MAX_VIDEO_SECONDS),
+        'aspectRatio': ('16:9', '9:16'),
+        'negativePrompt': None,  # free text, truncated
+    },
+}
+MEDIA_NEGATIVE_PROMPT_CHARS = 1000
+
+FINISHED = ('succeeded', 'failed', 'cancelled')
+# WHERE clause for unfinished jobs; bind the FINISHED values for its placeholders
+UNFINISHED_SQL = f"status NOT IN ({', '.join('?' * len(FINISHED))})"
+
+
+class MediaJobsBusy(Exception):
+    """Raised when a process already has as many media jobs as it will take"""
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def _age(timestamp):
+    """Seconds since a _now() timestamp"""
+    then = datetime.strptime(timestamp[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - then).total_seconds()
+
+
+def clean_params(media_type, params):
+    """
+    A request's generation parameters, checked against MEDIA_PARAMS
+
+    Raises:
+        ValueError: an unknown parameter, or a value that isn't allowed
+    """
+    if not params:
+        return {}
+    if not isinstance(params, dict):
+        raise ValueError('params must be an object')
+    allowed = MEDIA_PARAMS[media_type]
+    cleaned = {}
+    for name, value in params.items():
+        if name not in allowed:
+            raise ValueError(f"Unsupported {media_type} parameter '{name}'")
+        rule = allowed[name]
+        if rule is None:
+            cleaned[name] = str(value)[:MEDIA_NEGATIVE_PROMPT_CHARS]
+        elif isinstance(rule[0], int):
+            if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                raise ValueError(f"'{name}' must be a number")
+            try:
+                number = int(value)
+            except ValueError:
+                raise ValueError(f"'{name}' must be a number")
+            cleaned[name] = max(rule[0], min(number, rule[1]))
+        elif value in rule:
+            cleaned[name] = value
+        else:
+            raise ValueError(f"'{name}' must be one of {', '.join(rule)}")
+    return cleaned
+
+
+def _job_from_row(row):
+    job = dict(row)
+    job['params'] = json.loads(job['params']) if job['params'] else {}
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    job.pop('provider_operation', None)
+    return job
+
+
+class MediaJobs:
+    """
+    Runs MediaClient generations off the request threads.
+
+    submit() records a queued job and returns at once; a bounded thread pool
+    runs the generation and writes the outcome back to the job row. Models
+    that answer with a long-running operation (Veo) free their pool thread
+    after starting it: one shared poller thread checks every outstanding
+    operation each MEDIA_POLL_INTERVAL, so a process can have many slow
+    videos in flight without a thread sleeping on each. A failed check is
+    retried on the next poll, until MEDIA_POLL_MAX_FAILURES fail in a row or
+    the job times out.
+
+    on_finish(job, result) is called on the worker or poller thread when a
+    job ends, with the MediaClient result (a dict, or an error string).
+
+    The poller also refreshes updated_at of every job this process holds.
+    When a process stops (a restart, or gunicorn recycling a worker), its jobs
+    stop being refreshed, and after MEDIA_JOB_ORPHAN_AFTER another process
+    takes them over in recover(): polling jobs resume from their saved
+    provider_operation, and queued or running ones, whose provider call died
+    with the process, are failed as interrupted.
+    """
+
+    def __init__(self, data_db_path, media_client, workers=MEDIA_JOB_WORKERS, queue_size=MEDIA_JOB_QUEUE,
+                 poll_interval=MEDIA_POLL_INTERVAL, timeout=MEDIA_JOB_TIMEOUT, orphan_after=MEDIA_JOB_ORPHAN_AFTER,
+                 poll_max_failures=MEDIA_POLL_MAX_FAILURES, on_finish=None):
+        self.data_db_path = data_db_path
+        self.media_client = media_client
+        self.workers = workers
+        self.queue_size = queue_size
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.poll_max_failures = poll_max_failures
+        # A few missed polls' worth at least, so a live process never loses its jobs
+        self.orphan_after = max(orphan_after, 3 * (poll_interval + 1))
+        self.on_finish = on_finish
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='media-job')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._operations = {}  # job_id -> (job, operation from start_video, started monotonic time)
+        self._held = set()  # job_ids queued, running or polling in this process
+        self._poll_failures = {}  # job_id -> failed checks in a row
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._wakeup = threading.Event()
+        self._stats = {'submitted': 0, 'rejected': 0, 'succeeded': 0, 'failed': 0, 'cancelled': 0, 'polls': 0,
+                       'poll_errors': 0, 'resumed': 0, 'interrupted': 0}
+        self._closed = False
+
+        self.recover()
+
+        self._poller = threading.Thread(target=self._poll_loop, name='media-job-poller', daemon=True)
+        self._poller.start()
+        atexit.register(self.close)
+
+    # --- Job state ---
+
+    def _update(self, job_id, status, only_if=None, **fields):
+        """Set a job's status and fields; returns False if only_if was given and the job wasn't in one of those states"""
+        fields['status'] = status
+        fields['updated_at'] = _now()
+        if status in FINISHED:
+            fields['finished_at'] = fields['updated_at']
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        sql = f'UPDATE media_jobs SET {assignments} WHERE job_id = ?'
+        params = list(fields.values()) + [job_id]
+        if only_if:
+            sql += f" AND status IN ({', '.join('?' * len(only_if))})"
+            params += list(only_if)
+
+        conn = get_connection(self.data_db_path)
+        try:
+            with conn:
+                updated = conn.execute(sql, params).rowcount
+        finally:
+            conn.close()
+        with self._changed:
+            self._changed.notify_all()
+        return bool(updated)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _finish(self, job, result):
+        if isinstance(result, str):
+            # MediaClient reports provider errors as a message for the chat window
+            self._update(job['job_id'], 'failed', error=result)
+            self._count('failed')
+        else:
+            # Before the job shows as succeeded, so its files can be fetched as soon as it does
+            store = getattr(self.media_client, 'store', None)
+            if store:
+                store.grant(job['user_id'], result)
+            self._update(job['job_id'], 'succeeded', result=json.dumps(result))
+            self._count('succeeded')
+        if self.on_finish:
+            try:
+                self.on_finish(job, result)
+            except Exception as e:
+                logger.error(f"Media job {job['job_id']} finish callback failed: {e}")
+
+    # --- Submitting ---
+
+    def submit(self, user_id, media_type, model_name, prompt, params=None):
+        """
+        Queue a generation and return the job record
+
+        Raises:
+            MediaJobsBusy: this process already holds as many jobs as it takes
+            ValueError: an unsupported media type or parameter (see clean_params)
+        """
+        if media_type not in ('image', 'video'):
+            raise ValueError(f"Unsupported media type '{media_type}'")
+        params = clean_params(media_type, params)
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise MediaJobsBusy(f"Too many {media_type} generations in progress. Please try again shortly.")
+
+        job = {
+            'job_id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'media_type': media_type,
+            'model_name': model_name,
+            'prompt': prompt,
+            'params': params,
+            'status': 'queued',
+            'created_at': _now()
+        }
+        try:
+            conn = get_connection(self.data_db_path)
+            try:
+                with conn:
+                    conn.execute(
+                        '''INSERT INTO media_jobs (job_id, user_id, media_type, model_name, prompt, params, status, created_at, updated_at)
+                           VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?)''',
+                        (job['job_id'], user_id, media_type, model_name, prompt, json.dumps(job['params']),
+                         job['created_at'], job['created_at'])
+                    )
+            finally:
+                conn.close()
+            with self._lock:
+                self._held.add(job['job_id'])
+            self._executor.submit(self._run, job)
+        except Exception:
+            with self._lock:
+                self._held.discard(job['job_id'])
+            self._slots.release()
+            raise
+        self._count('submitted')
+        return job
+
+    def _run(self, job):
+        """Run one job on a pool thread"""
+        holds_slot = True
+        try:
+            if not self._update(job['job_id'], 'running', only_if=('queued',)):
+                return  # Cancelled while queued
+
+            params = job['params']
+            if job['media_type'] == 'video' and self.media_client.is_long_running(job['model_name']):
+                operation = self.media_client.start_video(job['model_name'], job['prompt'], **params)
+                self._update(job['job_id'], 'polling', provider_operation=json.dumps(operation))
+                with self._lock:
+                    self._operations[job['job_id']] = (job, operation, time.monotonic())
+                holds_slot = False  # The poller releases it when the operation ends
+                self._wakeup.set()
+                return
+
+            if job['media_type'] == 'image':
+                result = self.media_client.generate_image(job['model_name'], job['prompt'], **params)
+            else:
+                result = self.media_client.generate_video(job['model_name'], job['prompt'], **params)
+            self._finish(job, result)
+        except Exception as e:
+            logger.error(f"Media job {job['job_id']} failed: {e}")
+            self._finish(job, f"⚠️ {job['media_type'].capitalize()} generation failed: {e}")
+        finally:
+            if holds_slot:
+                with self._lock:
+                    self._held.discard(job['job_id'])
+                self._slots.release()
+
+    # --- Polling ---
+
+    def _poll_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            # Give a just-started operation a moment before the first check
+            time.sleep(min(1.0, self.poll_interval))
+            try:
+                self._heartbeat()
+                self.recover()
+            except Exception as e:
+                logger.error(f"Media job upkeep failed: {e}")
+            self.poll()
+
+    def _heartbeat(self):
+        """Refresh updated_at of the jobs this process holds, so no other process takes them over"""
+        with self._lock:
+            held = list(self._held)
+        if not held:
+            return
+        conn = get_connection(self.data_db_path)
+        try:
+            with conn:
+                conn.execute(
+                    f'''UPDATE media_jobs SET updated_at = ?
+                        WHERE job_id IN ({', '.join('?' * len(held))}) AND {UNFINISHED_SQL}''',
+                    [_now()] + held + list(FINISHED)
+                )
+        finally:
+            conn.close()
+
+    def recover(self):
+        """
+        Take over unfinished jobs whose process stopped refreshing them
+
+        A polling job with a saved provider operation is polled from here on,
+        if this process has a free slot (otherwise it's left for the next
+        check or another process). Every other orphaned job is failed.
+        Each job is claimed with a compare-and-set on updated_at, so of the
+        processes checking at once only one takes it.
+        """
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=self.orphan_after)).strftime('%Y-%m-%d %H:%M:%S.%f')
+        conn = get_connection(self.data_db_path)
+        try:
+            rows = conn.execute(
+                f'SELECT * FROM media_jobs WHERE {UNFINISHED_SQL} AND updated_at < ?', FINISHED + (cutoff,)
+            ).fetchall()
+            for row in rows:
+                resumable = row['status'] == 'polling' and row['provider_operation']
+                if resumable and not self._slots.acquire(blocking=False):
+                    continue
+                now = _now()
+                with conn:
+                    if resumable:
+                        claimed = conn.execute(
+                            'UPDATE media_jobs SET updated_at = ? WHERE job_id = ? AND status = ? AND updated_at = ?',
+                            (now, row['job_id'], row['status'], row['updated_at'])
+                        ).rowcount
+                    else:
+                        claimed = conn.execute(
+                            '''UPDATE media_jobs SET status = 'failed', error = 'Interrupted', finished_at = ?, updated_at = ?
+                               WHERE job_id = ? AND status = ? AND updated_at = ?''',
+                            (now, now, row['job_id'], row['status'], row['updated_at'])
+                        ).rowcount
+                if not claimed:
+                    if resumable:
+                        self._slots.release()
+                    continue
+
+                if not resumable:
+                    logger.warning(f"Media job {row['job_id']} was interrupted while {row['status']}")
+                    self._count('interrupted')
+                    continue
+                job = _job_from_row(row)
+                operation = json.loads(row['provider_operation'])
+                # Measure the timeout from when the job was created, not from now
+                started = time.monotonic() - _age(row['created_at'])
+                with self._lock:
+                    self._held.add(job['job_id'])
+                    self._operations[job['job_id']] = (job, operation, started)
+                logger.info(f"Resumed polling media job {job['job_id']}")
+                self._count('resumed')
+        finally:
+            conn.close()
+        if rows:
+            with self._changed:
+                self._changed.notify_all()
+
+    def poll(self):
+        """Check every outstanding provider operation once"""
+        with self._lock:
+            operations = list(self._operations.items())
+
+        for job_id, (job, operation, started) in operations:
+            timed_out = time.monotonic() - started >= self.timeout
+            try:
+                result = self.media_client.poll_video(operation)
+                self._count('polls')
+                with self._lock:
+                    self._poll_failures.pop(job_id, None)
+                if result is None:
+                    if not timed_out:
+                        continue
+                    result = f"⚠️ {job['media_type'].capitalize()} generation took longer than {self.timeout / 60:.0f} minutes."
+            except Exception as e:
+                self._count('poll_errors')
+                with self._lock:
+                    failures = self._poll_failures[job_id] = self._poll_failures.get(job_id, 0) + 1
+                # One bad check says little about a video that takes minutes; try again next poll
+                if failures < self.poll_max_failures and not timed_out:
+                    logger.warning(f"Polling media job {job_id} failed ({failures} in a row), retrying: {e}")
+                    continue
+                logger.error(f"Polling media job {job_id} failed {failures} times in a row, giving up: {e}")
+                result = f"⚠️ {job['media_type'].capitalize()} generation failed: {e}"
+
+            with self._lock:
+                self._operations.pop(job_id, None)
+                self._poll_failures.pop(job_id, None)
+                self._held.discard(job_id)
+            self._slots.release()
+            self._finish(job, result)
+
+    # --- Reading ---
+
+    def get(self, job_id, user_id=None):
+        """A job record, or None if it doesn't exist (or belongs to someone else)"""
+        conn = get_connection(self.data_db_path)
+        try:
+            row = conn.execute('SELECT * FROM media_jobs WHERE job_id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if not row or (user_id is not None and row['user_id'] != user_id):
+            return None
+        return _job_from_row(row)
+
+    def list_for_user(self, user_id, limit=20):
+        """A user's most recent jobs, newest first"""
+        conn = get_connection(self.data_db_path)
+        try:
+            rows = conn.execute(
+                'SELECT * FROM media_jobs WHERE user_id = ? ORDER BY created_at DESC LIMIT ?', (user_id, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [_job_from_row(row) for row in rows]
+
+    def wait(self, job_id, user_id=None, since_status=None, timeout=15.0):
+        """
+        Block until the job's status differs from since_status, or timeout
+
+        Jobs run by this process wake the waiter as soon as they change; jobs
+        another worker process is running are re-read once a second.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id, user_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['status'] != since_status or remaining <= 0:
+                return job
+            with self._changed:
+                self._changed.wait(min(1.0, remaining))
+
+    def cancel(self, job_id, user_id):
+        """Cancel one of the user's jobs that hasn't started; True if it was cancelled"""
+        if not self.get(job_id, user_id):
+            return False
+        if self._update(job_id, 'cancelled', only_if=('queued',)):
+            self._count('cancelled')
+            return True
+        return False
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, workers=self.workers, queue_size=self.queue_size, polling=len(self._operations),
+                        held=len(self._held))
+
+    def close(self):
+        """Stop taking jobs and wait for the running ones; operations still polling are taken over by another process"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
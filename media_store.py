@@ -0,0 +1,269 @@
+# media_store.py - Content-addressed store for generated images and videos
+
+import os
+import re
+import base64
+import hashlib
+import tempfile
+import mimetypes
+import logging
+from urllib.parse import urlparse
+
+from database.lib.database_manager import get_connection
+from media_variants import variant_path
+
+logger = logging.getLogger(__name__)
+
+# Where generated files are written, as <root>/<first 2 hex digits>/<sha256><ext>
+MEDIA_STORE_DIR = os.getenv("MEDIA_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media'))
+# Largest file fetched from a provider
+MEDIA_MAX_BYTES = int(os.getenv("MEDIA_MAX_BYTES", str(512 * 1024 * 1024)))
+# URL prefix the app serves stored files under
+MEDIA_URL_PREFIX = '/media/files/'
+
+FILE_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+DATA_URI_PATTERN = re.compile(r'^data:([\w/+.-]+);base64,(.*)$', re.DOTALL)
+DEFAULT_MIME_TYPES = {'image': 'image/png', 'video': 'video/mp4'}
+CHUNK_SIZE = 256 * 1024
+
+
+class MediaStore:
+    """
+    Generated media written once to disk under the SHA-256 of its bytes.
+
+    ingest() swaps the provider URLs (which expire) and inline data URIs in
+    a MediaClient result for URLs of local copies, downloading each file
+    once and streaming it to disk while hashing. The same bytes are stored
+    once however often they're generated. Since a file's name is its hash,
+    its content never changes, so it can be served with an immutable
+    Cache-Control and the hash as a strong ETag. Each user a file was
+    generated for is recorded with grant(), and get() checks it.
+
+    With an ImageVariants pool, each new image also gets WebP/AVIF copies and
+    a thumbnail next to it, and get() picks the smallest one the browser
+    accepts.
+    """
+
+    def __init__(self, data_db_path, http, root=MEDIA_STORE_DIR, max_bytes=MEDIA_MAX_BYTES, variants=None):
+        self.data_db_path = data_db_path
+        self.http = http  # ProviderSessions, so downloads reuse the provider's pooled connections
+        self.root = root
+        self.max_bytes = max_bytes
+        self.variants = variants if variants and variants.enabled else None
+        os.makedirs(self.root, exist_ok=True)
+
+    # --- Writing ---
+
+    def _path(self, file_id, mime_type):
+        extension = mimetypes.guess_extension(mime_type) or ''
+        return os.path.join(self.root, file_id[:2], file_id + extension)
+
+    def _commit(self, temp_path, digest, mime_type, size, file_type, source_url=None, filename=None):
+        """Move a fully written temp file to its content address and record it"""
+        file_id = digest.hexdigest()
+        conn = get_connection(self.data_db_path)
+        try:
+            row = conn.execute('SELECT mime_type FROM media_files WHERE id = ?', (file_id,)).fetchone()
+            # The same bytes stored before keep their first MIME type, and so their path
+            path = self._path(file_id, row['mime_type'] if row else mime_type)
+            if os.path.exists(path):
+                os.unlink(temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+            encode = False
+            if not row:
+                wants_variants = bool(file_type == 'image' and self.variants)
+                with conn:
+                    inserted = conn.execute(
+                        '''INSERT OR IGNORE INTO media_files (id, filename, file_type, file_url, mime_type, size_bytes, variants_done)
+                           VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                        (file_id, filename, file_type, source_url, mime_type, size, not wants_variants)
+                    ).rowcount
+                # Of two workers storing the same new bytes at once, only the one whose insert won encodes
+                encode = wants_variants and inserted == 1
+        finally:
+            conn.close()
+
+        if encode and not self.variants.submit(path, lambda variants: self._record_variants(file_id, variants)):
+            # Pool busy: this file keeps only its original, so it's final now
+            self._record_variants(file_id, [])
+        return file_id
+
+    def _record_variants(self, file_id, variants):
+        """Record the outcome of encoding a file's variants; [] when there are none"""
+        conn = get_connection(self.data_db_path)
+        try:
+            with conn:
+                conn.executemany(
+                    '''INSERT OR REPLACE INTO media_variants (file_id, size, mime_type, width, height, size_bytes)
+                       VALUES (?, ?, ?, ?, ?, ?)''',
+                    [(file_id, v['size'], v['mime_type'], v['width'], v['height'], v['size_bytes']) for v in variants]
+                )
+                conn.execute('UPDATE media_files SET variants_done = 1 WHERE id = ?', (file_id,))
+        finally:
+            conn.close()
+
+    def grant(self, user_id, result):
+        """Let user_id fetch the stored files a MediaClient result links to"""
+        file_ids = [
+            url[len(MEDIA_URL_PREFIX):]
+            for url in result.get('images', []) + result.get('videos', [])
+            if url.startswith(MEDIA_URL_PREFIX)
+        ]
+        if not file_ids:
+            return
+        conn = get_connection(self.data_db_path)
+        try:
+            with conn:
+                conn.executemany(
+                    'INSERT OR IGNORE INTO media_file_owners (file_id, user_id) VALUES (?, ?)',
+                    [(file_id, user_id) for file_id in file_ids]
+                )
+        finally:
+            conn.close()
+
+    def _temp_file(self):
+        return tempfile.NamedTemporaryFile(dir=self.root, prefix='.incoming-', delete=False)
+
+    def put_bytes(self, data, mime_type, file_type, source_url=None, filename=None):
+        """Store bytes already in memory; returns the file id"""
+        digest = hashlib.sha256(data)
+        with self._temp_file() as temp:
+            temp.write(data)
+        return self._commit(temp.name, digest, mime_type, len(data), file_type, source_url, filename)
+
+    def fetch(self, url, file_type, provider_key, headers=None):
+        """Download a provider URL straight to disk, hashing as it streams; returns the file id"""
+        response = self.http.get(provider_key, url, headers=headers, stream=True)
+        try:
+            if response.status_code != 200:
+                raise Exception(f"HTTP {response.status_code} fetching generated {file_type}")
+            mime_type = (response.headers.get('Content-Type') or '').split(';')[0].strip()
+            if not mime_type.startswith(file_type + '/'):
+                mime_type = mimetypes.guess_type(urlparse(url).path)[0] or DEFAULT_MIME_TYPES[file_type]
+
+            digest = hashlib.sha256()
+            size = 0
+            with self._temp_file() as temp:
+                try:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise Exception(f"Generated {file_type} is larger than {self.max_bytes} bytes")
+                        digest.update(chunk)
+                        temp.write(chunk)
+                except Exception:
+                    temp.close()
+                    os.unlink(temp.name)
+                    raise
+        finally:
+            response.close()
+        filename = os.path.basename(urlparse(url).path) or None
+        return self._commit(temp.name, digest, mime_type, size, file_type, url, filename)
+
+    def ingest(self, result, provider_key, headers=None):
+        """
+        A copy of a MediaClient result with each image/video URL replaced by
+        the URL of a stored copy; the originals are kept under 'source_urls'.
+        Entries that can't be stored are left as they were.
+        """
+        media_type = result.get('type')
+        key = {'image': 'images', 'video': 'videos'}.get(media_type)
+        if not key or not result.get(key):
+            return result
+
+        stored = []
+        for item in result[key]:
+            try:
+                match = DATA_URI_PATTERN.match(item)
+                if match:
+                    file_id = self.put_bytes(base64.b64decode(match.group(2)), match.group(1), media_type)
+                elif item.startswith(('https://', 'http://')):
+                    file_id = self.fetch(item, media_type, provider_key, headers)
+                else:
+                    stored.append(item)
+                    continue
+                stored.append(self.url_for(file_id))
+            except Exception as e:
+                logger.error(f"Couldn't store generated {media_type}: {e}")
+                stored.append(item)
+
+        result = dict(result)
+        result['source_urls'] = [item for item in result[key] if not DATA_URI_PATTERN.match(item)]
+        result[key] = stored
+        return result
+
+    # --- Reading ---
+
+    def url_for(self, file_id):
+        return f"{MEDIA_URL_PREFIX}{file_id}"
+
+    def get(self, file_id, size='full', accept='', user_id=None):
+        """
+        The smallest stored copy of a file that suits the request, or None
+
+        size is 'full' or 'thumb' (images only; falls back to full size when
+        there's no thumbnail), accept the browser's Accept header, which
+        decides whether WebP and AVIF copies may be used. With user_id, files
+        that weren't generated for that user are None too.
+
+        Returns:
+            dict: {'path', 'mime_type', 'size_bytes', 'etag', 'final'}; final is
+            False until encoding the image's variants has finished, failed or been skipped
+        """
+        if not FILE_ID_PATTERN.match(file_id):
+            return None
+        conn = get_connection(self.data_db_path)
+        try:
+            row = conn.execute(
+                'SELECT file_type, mime_type, size_bytes, variants_done FROM media_files WHERE id = ?', (file_id,)
+            ).fetchone()
+            if row and user_id is not None and not conn.execute(
+                'SELECT 1 FROM media_file_owners WHERE file_id = ? AND user_id = ?', (file_id, user_id)
+            ).fetchone():
+                row = None
+            variants = conn.execute(
+                'SELECT size, mime_type, size_bytes FROM media_variants WHERE file_id = ?', (file_id,)
+            ).fetchall() if row and row['file_type'] == 'image' else []
+        finally:
+            conn.close()
+        if not row:
+            return None
+        path = self._path(file_id, row['mime_type'])
+        if not os.path.exists(path):
+            return None
+
+        original = {'path': path, 'mime_type': row['mime_type'], 'size_bytes': row['size_bytes'], 'etag': file_id}
+        if size == 'thumb' and not any(variant['size'] == 'thumb' for variant in variants):
+            size = 'full'
+        candidates = [original] if size == 'full' else []
+        for variant in variants:
+            if variant['size'] != size or variant['mime_type'] not in accept:
+                continue
+            extension = variant['mime_type'].split('/')[1]
+            candidates.append({
+                'path': variant_path(path, variant['size'], extension),
+                'mime_type': variant['mime_type'],
+                'size_bytes': variant['size_bytes'],
+                'etag': f"{file_id}.{variant['size']}.{extension}"
+            })
+        if not candidates:
+            # Only thumbnails the browser can't display
+            candidates = [original]
+        chosen = min(candidates, key=lambda candidate: candidate['size_bytes'])
+        chosen['final'] = bool(row['variants_done'])
+        return chosen
+
+    def stats(self):
+        conn = get_connection(self.data_db_path)
+        try:
+            rows = conn.execute(
+                'SELECT file_type, COUNT(*) AS files, SUM(size_bytes) AS bytes FROM media_files GROUP BY file_type'
+            ).fetchall()
+        finally:
+            conn.close()
+        stats = {'root': self.root, 'by_type': {row['file_type']: {'files': row['files'], 'bytes': row['bytes']} for row in rows}}
+        if self.variants:
+            stats['variants'] = self.variants.stats()
+        return stats
@@ -0,0 +1,133 @@
+# media_variants.py - WebP/AVIF copies and thumbnails of generated images, encoded in a process pool
+
+import os
+import logging
+
+from provider_sdks import sdk_available, import_sdk
+from process_pool import BoundedProcessPool
+
+logger = logging.getLogger(__name__)
+
+# Worker processes encoding variants; 0 turns variants off and every image is served as generated
+MEDIA_VARIANT_WORKERS = int(os.getenv("MEDIA_VARIANT_WORKERS", str(min(2, os.cpu_count() or 1))))
+# Images allowed to wait for a worker; beyond that new images are served without variants
+MEDIA_VARIANT_QUEUE = int(os.getenv("MEDIA_VARIANT_QUEUE", "32"))
+# Longest side of a thumbnail; chat renders images no wider than its message column
+MEDIA_THUMB_SIZE = int(os.getenv("MEDIA_THUMB_SIZE", "512"))
+
+# (Pillow format, MIME type, extension, save options). AVIF needs Pillow 11.2+ built with
+# libavif; where that's missing its save fails and only WebP is made.
+ENCODINGS = (
+    ('WEBP', 'image/webp', 'webp', {'quality': 80, 'method': 4}),
+    ('AVIF', 'image/avif', 'avif', {'quality': 60, 'speed': 8}),
+)
+
+SIZES = ('full', 'thumb')
+
+
+def variant_path(original_path, size, extension):
+    """Where a variant of a stored file lives: next to it, as <sha256>.<size>.<extension>"""
+    return f"{os.path.splitext(original_path)[0]}.{size}.{extension}"
+
+
+def encode_variants(original_path, thumb_size=MEDIA_THUMB_SIZE):
+    """
+    Encode an image's variants next to it; runs in a pool process
+
+    Returns:
+        list: {'size', 'mime_type', 'width', 'height', 'size_bytes'} per variant written
+    """
+    Image = import_sdk('PIL.Image')
+
+    with Image.open(original_path) as original:
+        original.load()
+        has_alpha = 'A' in original.getbands() or 'transparency' in original.info
+        image = original.convert('RGBA' if has_alpha else 'RGB')
+
+    images = {'full': image}
+    if max(image.size) > thumb_size:
+        thumb = image.copy()
+        thumb.thumbnail((thumb_size, thumb_size), Image.Resampling.LANCZOS)
+        images['thumb'] = thumb
+
+    variants = []
+    for size, variant_image in images.items():
+        for image_format, mime_type, extension, options in ENCODINGS:
+            path = variant_path(original_path, size, extension)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                variant_image.save(temp_path, image_format, **options)
+            except Exception as e:
+                logger.debug(f"No {image_format} variant of {original_path}: {e}")
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                continue
+            os.replace(temp_path, path)
+            variants.append({
+                'size': size,
+                'mime_type': mime_type,
+                'width': variant_image.width,
+                'height': variant_image.height,
+                'size_bytes': os.path.getsize(path)
+            })
+    return variants
+
+
+class ImageVariants:
+    """
+    Bounded process pool that encodes smaller copies of generated images.
+
+    Generated images arrive as full-size PNGs; encoding WebP/AVIF copies and
+    thumbnails is CPU-heavy, so it runs in a BoundedProcessPool after the
+    image is stored, off the request path. Until an image's variants are
+    ready it is served as generated. When the pool is busy the image is
+    skipped rather than queued without limit.
+    """
+
+    def __init__(self, workers=MEDIA_VARIANT_WORKERS, queue_size=MEDIA_VARIANT_QUEUE, thumb_size=MEDIA_THUMB_SIZE):
+        if workers and not sdk_available('PIL'):
+            logger.warning("Pillow isn't installed; generated images will be served without WebP/AVIF variants")
+            workers = 0
+        self.thumb_size = thumb_size
+        self._pool = BoundedProcessPool(workers, queue_size, counters=('encoded', 'failed'))
+
+    @property
+    def workers(self):
+        return self._pool.workers
+
+    @property
+    def enabled(self):
+        return self._pool.enabled
+
+    def submit(self, original_path, on_done):
+        """
+        Encode an image's variants in the background. on_done(variants) is
+        called on a pool thread once they're written, with [] if encoding
+        failed. False if the image wasn't queued; on_done is then never called.
+        """
+        future = self._pool.submit(encode_variants, original_path, self.thumb_size)
+        if future is None:
+            return False
+
+        def done(future):
+            try:
+                variants = future.result()
+            except Exception as e:
+                logger.error(f"Encoding variants of {original_path} failed: {e}")
+                self._pool.count('failed')
+                variants = []
+            else:
+                self._pool.count('encoded')
+            try:
+                on_done(variants)
+            except Exception as e:
+                logger.error(f"Recording variants of {original_path} failed: {e}")
+
+        future.add_done_callback(done)
+        return True
+
+    def stats(self):
+        return dict(self._pool.stats(), thumb_size=self.thumb_size)
+
+    def close(self):
+        self._pool.close()
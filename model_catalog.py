@@ -0,0 +1,269 @@
+# model_catalog.py - In-memory snapshot of the models database
+
+import os
+import time
+import threading
+import logging
+from types import MappingProxyType
+
+from display_names import DisplayNameParser
+from model_equivalents import ModelEquivalents
+from model_schema import MODEL_TYPE_TABLES, DEFAULT_PROVIDER_RANK
+from database.lib.database_manager import get_connection
+
+logger = logging.getLogger(__name__)
+
+# How often a worker checks models.db's catalog_version for edits made through another worker
+MODEL_CATALOG_CHECK_INTERVAL = float(os.getenv("MODEL_CATALOG_CHECK_INTERVAL", "2"))
+
+# Model types in lookup order: when two types share a model_name, the earlier one wins
+MODEL_TYPES = tuple(model_type for model_type, _ in MODEL_TYPE_TABLES)
+
+# Mapping from frontend display names to database model names
+DISPLAY_NAME_ALIASES = {
+    # Google/Gemini models
+    'Gemini 2.5 Flash': 'Gemini 2.5 Flash Preview 05-20',
+    'Gemini 2.5 Pro': 'Gemini 2.5 Pro Preview',
+    'Gemini 2.0 Flash': 'Gemini 2.0 Flash',
+    'Gemini 1.5 Flash': 'Gemini 1.5 Flash',
+    'Gemini 1.5 Pro': 'Gemini 1.5 Pro',
+
+    # Anthropic/Claude models
+    'Claude 4 Sonnet': 'Claude Sonnet 4',
+    'Claude Sonnet 4': 'Claude Sonnet 4',
+    'Claude 3.5 Sonnet': 'Claude Sonnet 3.5',
+    'Claude 3 Opus': 'Claude 3 Opus',
+    'Claude 3 Haiku': 'Claude 3 Haiku',
+
+    # OpenAI models
+    'GPT-4o': 'gpt-4o',
+    'GPT-4o Mini': 'gpt-4o-mini',
+    'o1-mini': 'o1-mini',
+    'o3-mini': 'o3-mini',
+
+    # DeepSeek models
+    'DeepSeek R1': 'DeepSeek-R1',
+    'DeepSeek Coder': 'deepseek-reasoner',
+    'DeepSeek Coder V2': 'deepseek-reasoner',
+
+    # Meta/Llama models
+    'Llama 4 Scout': 'Llama-4-Scout-17B-16E-Instruct',
+    'Llama 3.1 70B': 'Llama-3.1-70B-Instruct-Turbo',
+
+    # Default fallback
+    'Gemini 2.5 Flash': 'Gemini 2.0 Flash',  # Fallback if 2.5 not available
+}
+
+
+def _sort_key(model):
+    """Provider rank, then most expensive first, then name"""
+    price = model.get('usd_per_million_input_tokens') or 0
+    return (model.get('provider_rank', DEFAULT_PROVIDER_RANK), -price, model['model_name'])
+
+
+class ModelCatalog:
+    """
+    Immutable, indexed snapshot of every active model in models.db.
+
+    Each entry is a read-only mapping of a `models` row plus 'table', the
+    per-type table name its type used to have (still the key of its type in
+    the /models/categorized payload).
+    Lookups never touch SQLite; a new snapshot is built by load() and swapped
+    in by CatalogHolder. The display-name rules and model equivalence groups
+    are loaded with it.
+    """
+
+    def __init__(self, rows, version=0, display_names=None, equivalents=None):
+        self.version = version
+        self.display_names = display_names or DisplayNameParser()
+        self.equivalents = equivalents or ModelEquivalents()
+
+        by_type = {model_type: [] for model_type in MODEL_TYPES}
+        by_name = {}
+        by_type_name = {}
+        by_api_name = {}
+        by_lower_name = {}
+        llm_in_id_order = []
+
+        # Rows come grouped by type in MODEL_TYPES order
+        for row in rows:
+            entry = MappingProxyType(row)
+            name = row['model_name']
+            model_type = row['model_type']
+
+            by_type[model_type].append(entry)
+            by_type_name.setdefault((model_type, name), entry)
+            if model_type == 'llm':
+                llm_in_id_order.append(entry)
+
+            by_name.setdefault(name, entry)
+            by_lower_name.setdefault(name.lower(), entry)
+            if row.get('api_name'):
+                by_api_name.setdefault(row['api_name'], entry)
+
+        self._by_type = {
+            model_type: tuple(sorted(models, key=_sort_key))
+            for model_type, models in by_type.items()
+        }
+        self._by_name = by_name
+        self._by_type_name = by_type_name
+        self._by_api_name = by_api_name
+        self._by_lower_name = by_lower_name
+        self._llm_in_id_order = tuple(sorted(llm_in_id_order, key=lambda model: model['id']))
+        self._by_display_name = {
+            display: by_name[model_name]
+            for display, model_name in DISPLAY_NAME_ALIASES.items()
+            if model_name in by_name
+        }
+
+    @classmethod
+    def load(cls, db_path, version=0):
+        """Read every active model from the database into a new snapshot"""
+        rows = []
+        conn = get_connection(db_path)
+        try:
+            for model_type, table in MODEL_TYPE_TABLES:
+                # Served in order by idx_models_type_rank
+                for model_row in conn.execute(
+                    '''SELECT * FROM models WHERE model_type = ? AND is_active = 1
+                       ORDER BY provider_rank, usd_per_million_input_tokens DESC''',
+                    (model_type,)
+                ).fetchall():
+                    row = dict(model_row)
+                    row['table'] = table
+                    rows.append(row)
+
+            display_names = DisplayNameParser.load(conn)
+            equivalents = ModelEquivalents.load(conn)
+        finally:
+            conn.close()
+
+        catalog = cls(rows, version, display_names, equivalents)
+        logger.info(f"Model catalog v{version} loaded with {len(catalog)} models")
+        return catalog
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def __contains__(self, model_name):
+        return model_name in self._by_name
+
+    def get(self, model_name, model_type=None):
+        """Exact lookup by model_name (falling back to api_name), optionally within one model type"""
+        if model_type is None:
+            return self._by_name.get(model_name) or self._by_api_name.get(model_name)
+
+        model = self._by_type_name.get((model_type, model_name))
+        if model is None:
+            model = self._by_api_name.get(model_name)
+            if model is not None and model['model_type'] != model_type:
+                model = None
+        return model
+
+    def resolve(self, name):
+        """
+        Resolve a frontend name (display name, model_name, api_name or a
+        partial/case-insensitive name) to a catalog entry.
+
+        Returns None if nothing matches.
+        """
+        model = self._by_display_name.get(name) or self.get(name)
+        if model:
+            return model
+
+        model = self._by_lower_name.get(name.lower())
+        if model:
+            return model
+
+        # Partial match, same as the old LIKE '%name%' query on llm_models
+        needle = name.lower()
+        for model in self._llm_in_id_order:
+            if needle in model['model_name'].lower():
+                return model
+        return None
+
+    def alternatives(self, model_name):
+        """Active models that can stand in for model_name, most preferred first"""
+        return tuple(
+            self._by_name[name] for name in self.equivalents.alternatives(model_name)
+            if name in self._by_name
+        )
+
+    def models(self, model_type='llm'):
+        """Active models of one type, in display order"""
+        return self._by_type.get(model_type, ())
+
+    def all_models(self):
+        """Active models of every type, in display order"""
+        return tuple(model for model_type in MODEL_TYPES for model in self._by_type[model_type])
+
+
+class CatalogHolder:
+    """
+    Holds the current ModelCatalog snapshot.
+
+    Readers just take `holder.current` and keep using that snapshot for the
+    rest of their request. reload() builds a new snapshot off to the side
+    and swaps the reference in one assignment, so readers never block.
+
+    Every worker process has its own holder. Triggers on the catalog tables
+    bump the catalog_version row in models.db, and `current` reads that row
+    at most once per check_interval; when it has moved, e.g. after an admin
+    edit served by another worker, the snapshot is rebuilt. One thread does
+    the check while the others keep the snapshot they have.
+    """
+
+    def __init__(self, db_path, check_interval=MODEL_CATALOG_CHECK_INTERVAL):
+        self.db_path = db_path
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._version = 0
+        self._db_version = None  # catalog_version the snapshot was built from
+        self._check_after = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def current(self):
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() >= self._check_after:
+            snapshot = self._refresh()
+        return snapshot
+
+    def reload(self):
+        """Rebuild the snapshot from the database, e.g. after an admin edit"""
+        with self._lock:
+            self._load_locked(self._read_db_version())
+        return self._snapshot
+
+    def _refresh(self):
+        if self._snapshot is None:
+            self._lock.acquire()
+        elif not self._lock.acquire(blocking=False):
+            return self._snapshot
+        try:
+            if self._snapshot is None:
+                self._load_locked(self._read_db_version())
+            elif time.monotonic() >= self._check_after:
+                db_version = self._read_db_version()
+                if db_version != self._db_version:
+                    logger.info(f"catalog_version moved from {self._db_version} to {db_version}; reloading")
+                    self._load_locked(db_version)
+                else:
+                    self._check_after = time.monotonic() + self.check_interval
+            return self._snapshot
+        finally:
+            self._lock.release()
+
+    def _read_db_version(self):
+        conn = get_connection(self.db_path)
+        try:
+            return conn.execute('SELECT version FROM catalog_version WHERE id = 1').fetchone()[0]
+        finally:
+            conn.close()
+
+    def _load_locked(self, db_version):
+        # db_version is read before the rows, so an edit made while loading is picked up by the next check
+        self._version += 1
+        self._snapshot = ModelCatalog.load(self.db_path, self._version)
+        self._db_version = db_version
+        self._check_after = time.monotonic() + self.check_interval
@@ -0,0 +1,63 @@
+# model_equivalents.py - Groups of interchangeable models for failover and hedging
+
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Table in models.db with extra groups; a group defined there replaces the built-in one of the same name
+GROUPS_TABLE = 'model_equivalents'
+
+# (group_name, model_names in preference order). Models of comparable quality and
+# speed on different providers, so a request can move between them unnoticed.
+BUILTIN_GROUPS = (
+    ('fast', ('gpt-4o-mini', 'Gemini 2.0 Flash', 'Claude Haiku 3.5', 'Llama-3.3-70B-Instruct-Turbo')),
+    ('flagship', ('gpt-4o', 'Claude Sonnet 4', 'Gemini 2.5 Pro Preview', 'gpt-4.1')),
+    ('reasoning', ('o3-mini', 'deepseek-reasoner', 'o4-mini', 'Gemini 2.5 Flash Preview 05-20')),
+    ('deepseek-chat', ('deepseek-chat', 'DeepSeek-V3')),
+    ('llama-70b', ('Llama-3.3-70B-Instruct-Turbo', 'Llama-3.1-70B-Instruct-Turbo')),
+)
+
+
+class ModelEquivalents:
+    """
+    Which models can stand in for which.
+
+    A model may be in several groups; its alternatives are the other members
+    of its groups, in group order and then preference order, without repeats.
+    """
+
+    def __init__(self, groups=BUILTIN_GROUPS):
+        self.groups = {}
+        for group_name, model_names in groups:
+            self.groups[group_name] = tuple(model_names)
+
+        self._alternatives = {}
+        for model_names in self.groups.values():
+            for model_name in model_names:
+                alternatives = self._alternatives.setdefault(model_name, [])
+                for other in model_names:
+                    if other != model_name and other not in alternatives:
+                        alternatives.append(other)
+
+    @classmethod
+    def load(cls, conn):
+        """Groups from the database table, overriding built-in groups of the same name"""
+        try:
+            rows = conn.execute(
+                f'''SELECT group_name, model_name FROM {GROUPS_TABLE}
+                    WHERE is_active = 1 ORDER BY group_name, priority, id'''
+            ).fetchall()
+        except sqlite3.OperationalError:
+            # Table doesn't exist; the built-in groups cover the shipped catalog
+            return cls()
+
+        db_groups = {}
+        for group_name, model_name in rows:
+            db_groups.setdefault(group_name, []).append(model_name)
+        groups = [(name, db_groups.pop(name, models)) for name, models in BUILTIN_GROUPS]
+        return cls(tuple(groups) + tuple(db_groups.items()))
+
+    def alternatives(self, model_name):
+        """Models that can answer instead of model_name, most preferred first"""
+        return tuple(self._alternatives.get(model_name, ()))
@@ -0,0 +1,125 @@
+# model_schema.py - Unified models table, and the migration from the per-type model tables
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Model types, with the table each one had before the unified `models` table
+MODEL_TYPE_TABLES = (
+    ('llm', 'llm_models'),
+    ('image', 'image_models'),
+    ('audio', 'audio_models'),
+    ('video', 'video_models'),
+)
+
+# Display order of providers in the model picker, lowest first
+PROVIDER_RANK = {
+    'Anthropic': 1,
+    'Google': 2,
+    'OpenAI': 3,
+    'DeepSeek': 4,
+    'Meta': 5,
+    'xAI': 6,
+}
+DEFAULT_PROVIDER_RANK = 7
+
+# Same table and indexes as db/create_models_db.sql
+SCHEMA = f'''
+CREATE TABLE models (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model_type VARCHAR(16) NOT NULL CHECK (model_type IN ('llm', 'image', 'audio', 'video')),
+    provider_name VARCHAR(255) NOT NULL,
+    provider_rank INT NOT NULL DEFAULT {DEFAULT_PROVIDER_RANK},
+    model_name VARCHAR(255) NOT NULL,
+    api_name VARCHAR(255),
+    context_window_max_tokens INT,
+    supports_images_input BOOLEAN DEFAULT FALSE,
+    supports_pdfs_input BOOLEAN DEFAULT FALSE,
+    multimodal_input BOOLEAN DEFAULT FALSE,
+    reasoning_enabled BOOLEAN DEFAULT FALSE,
+    usd_per_million_input_tokens DECIMAL(10, 5),
+    usd_per_million_output_tokens DECIMAL(10, 5),
+    is_active BOOLEAN DEFAULT TRUE,
+    notes TEXT
+);
+
+CREATE INDEX idx_models_type_rank ON models (model_type, is_active, provider_rank, usd_per_million_input_tokens DESC);
+CREATE INDEX idx_models_model_name ON models (model_name);
+CREATE INDEX idx_models_api_name ON models (api_name);
+'''
+
+# Columns every per-type table had, copied as they are
+COPIED_COLUMNS = (
+    'provider_name', 'model_name', 'api_name', 'context_window_max_tokens',
+    'supports_images_input', 'supports_pdfs_input', 'multimodal_input', 'reasoning_enabled',
+    'usd_per_million_input_tokens', 'usd_per_million_output_tokens', 'is_active', 'notes'
+)
+
+# Name the single-table `models` schema (database/scripts/create_models_db.sql) is moved to while migrating
+LEGACY_TABLE_BACKUP = 'legacy_models'
+
+
+def provider_rank(provider_name):
+    return PROVIDER_RANK.get(provider_name, DEFAULT_PROVIDER_RANK)
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})').fetchall()]
+
+
+def migrate(conn):
+    """
+    Move every model into the unified `models` table
+
+    Runs inside the caller's transaction (schema_migrations.py applies it as
+    the first version of models.db). LLM rows keep their ids, so links to
+    /admin/models/<id> stay valid; other types get new ids. Rows of the old
+    single-table `models` schema come in as LLMs unless a typed table already
+    had that model_name. The per-type tables are dropped.
+
+    Returns:
+        dict: rows moved per source table; empty if `models` already was the unified table
+    """
+    if 'model_type' in _columns(conn, 'models'):
+        return {}
+
+    moved = {}
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if 'models' in tables:
+        conn.execute(f'ALTER TABLE models RENAME TO {LEGACY_TABLE_BACKUP}')
+    for statement in SCHEMA.split(';'):
+        if statement.strip():
+            conn.execute(statement)
+
+    for model_type, table in MODEL_TYPE_TABLES:
+        if table not in tables:
+            continue
+        columns = ', '.join(COPIED_COLUMNS)
+        id_column = 'id, ' if model_type == 'llm' else ''
+        moved[table] = conn.execute(
+            f'''INSERT INTO models ({id_column}model_type, {columns})
+                SELECT {id_column}?, {columns} FROM {table} ORDER BY id''',
+            (model_type,)
+        ).rowcount
+
+    if 'models' in tables:
+        legacy_columns = set(_columns(conn, LEGACY_TABLE_BACKUP))
+        columns = [column for column in COPIED_COLUMNS if column in legacy_columns]
+        moved['models'] = conn.execute(
+            f'''INSERT INTO models (model_type, {', '.join(columns)})
+                SELECT 'llm', {', '.join(columns)} FROM {LEGACY_TABLE_BACKUP} AS legacy
+                WHERE NOT EXISTS (SELECT 1 FROM models WHERE models.model_name = legacy.model_name)
+                ORDER BY id'''
+        ).rowcount
+
+    conn.executemany(
+        'UPDATE models SET provider_rank = ? WHERE provider_name = ?',
+        [(rank, provider_name) for provider_name, rank in PROVIDER_RANK.items()]
+    )
+
+    for _, table in MODEL_TYPE_TABLES:
+        if table in tables:
+            conn.execute(f'DROP TABLE {table}')
+    if 'models' in tables:
+        conn.execute(f'DROP TABLE {LEGACY_TABLE_BACKUP}')
+    return moved
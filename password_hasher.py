@@ -0,0 +1,109 @@
+# password_hasher.py - Password hashing off the request threads
+
+import os
+import logging
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from process_pool import BoundedProcessPool
+
+logger = logging.getLogger(__name__)
+
+# Full werkzeug method string, iterations included, so needs_rehash() can compare it
+# against stored hashes. Pick the iteration count with test/bench_password_hash.py.
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000")
+# Worker processes; 0 hashes inline on the calling thread
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+# Hashes allowed to wait for a worker before new ones are turned away
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "16"))
+# How long a request waits for a queue slot, then for its result
+PASSWORD_HASH_ADMIT_SECONDS = float(os.getenv("PASSWORD_HASH_ADMIT_SECONDS", "0.5"))
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full or a hash took too long"""
+
+
+class PasswordHasher:
+    """
+    Bounded process pool for password hashing and verification.
+
+    pbkdf2 is deliberately CPU-heavy; run inline it holds the GIL and a
+    request thread for its whole duration, so a burst of logins slows every
+    other request in the worker. Here it runs in a BoundedProcessPool, and
+    a hash that can't get a slot within admit_seconds fails fast with
+    HasherBusy instead of piling up behind the pool.
+    """
+
+    def __init__(self, method=PASSWORD_HASH_METHOD, workers=PASSWORD_HASH_WORKERS,
+                 queue_size=PASSWORD_HASH_QUEUE, admit_seconds=PASSWORD_HASH_ADMIT_SECONDS,
+                 timeout=PASSWORD_HASH_TIMEOUT):
+        self.method = method
+        self.admit_seconds = admit_seconds
+        self.timeout = timeout
+        self._pool = BoundedProcessPool(workers, queue_size, counters=('hashed', 'verified', 'timed_out'))
+
+    @property
+    def workers(self):
+        return self._pool.workers
+
+    def _submit(self, fn, *args):
+        """Admit one call into the pool, or raise HasherBusy"""
+        future = self._pool.submit(fn, *args, admit_seconds=self.admit_seconds)
+        if future is None:
+            raise HasherBusy('Password hashing queue is full')
+        return future
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        future = self._submit(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self._pool.count('timed_out')
+            raise HasherBusy('Password hashing timed out')
+
+    def hash(self, password):
+        """Hash a new password with the configured method"""
+        hashed = self._run(generate_password_hash, password, self.method)
+        self._pool.count('hashed')
+        return hashed
+
+    def hash_async(self, password):
+        """
+        Future for a hash, for work nobody waits on (like upgrading an old hash)
+
+        Hashes inline, returning a finished Future, when there are no workers
+        or the pool is full, so the work is never silently dropped.
+        """
+        future = self._pool.submit(generate_password_hash, password, self.method)
+        if future is None:
+            future = Future()
+            try:
+                future.set_result(generate_password_hash(password, self.method))
+            except Exception as e:
+                future.set_exception(e)
+        self._pool.count('hashed')
+        return future
+
+    def verify(self, hashed_password, password):
+        """True if the password matches the stored hash"""
+        matches = self._run(check_password_hash, hashed_password, password)
+        self._pool.count('verified')
+        return matches
+
+    def needs_rehash(self, hashed_password):
+        """True if a stored hash was made with a different method or work factor"""
+        return hashed_password.split('$', 1)[0] != self.method
+
+    def stats(self):
+        return dict(self._pool.stats(), method=self.method)
+
+    def close(self):
+        self._pool.close()
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,103 @@
+# process_pool.py - Bounded process pool for CPU-heavy work kept off the request threads
+
+import os
+import time
+import atexit
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedProcessPool:
+    """
+    ProcessPoolExecutor that admits at most workers + queue_size calls at once.
+
+    CPU-heavy work run inline holds the GIL and a request thread for its
+    whole duration, slowing every other request in the worker. Here it runs
+    in separate processes, and a call beyond the admission limit is turned
+    away (submit() returns None) instead of piling up behind the pool.
+
+    The executor is started on first use, and again in a forked child, so a
+    pool built before gunicorn forks never shares worker processes between
+    workers. stats() reports admission counters plus any named in counters,
+    which the owner bumps with count().
+    """
+
+    def __init__(self, workers, queue_size, counters=()):
+        self.workers = workers
+        self.queue_size = queue_size
+
+        self._slots = threading.BoundedSemaphore(workers + queue_size) if workers else None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(counters, 0)
+        self._stats.update({'rejected': 0, 'in_flight': 0, 'completed': 0, 'total_seconds': 0.0})
+        atexit.register(self.close)
+
+    @property
+    def enabled(self):
+        return bool(self.workers)
+
+    def _get_executor(self):
+        """The process pool, started on first use and again in a forked child"""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def count(self, counter, amount=1):
+        with self._lock:
+            self._stats[counter] += amount
+
+    def submit(self, fn, *args, admit_seconds=0):
+        """
+        Run fn(*args) in a worker process
+
+        Waits up to admit_seconds for a free slot. Returns the Future, or None
+        if the pool is full (or has no workers).
+        """
+        if not self.workers:
+            return None
+        if not (self._slots.acquire(timeout=admit_seconds) if admit_seconds else self._slots.acquire(blocking=False)):
+            self.count('rejected')
+            return None
+
+        started = time.monotonic()
+        self.count('in_flight')
+
+        def done(_future):
+            self._slots.release()
+            with self._lock:
+                self._stats['in_flight'] -= 1
+                self._stats['completed'] += 1
+                self._stats['total_seconds'] += time.monotonic() - started
+
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            self.count('in_flight', -1)
+            raise
+        future.add_done_callback(done)
+        return future
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        total_seconds = stats.pop('total_seconds')
+        stats.update({
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'avg_ms': round(total_seconds / stats['completed'] * 1000, 1) if stats['completed'] else None
+        })
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
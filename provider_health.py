@@ -0,0 +1,267 @@
+# provider_health.py - Rolling health stats and circuit breakers per provider client
+
+import os
+import time
+import asyncio
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Outcomes older than this drop out of the error/timeout rates and percentiles
+HEALTH_WINDOW_SECONDS = float(os.getenv("HEALTH_WINDOW_SECONDS", "120"))
+# A circuit opens when, over the window, at least HEALTH_MIN_CALLS calls were made and
+# HEALTH_FAILURE_RATE of them failed or timed out, or after HEALTH_CONSECUTIVE_FAILURES in a row
+HEALTH_MIN_CALLS = int(os.getenv("HEALTH_MIN_CALLS", "10"))
+HEALTH_FAILURE_RATE = float(os.getenv("HEALTH_FAILURE_RATE", "0.5"))
+HEALTH_CONSECUTIVE_FAILURES = int(os.getenv("HEALTH_CONSECUTIVE_FAILURES", "5"))
+# An open circuit is probed after this long, doubling after each failed probe up to the max
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_MAX_OPEN_SECONDS = float(os.getenv("CIRCUIT_MAX_OPEN_SECONDS", "600"))
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "5"))
+# A provider call that takes longer than this counts as a timeout
+PROVIDER_TIMEOUT = float(os.getenv("PROVIDER_TIMEOUT", "120"))
+HEALTH_MAX_SAMPLES = 1000
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class ProviderUnavailable(Exception):
+    """Raised instead of calling a provider whose circuit is open"""
+
+    def __init__(self, provider_key, retry_in):
+        super().__init__(f"'{provider_key}' is failing; not sending requests for another {retry_in:.0f}s")
+        self.provider_key = provider_key
+
+
+def classify_error(error):
+    """
+    'timeout', 'error', or None for errors that say nothing about the provider's
+    health: 4xx responses (bad request, auth, rate limits) and our own limits
+    """
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)) or 'Timeout' in type(error).__name__:
+        return 'timeout'
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None:
+        status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    if isinstance(status_code, int) and status_code < 500:
+        return None
+    if type(error).__name__ in ('ProviderBusy', 'ProviderUnavailable', 'ValueError'):
+        return None
+    return 'error'
+
+
+class _Circuit:
+    def __init__(self):
+        self.outcomes = deque(maxlen=HEALTH_MAX_SAMPLES)  # (monotonic time, 'ok'|'error'|'timeout', seconds)
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.open_seconds = CIRCUIT_OPEN_SECONDS
+        self.last_error = None
+        self.times_opened = 0
+        self.trial_started = None  # When the one request let through while half-open went out
+
+
+class ProviderHealth:
+    """
+    Error rate, timeout rate and latency percentiles per provider key over a
+    rolling window, with a circuit breaker on top.
+
+    When a provider fails too often its circuit opens: check() raises
+    ProviderUnavailable at once instead of letting requests hang, and
+    is_available() drops its models from what the UI offers. A background
+    thread probes open circuits with `probe(provider_key)` (a cheap call like
+    listing models) after a back-off, and closes them once a probe succeeds.
+
+    Without a probe, a circuit goes half-open after the back-off instead:
+    check() lets one real request through, and its outcome closes the
+    circuit or opens it again with a longer back-off.
+    """
+
+    def __init__(self, probe=None, name='providers'):
+        self.probe = probe
+        self.name = name
+        self._circuits = {}
+        self._lock = threading.Lock()
+        self._prober = None
+
+    def _circuit(self, provider_key):
+        circuit = self._circuits.get(provider_key)
+        if circuit is None:
+            circuit = self._circuits[provider_key] = _Circuit()
+        return circuit
+
+    # --- Recording ---
+
+    def record_success(self, provider_key, seconds):
+        with self._lock:
+            circuit = self._circuit(provider_key)
+            if circuit.state == HALF_OPEN:
+                self._close_locked(circuit, seconds)
+                logger.info(f"Circuit for '{provider_key}' closed after a successful trial request")
+                return
+            circuit.outcomes.append((time.monotonic(), 'ok', seconds))
+            circuit.consecutive_failures = 0
+
+    def record_failure(self, provider_key, error):
+        """Count a failed call; errors that aren't the provider's fault are ignored"""
+        outcome = classify_error(error)
+        if outcome is None:
+            with self._lock:
+                circuit = self._circuits.get(provider_key)
+                if circuit is not None and circuit.state == HALF_OPEN:
+                    # The trial told us nothing about the provider; let another one through
+                    circuit.trial_started = None
+            return
+        with self._lock:
+            circuit = self._circuit(provider_key)
+            now = time.monotonic()
+            circuit.outcomes.append((now, outcome, None))
+            circuit.consecutive_failures += 1
+            circuit.last_error = str(error)[:200]
+            if circuit.state == HALF_OPEN:
+                self._reopen_locked(circuit)
+                logger.warning(f"Trial request to '{provider_key}' failed, next in {circuit.open_seconds:.0f}s: {circuit.last_error}")
+            elif circuit.state == CLOSED and self._should_open(circuit, now):
+                circuit.state = OPEN
+                circuit.opened_at = now
+                circuit.open_seconds = CIRCUIT_OPEN_SECONDS
+                circuit.times_opened += 1
+                logger.warning(f"Circuit for '{provider_key}' opened after {circuit.last_error}")
+                self._start_prober()
+
+    def _should_open(self, circuit, now):
+        if circuit.consecutive_failures >= HEALTH_CONSECUTIVE_FAILURES:
+            return True
+        recent = [outcome for at, outcome, _ in circuit.outcomes if now - at <= HEALTH_WINDOW_SECONDS]
+        if len(recent) < HEALTH_MIN_CALLS:
+            return False
+        failures = sum(1 for outcome in recent if outcome != 'ok')
+        return failures / len(recent) >= HEALTH_FAILURE_RATE
+
+    # --- Gating ---
+
+    def check(self, provider_key):
+        """Raise ProviderUnavailable if the provider's circuit is open, or half-open with its trial request out"""
+        with self._lock:
+            circuit = self._circuits.get(provider_key)
+            if circuit is None or circuit.state == CLOSED:
+                return
+            now = time.monotonic()
+            if circuit.state == HALF_OPEN:
+                # A trial that never reported back (e.g. its caller went away) is given up after PROVIDER_TIMEOUT
+                if circuit.trial_started is None or now - circuit.trial_started > PROVIDER_TIMEOUT:
+                    circuit.trial_started = now
+                    return
+                retry_in = circuit.trial_started + PROVIDER_TIMEOUT - now
+            else:
+                retry_in = circuit.opened_at + circuit.open_seconds - now
+        raise ProviderUnavailable(provider_key, max(0.0, retry_in))
+
+    def is_available(self, provider_key):
+        circuit = self._circuits.get(provider_key)
+        return circuit is None or circuit.state != OPEN
+
+    # --- Recovery ---
+
+    def _start_prober(self):
+        """Start the probe thread if it isn't running; called with the lock held"""
+        if self._prober is None or not self._prober.is_alive():
+            self._prober = threading.Thread(target=self._probe_loop, name=f'{self.name}-health-probe', daemon=True)
+            self._prober.start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(HEALTH_PROBE_INTERVAL)
+            now = time.monotonic()
+            with self._lock:
+                due = [
+                    provider_key for provider_key, circuit in self._circuits.items()
+                    if circuit.state == OPEN and now - circuit.opened_at >= circuit.open_seconds
+                ]
+                if not any(circuit.state == OPEN for circuit in self._circuits.values()):
+                    self._prober = None
+                    return
+            for provider_key in due:
+                if self.probe:
+                    self._probe(provider_key)
+                else:
+                    self._half_open(provider_key)
+
+    def _close_locked(self, circuit, seconds):
+        circuit.state = CLOSED
+        circuit.consecutive_failures = 0
+        circuit.trial_started = None
+        # Start the window afresh so old failures don't re-open it at once
+        circuit.outcomes.clear()
+        circuit.outcomes.append((time.monotonic(), 'ok', seconds))
+
+    def _reopen_locked(self, circuit):
+        """Back to open after a failed probe or trial, backing off twice as long"""
+        circuit.state = OPEN
+        circuit.opened_at = time.monotonic()
+        circuit.open_seconds = min(circuit.open_seconds * 2, CIRCUIT_MAX_OPEN_SECONDS)
+        circuit.trial_started = None
+        self._start_prober()
+
+    def _half_open(self, provider_key):
+        with self._lock:
+            circuit = self._circuit(provider_key)
+            if circuit.state != OPEN:
+                return
+            circuit.state = HALF_OPEN
+            circuit.trial_started = None
+        logger.info(f"Circuit for '{provider_key}' half-open; letting one request through")
+
+    def _probe(self, provider_key):
+        started = time.monotonic()
+        try:
+            self.probe(provider_key)
+        except Exception as e:
+            with self._lock:
+                circuit = self._circuit(provider_key)
+                circuit.last_error = str(e)[:200]
+                self._reopen_locked(circuit)
+                message = f"Probe of '{provider_key}' failed, next in {circuit.open_seconds:.0f}s: {e}"
+            logger.info(message)
+            return
+
+        with self._lock:
+            self._close_locked(self._circuit(provider_key), time.monotonic() - started)
+        logger.info(f"Circuit for '{provider_key}' closed after a successful probe")
+
+    # --- Reporting ---
+
+    def stats(self):
+        """Per-provider circuit state, error/timeout rates and latency percentiles over the window"""
+        now = time.monotonic()
+        report = {}
+        with self._lock:
+            for provider_key, circuit in self._circuits.items():
+                recent = [(outcome, seconds) for at, outcome, seconds in circuit.outcomes if now - at <= HEALTH_WINDOW_SECONDS]
+                latencies = sorted(seconds for outcome, seconds in recent if outcome == 'ok')
+                calls = len(recent)
+
+                def percentile(percent):
+                    if not latencies:
+                        return None
+                    return round(latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))] * 1000)
+
+                report[provider_key] = {
+                    'state': circuit.state,
+                    'calls': calls,
+                    'error_rate': round(sum(1 for outcome, _ in recent if outcome == 'error') / calls, 3) if calls else None,
+                    'timeout_rate': round(sum(1 for outcome, _ in recent if outcome == 'timeout') / calls, 3) if calls else None,
+                    'p50_ms': percentile(50),
+                    'p95_ms': percentile(95),
+                    'p99_ms': percentile(99),
+                    'consecutive_failures': circuit.consecutive_failures,
+                    'times_opened': circuit.times_opened,
+                    'retry_in_seconds': round(max(0.0, circuit.opened_at + circuit.open_seconds - now), 1) if circuit.state != CLOSED else None,
+                    'last_error': circuit.last_error
+                }
+        return report
@@ -0,0 +1,237 @@
+# provider_scheduler.py - Per-provider rate limiting and request scheduling
+
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Defaults for every provider key; override one provider with e.g. PROVIDER_RPS_OPENAI
+PROVIDER_RPS = float(os.getenv("PROVIDER_RPS", "5"))
+PROVIDER_BURST = int(os.getenv("PROVIDER_BURST", "10"))
+PROVIDER_MAX_IN_FLIGHT = int(os.getenv("PROVIDER_MAX_IN_FLIGHT", "16"))
+# How long a request may wait for a slot before it's turned away
+SCHEDULER_QUEUE_TIMEOUT = float(os.getenv("SCHEDULER_QUEUE_TIMEOUT", "30"))
+# Pause after a 429 that came without a Retry-After header
+RATE_LIMIT_BACKOFF = float(os.getenv("RATE_LIMIT_BACKOFF", "2"))
+# Retry-After values past this are treated as "not within this request"
+RATE_LIMIT_MAX_BACKOFF = 300
+
+# Lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+
+class ProviderBusy(Exception):
+    """Raised when a request can't get a provider slot before its deadline"""
+
+    def __init__(self, provider_key, message=None):
+        super().__init__(message or f"No capacity for '{provider_key}' before the deadline")
+        self.provider_key = provider_key
+
+
+def retry_after_seconds(error):
+    """
+    Seconds to back off after a provider error, or None if it wasn't rate limiting
+
+    Reads the status code and Retry-After / retry-after-ms headers off the
+    OpenAI/Anthropic SDK exception rather than matching on the message text.
+    """
+    status_code = getattr(error, 'status_code', None)
+    response = getattr(error, 'response', None)
+    if status_code is None and response is not None:
+        status_code = getattr(response, 'status_code', None)
+    if status_code not in (429, 503):
+        return None
+
+    headers = getattr(response, 'headers', None) or {}
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return RATE_LIMIT_BACKOFF if status_code == 429 else None
+
+
+class _ProviderState:
+    def __init__(self, rps, burst, max_in_flight):
+        self.rps = rps
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.waiters = []  # heap of (priority, seq, future)
+        self.timer = None
+        self.stats = {'admitted': 0, 'queued': 0, 'timed_out': 0, 'rate_limited': 0, 'total_wait_seconds': 0.0}
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rps)
+        self.refilled_at = now
+
+
+class ProviderScheduler:
+    """
+    Token bucket plus max in-flight limit per provider key, with a priority queue in front.
+
+    Requests over a provider's limits wait in a queue ordered by priority
+    (interactive chat ahead of bulk work like broadcasts and summaries),
+    then arrival, until a slot frees up or their deadline passes. A 429 or
+    Retry-After from the provider pauses that provider's queue for the time
+    it asked for, so the next requests aren't sent just to be rejected.
+
+    Everything runs on the dispatcher's event loop; it is not thread-safe.
+    """
+
+    def __init__(self, rps=PROVIDER_RPS, burst=PROVIDER_BURST, max_in_flight=PROVIDER_MAX_IN_FLIGHT,
+                 queue_timeout=SCHEDULER_QUEUE_TIMEOUT):
+        self.rps = rps
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self._providers = {}
+        self._seq = itertools.count()
+
+    def _state(self, provider_key):
+        state = self._providers.get(provider_key)
+        if state is None:
+            suffix = provider_key.upper()
+            state = _ProviderState(
+                float(os.getenv(f"PROVIDER_RPS_{suffix}", self.rps)),
+                int(os.getenv(f"PROVIDER_BURST_{suffix}", self.burst)),
+                int(os.getenv(f"PROVIDER_MAX_IN_FLIGHT_{suffix}", self.max_in_flight))
+            )
+            self._providers[provider_key] = state
+        return state
+
+    def _blocked_for(self, state, now):
+        """0 if a request can start now, else seconds until one might (None: wait for a release)"""
+        if now < state.cooldown_until:
+            return state.cooldown_until - now
+        if state.in_flight >= state.max_in_flight:
+            return None
+        state.refill(now)
+        if state.tokens < 1:
+            return (1 - state.tokens) / state.rps
+        return 0
+
+    def _admit(self, state):
+        state.tokens -= 1
+        state.in_flight += 1
+        state.stats['admitted'] += 1
+
+    def _dispatch(self, provider_key):
+        """Hand freed capacity to the queued requests, best priority first"""
+        state = self._providers[provider_key]
+        state.timer = None
+        while state.waiters:
+            priority, seq, future = state.waiters[0]
+            if future.done():
+                heapq.heappop(state.waiters)
+                continue
+            wait = self._blocked_for(state, time.monotonic())
+            if wait is None:
+                return  # release() dispatches again
+            if wait > 0:
+                state.timer = asyncio.get_running_loop().call_later(wait, self._dispatch, provider_key)
+                return
+            heapq.heappop(state.waiters)
+            self._admit(state)
+            future.set_result(True)
+
+    async def acquire(self, provider_key, priority=PRIORITY_INTERACTIVE, deadline=None):
+        """
+        Wait for a slot on a provider; pair with release()
+
+        Args:
+            provider_key: 'openai', 'anthropic', 'together', ...
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BULK
+            deadline: time.monotonic() by which the slot must be granted; defaults to queue_timeout from now
+
+        Raises:
+            ProviderBusy: no slot was free before the deadline
+        """
+        state = self._state(provider_key)
+        started = time.monotonic()
+        if not state.waiters and self._blocked_for(state, started) == 0:
+            self._admit(state)
+            return
+
+        if deadline is None:
+            deadline = started + self.queue_timeout
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(state.waiters, (priority, next(self._seq), future))
+        state.stats['queued'] += 1
+        if state.timer is None:
+            self._dispatch(provider_key)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Granted just as the deadline passed; use it
+                return
+            future.cancel()
+            state.stats['timed_out'] += 1
+            raise ProviderBusy(provider_key)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(provider_key)
+            else:
+                future.cancel()
+            raise
+        finally:
+            state.stats['total_wait_seconds'] += time.monotonic() - started
+
+    def release(self, provider_key):
+        """Give back a slot taken by acquire()"""
+        state = self._providers[provider_key]
+        state.in_flight = max(0, state.in_flight - 1)
+        if state.waiters and state.timer is None:
+            self._dispatch(provider_key)
+
+    def backoff(self, provider_key, seconds):
+        """Pause new requests to a provider, e.g. for a Retry-After it sent"""
+        state = self._state(provider_key)
+        state.cooldown_until = max(state.cooldown_until, time.monotonic() + seconds)
+        state.stats['rate_limited'] += 1
+        logger.warning(f"Rate limited by '{provider_key}', pausing it for {seconds:.1f}s")
+
+    def stats(self):
+        """Per-provider limits, queue depth and wait times"""
+        now = time.monotonic()
+        report = {}
+        for provider_key, state in list(self._providers.items()):
+            stats = dict(state.stats)
+            waited = stats['admitted'] + stats['timed_out']
+            report[provider_key] = {
+                'rps': state.rps,
+                'burst': state.burst,
+                'max_in_flight': state.max_in_flight,
+                'in_flight': state.in_flight,
+                'queued_now': sum(1 for _, _, future in state.waiters if not future.done()),
+                'cooling_down_seconds': round(max(0.0, state.cooldown_until - now), 1),
+                'admitted': stats['admitted'],
+                'queued': stats['queued'],
+                'timed_out': stats['timed_out'],
+                'rate_limited': stats['rate_limited'],
+                'avg_wait_ms': round(stats['total_wait_seconds'] / waited * 1000, 1) if waited else None
+            }
+        return report
@@ -0,0 +1,105 @@
+# provider_sdks.py - Provider SDKs imported and clients built on first use
+
+import os
+import importlib
+import importlib.util
+import threading
+import logging
+from collections.abc import MutableMapping
+
+logger = logging.getLogger(__name__)
+
+# Modules too slow to import at startup; test/bench_startup.py fails if importing app pulls any of them in
+LAZY_MODULES = ('openai', 'anthropic', 'google.generativeai', 'httpx', 'PIL', 'flask_dance')
+
+# SDK module -> API key variables; the SDK is used when any of them is set
+SDK_API_KEYS = {
+    'openai': ('OPENAI_API_KEY', 'DEEPSEEK_API_KEY', 'TOGETHER_API_KEY'),
+    'anthropic': ('ANTHROPIC_API_KEY',),
+    'google.generativeai': ('GOOGLE_API_KEY',),
+    'httpx': ('OPENAI_API_KEY', 'TOGETHER_API_KEY'),
+}
+
+
+def sdk_available(module_name):
+    """Whether a module is installed, without importing it"""
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        # A missing parent package (google for google.generativeai) raises instead of returning None
+        return False
+
+
+def import_sdk(module_name):
+    """Import a provider SDK; cheap after the first call since Python caches modules"""
+    return importlib.import_module(module_name)
+
+
+def preload_sdks():
+    """
+    Import the SDKs of configured providers now, e.g. in a server's master
+    process so forked workers share the imported modules instead of each
+    importing them on first use
+    """
+    for module_name, api_key_vars in SDK_API_KEYS.items():
+        if any(os.getenv(var) for var in api_key_vars) and sdk_available(module_name):
+            try:
+                import_sdk(module_name)
+            except Exception as e:
+                logger.warning(f"Couldn't preload {module_name}: {e}")
+
+
+class LazyClients(MutableMapping):
+    """
+    provider_key -> API client, where each client is built (and its SDK
+    imported) the first time it is looked up.
+
+    `provider_key in clients` only checks what was registered, so availability
+    checks stay free; a worker that never talks to a provider never imports
+    its SDK. Assigning a client directly replaces its factory.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def register(self, provider_key, factory):
+        """factory() returns the client; called at most once, on first use"""
+        self._factories[provider_key] = factory
+
+    def __getitem__(self, provider_key):
+        client = self._clients.get(provider_key)
+        if client is not None:
+            return client
+        if provider_key not in self._factories:
+            raise KeyError(provider_key)
+        with self._lock:
+            client = self._clients.get(provider_key)
+            if client is None:
+                client = self._factories[provider_key]()
+                self._clients[provider_key] = client
+        return client
+
+    def __setitem__(self, provider_key, client):
+        self._factories.pop(provider_key, None)
+        self._clients[provider_key] = client
+
+    def __delitem__(self, provider_key):
+        if provider_key not in self:
+            raise KeyError(provider_key)
+        self._factories.pop(provider_key, None)
+        self._clients.pop(provider_key, None)
+
+    def __contains__(self, provider_key):
+        return provider_key in self._factories or provider_key in self._clients
+
+    def __iter__(self):
+        return iter(list(self._factories) + [key for key in self._clients if key not in self._factories])
+
+    def __len__(self):
+        return len(set(self._factories) | set(self._clients))
+
+    def built(self):
+        """Provider keys whose clients exist so far"""
+        return list(self._clients)
@@ -0,0 +1,266 @@
+# response_cache.py - Two-tier cache for model responses
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+from database.lib.database_manager import get_connection
+from schema_migrations import migrate
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 3600)))
+RESPONSE_CACHE_MEMORY_ENTRIES = int(os.getenv("RESPONSE_CACHE_MEMORY_ENTRIES", "1024"))
+RESPONSE_CACHE_DISK_ENTRIES = int(os.getenv("RESPONSE_CACHE_DISK_ENTRIES", "50000"))
+# Comma-separated model names that are never cached
+RESPONSE_CACHE_OPT_OUT = os.getenv("RESPONSE_CACHE_OPT_OUT", "")
+# Comma-separated model types that are never cached; generated images and videos are
+# meant to differ each time, so replaying the first one for the same prompt is wrong by default
+RESPONSE_CACHE_OPT_OUT_TYPES = os.getenv("RESPONSE_CACHE_OPT_OUT_TYPES", "image,video")
+
+# Disk trimming runs every this many writes rather than on every one
+TRIM_EVERY = 100
+# Disk hits are remembered in memory and their last_used written this many at a time
+TOUCH_BATCH = 100
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_prompt(text):
+    """Collapse runs of whitespace so trivially different re-sends share a key"""
+    return _WHITESPACE.sub(' ', text or '').strip()
+
+
+def make_key(kind, model_name, prompt, **params):
+    """
+    Cache key for a request
+
+    Args:
+        kind: 'chat', 'image', ... so different kinds of output never collide
+        model_name: The resolved database model name
+        prompt: A string, or a list of {'role', 'content'} chat messages
+        **params: Generation parameters that change the output (max_tokens, temperature, size, ...)
+    """
+    if isinstance(prompt, str):
+        prompt = normalize_prompt(prompt)
+    else:
+        prompt = [{'role': m['role'], 'content': normalize_prompt(m['content'])} for m in prompt]
+    payload = json.dumps([kind, model_name, prompt, params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU memory tier in front of a SQLite tier, both with a TTL.
+
+    The memory tier holds the hottest entries for this process; the SQLite
+    tier survives restarts and is shared by every worker. Entries expire
+    after their TTL and each tier is trimmed to a maximum size, least
+    recently used first. Values are anything JSON-serializable.
+
+    A disk hit doesn't write: its last_used is kept in memory and written in
+    batches, so reading the cache never takes SQLite's write lock.
+    """
+
+    def __init__(self, db_path, ttl=RESPONSE_CACHE_TTL, memory_entries=RESPONSE_CACHE_MEMORY_ENTRIES,
+                 disk_entries=RESPONSE_CACHE_DISK_ENTRIES, opt_out=None, opt_out_types=None):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        if opt_out is None:
+            opt_out = [name.strip() for name in RESPONSE_CACHE_OPT_OUT.split(',') if name.strip()]
+        self.opt_out = set(opt_out)
+        if opt_out_types is None:
+            opt_out_types = [name.strip() for name in RESPONSE_CACHE_OPT_OUT_TYPES.split(',') if name.strip()]
+        self.opt_out_types = set(opt_out_types)
+
+        self._memory = OrderedDict()  # cache_key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._touched = {}  # cache_key -> last_used not yet written to disk
+        self._writes = 0
+        self._counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'evictions': 0,
+            'expired': 0
+        }
+
+        # Versioned in schema_migrations.py like the other databases; no backup, since it's only a cache
+        migrate(self.db_path, 'cache', backup=False)
+
+    def is_cacheable(self, model_name, model_type='llm'):
+        return model_type not in self.opt_out_types and model_name not in self.opt_out
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def _remember(self, key, expires_at, value):
+        """Put an entry in the memory tier, evicting the least recently used past the limit"""
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def get(self, key):
+        """Cached value for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    return value
+                del self._memory[key]
+                self._counters['expired'] += 1
+
+        try:
+            conn = get_connection(self.db_path)
+            try:
+                row = conn.execute(
+                    'SELECT value, expires_at FROM response_cache WHERE cache_key = ? AND expires_at > ?',
+                    (key, now)
+                ).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache read failed: {e}")
+            row = None
+
+        if not row:
+            self._count('misses')
+            return None
+
+        value = json.loads(row[0])
+        self._remember(key, row[1], value)
+        with self._lock:
+            self._counters['disk_hits'] += 1
+            self._touched[key] = now
+            flush = len(self._touched) >= TOUCH_BATCH
+        if flush:
+            self.flush_touched()
+        return value
+
+    def flush_touched(self):
+        """Write the last_used of recent disk hits, in one transaction"""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if not touched:
+            return
+        try:
+            conn = get_connection(self.db_path)
+            try:
+                with conn:
+                    conn.executemany(
+                        'UPDATE response_cache SET last_used = MAX(last_used, ?) WHERE cache_key = ?',
+                        [(last_used, key) for key, last_used in touched.items()]
+                    )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            # Only recency is lost; trimming may evict these entries a little early
+            logger.warning(f"Response cache last_used update failed: {e}")
+
+    def put(self, key, model_name, value, ttl=None):
+        """Store a value in both tiers"""
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        self._remember(key, expires_at, value)
+
+        try:
+            conn = get_connection(self.db_path)
+            try:
+                with conn:
+                    conn.execute(
+                        '''INSERT OR REPLACE INTO response_cache
+                           (cache_key, model_name, value, created_at, expires_at, last_used)
+                           VALUES (?, ?, ?, ?, ?, ?)''',
+                        (key, model_name, json.dumps(value), now, expires_at, now)
+                    )
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache write failed: {e}")
+            return
+
+        with self._lock:
+            self._counters['stores'] += 1
+            self._writes += 1
+            trim = self._writes % TRIM_EVERY == 0
+        if trim:
+            self.trim()
+
+    def trim(self):
+        """Drop expired disk entries, then the least recently used ones past the size limit"""
+        self.flush_touched()
+        try:
+            conn = get_connection(self.db_path)
+            try:
+                with conn:
+                    expired = conn.execute('DELETE FROM response_cache WHERE expires_at <= ?', (time.time(),)).rowcount
+                    evicted = conn.execute(
+                        '''DELETE FROM response_cache WHERE cache_key IN (
+                               SELECT cache_key FROM response_cache
+                               ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                           )''',
+                        (self.disk_entries,)
+                    ).rowcount
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache trim failed: {e}")
+            return
+        with self._lock:
+            self._counters['expired'] += expired
+            self._counters['evictions'] += evicted
+
+    def clear(self):
+        """Empty both tiers"""
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+        conn = get_connection(self.db_path)
+        try:
+            with conn:
+                conn.execute('DELETE FROM response_cache')
+        finally:
+            conn.close()
+
+    def stats(self):
+        """Hit/miss counters and tier sizes"""
+        try:
+            conn = get_connection(self.db_path)
+            try:
+                disk_size = conn.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0]
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            disk_size = None
+        with self._lock:
+            counters = dict(self._counters)
+            memory_size = len(self._memory)
+        lookups = counters['memory_hits'] + counters['disk_hits'] + counters['misses']
+        counters.update({
+            'hit_rate': round((counters['memory_hits'] + counters['disk_hits']) / lookups, 3) if lookups else None,
+            'memory_entries': memory_size,
+            'memory_limit': self.memory_entries,
+            'disk_entries': disk_size,
+            'disk_limit': self.disk_entries,
+            'ttl_seconds': self.ttl,
+            'opt_out': sorted(self.opt_out),
+            'opt_out_types': sorted(self.opt_out_types)
+        })
+        return counters
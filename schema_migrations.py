@@ -0,0 +1,453 @@
+# schema_migrations.py - Ordered schema migrations for models.db, user.db, data.db and cache.db, tracked in PRAGMA user_version
+
+import os
+import sys
+import sqlite3
+import logging
+
+from database.lib.database_manager import get_connection
+import model_schema
+
+logger = logging.getLogger(__name__)
+
+# Each database's migrations as (version, description, step), oldest first. A step is
+# SQL or a function taking the connection; it runs in the same transaction that sets
+# PRAGMA user_version, so it is applied exactly once. Never edit a released step:
+# add a new version instead, and bump the `PRAGMA user_version` line of the matching
+# create_*.sql script once that script includes the change.
+#
+# Version 1 of each database is the schema as it was when versioning started.
+# Databases from before then have user_version 0 and may be missing any of the
+# columns that used to be added at startup, so version 1 checks for them, once.
+
+
+# --- models.db ---
+
+MODELS_V1_TABLES = '''
+CREATE TABLE IF NOT EXISTS display_name_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model_type VARCHAR(16) NOT NULL,
+    match_type VARCHAR(16) NOT NULL DEFAULT 'contains',
+    pattern VARCHAR(255) NOT NULL,
+    main_name VARCHAR(255) NOT NULL,
+    sub_name VARCHAR(255) DEFAULT '',
+    priority INT DEFAULT 100,
+    is_active BOOLEAN DEFAULT TRUE
+);
+
+CREATE TABLE IF NOT EXISTS model_equivalents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_name VARCHAR(64) NOT NULL,
+    model_name VARCHAR(255) NOT NULL,
+    priority INT DEFAULT 100,
+    is_active BOOLEAN DEFAULT TRUE
+);
+'''
+
+
+def _models_v1(conn):
+    moved = model_schema.migrate(conn)
+    if moved:
+        logger.info(f"Moved models into the unified models table: {moved}")
+    _execute(conn, MODELS_V1_TABLES)
+
+
+# Tables the model catalog is built from; a change to any of them bumps catalog_version,
+# which every worker's CatalogHolder checks to know its snapshot is stale
+CATALOG_TABLES = ('models', 'display_name_rules', 'model_equivalents')
+
+MODELS_V2_CATALOG_VERSION = '''
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 1);
+''' + ''.join(
+    f'''
+CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_bumps_catalog AFTER {event} ON {table}
+BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+END;
+'''
+    for table in CATALOG_TABLES for event in ('INSERT', 'UPDATE', 'DELETE')
+)
+
+
+# --- user.db ---
+
+USER_V1_TABLES = '''
+CREATE TABLE IF NOT EXISTS user_accounts (
+    user_id TEXT PRIMARY KEY,
+    email TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    hashed_password TEXT NOT NULL,
+    subscription_plan TEXT NOT NULL DEFAULT 'free',
+    token_quota INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    timezone TEXT,
+    google_id VARCHAR(255)
+);
+
+CREATE TABLE IF NOT EXISTS oauth_tokens (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    provider VARCHAR(50) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    token TEXT NOT NULL,
+    user_id VARCHAR(255),
+    FOREIGN KEY (user_id) REFERENCES user_accounts (user_id)
+);
+'''
+
+# Columns google_auth.py used to add to user_accounts on every start
+USER_V1_COLUMNS = (
+    ('user_accounts', 'google_id', 'VARCHAR(255)'),
+    ('user_accounts', 'subscription_plan', "VARCHAR(50) DEFAULT 'free'"),
+)
+
+
+def _user_v1(conn):
+    _execute(conn, USER_V1_TABLES)
+    _add_missing_columns(conn, USER_V1_COLUMNS)
+
+
+# --- data.db ---
+
+# Same tables as database/scripts/create_data_db.sql. user_accounts lives in user.db,
+# so foreign keys are left unenforced on these connections.
+DATA_V1_TABLES = '''
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    chat_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    title TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    system_prompt TEXT,
+    summary TEXT,
+    summary_through TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES user_accounts(user_id)
+);
+
+CREATE TABLE IF NOT EXISTS chat_messages (
+    message_id TEXT PRIMARY KEY,
+    chat_id TEXT NOT NULL,
+    sender_type TEXT NOT NULL CHECK (sender_type IN ('user', 'ai')),
+    message_text TEXT NOT NULL,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    tokens_used INTEGER NOT NULL DEFAULT 0,
+    token_estimate INTEGER,
+    model_used TEXT,
+    FOREIGN KEY (chat_id) REFERENCES chat_sessions(chat_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_messages_chat_time ON chat_messages (chat_id, timestamp);
+
+CREATE TABLE IF NOT EXISTS usage_metrics (
+    usage_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    model_name TEXT NOT NULL,
+    tokens_used INTEGER NOT NULL,
+    status_code TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    FOREIGN KEY (user_id) REFERENCES user_accounts(user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_usage_metrics_user_time ON usage_metrics (user_id, timestamp);
+
+CREATE TABLE IF NOT EXISTS usage_rollup_hourly (
+    user_id TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    hour TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    cached INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    tokens_used INTEGER NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, model_name, hour)
+);
+
+CREATE INDEX IF NOT EXISTS idx_usage_rollup_hourly_hour ON usage_rollup_hourly (hour);
+
+CREATE TABLE IF NOT EXISTS usage_rollup_daily (
+    user_id TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    day TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    cached INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    tokens_used INTEGER NOT NULL DEFAULT 0,
+    cost_usd REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, model_name, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_usage_rollup_daily_day ON usage_rollup_daily (day);
+
+CREATE TABLE IF NOT EXISTS media_jobs (
+    job_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    media_type TEXT NOT NULL CHECK (media_type IN ('image', 'video')),
+    model_name TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    params TEXT,
+    status TEXT NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'polling', 'succeeded', 'failed', 'cancelled')),
+    result TEXT,
+    error TEXT,
+    provider_operation TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES user_accounts(user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_media_jobs_user_created ON media_jobs (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_media_jobs_status ON media_jobs (status);
+
+CREATE TABLE IF NOT EXISTS media_files (
+    id TEXT PRIMARY KEY,
+    session_id TEXT,
+    filename TEXT,
+    file_type TEXT CHECK (file_type IN ('image', 'video')),
+    file_url TEXT,
+    mime_type TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS media_variants (
+    file_id TEXT NOT NULL,
+    size TEXT NOT NULL CHECK (size IN ('full', 'thumb')),
+    mime_type TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    PRIMARY KEY (file_id, size, mime_type),
+    FOREIGN KEY (file_id) REFERENCES media_files(id)
+);
+
+CREATE TABLE IF NOT EXISTS model_capabilities (
+    model_id TEXT PRIMARY KEY,
+    provider_name TEXT NOT NULL,
+    model_name TEXT NOT NULL,
+    supports_images BOOLEAN NOT NULL DEFAULT 0,
+    supports_pdfs BOOLEAN NOT NULL DEFAULT 0,
+    multimodal_input BOOLEAN NOT NULL DEFAULT 0,
+    reasoning_enabled BOOLEAN NOT NULL DEFAULT 0,
+    max_token_limit INTEGER NOT NULL,
+    usd_per_1k_tokens FLOAT NOT NULL,
+    is_active BOOLEAN NOT NULL DEFAULT 1
+);
+'''
+
+# Columns conversation_store.py and usage_meter.py used to add on every start
+DATA_V1_COLUMNS = (
+    ('chat_messages', 'token_estimate', 'INTEGER'),
+    ('chat_sessions', 'summary', 'TEXT'),
+    ('chat_sessions', 'summary_through', 'TIMESTAMP'),
+    ('usage_metrics', 'input_tokens', 'INTEGER NOT NULL DEFAULT 0'),
+    ('usage_metrics', 'output_tokens', 'INTEGER NOT NULL DEFAULT 0'),
+    ('usage_metrics', 'cost_usd', 'REAL NOT NULL DEFAULT 0'),
+)
+
+
+def _data_v1(conn):
+    _execute(conn, DATA_V1_TABLES)
+    _add_missing_columns(conn, DATA_V1_COLUMNS)
+
+
+# Files stored before this have had whatever variants they're going to get
+DATA_V2_VARIANTS_DONE = '''
+ALTER TABLE media_files ADD COLUMN variants_done BOOLEAN NOT NULL DEFAULT 0;
+
+UPDATE media_files SET variants_done = 1;
+'''
+
+# Files are shared by everyone who generated the same bytes; owners of files stored
+# before this are taken from the finished jobs whose results link to them
+DATA_V3_MEDIA_FILE_OWNERS = '''
+CREATE TABLE IF NOT EXISTS media_file_owners (
+    file_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (file_id, user_id)
+);
+
+INSERT OR IGNORE INTO media_file_owners (file_id, user_id)
+SELECT media_files.id, media_jobs.user_id
+FROM media_files JOIN media_jobs
+    ON media_jobs.status = 'succeeded' AND instr(media_jobs.result, '/media/files/' || media_files.id) > 0;
+'''
+
+
+# --- cache.db ---
+
+# The response cache is disposable, but versioned like the rest so a schema change to it is a migration too
+CACHE_V1_TABLES = '''
+CREATE TABLE IF NOT EXISTS response_cache (
+    cache_key TEXT PRIMARY KEY,
+    model_name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_response_cache_last_used ON response_cache (last_used);
+'''
+
+
+MIGRATIONS = {
+    'models': (
+        (1, 'Unified models table, display-name rules and model equivalents', _models_v1),
+        (2, 'Catalog version bumped by every change to the catalog tables', MODELS_V2_CATALOG_VERSION),
+    ),
+    'user': (
+        (1, 'User accounts with Google sign-in, and OAuth tokens', _user_v1),
+    ),
+    'data': (
+        (1, 'Chat history, usage metering and rollups, media jobs and files', _data_v1),
+        (2, 'Whether a stored file is done getting variants', DATA_V2_VARIANTS_DONE),
+        (3, 'Users each stored file was generated for', DATA_V3_MEDIA_FILE_OWNERS),
+    ),
+    'cache': (
+        (1, 'Cached provider responses', CACHE_V1_TABLES),
+    ),
+}
+
+
+def _execute(conn, sql):
+    """Run each statement of a script on conn, inside its open transaction (executescript would commit it)"""
+    statement = ''
+    for part in sql.split(';'):
+        statement += part + ';'
+        # A trigger body has semicolons of its own; wait for its END
+        if sqlite3.complete_statement(statement):
+            if statement.strip(' \n;'):
+                conn.execute(statement)
+            statement = ''
+
+
+def _add_missing_columns(conn, columns):
+    for table, column, column_type in columns:
+        existing = [row[1] for row in conn.execute(f'PRAGMA table_info({table})').fetchall()]
+        if column not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+
+
+def _user_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def latest_version(database):
+    return MIGRATIONS[database][-1][0]
+
+
+def _backup(conn, db_path, version):
+    """Copy a database that has tables to <db_path>.v<version>.bak; None if it was empty"""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' LIMIT 1").fetchone():
+        return None
+    backup_path = f'{db_path}.v{version}.bak'
+    backup_conn = sqlite3.connect(backup_path)
+    try:
+        conn.backup(backup_conn)
+    finally:
+        backup_conn.close()
+    logger.info(f"Backed up '{db_path}' to '{backup_path}'")
+    return backup_path
+
+
+def migrate(db_path, database, backup=True):
+    """
+    Bring one database up to the latest version of its schema
+
+    Each pending migration runs in its own BEGIN IMMEDIATE transaction together
+    with the user_version bump, so a failed one leaves the database at the
+    previous version, and workers starting at the same time apply it once:
+    whoever gets the write lock second sees the new version and skips it.
+    With backup, a database that has tables is first copied to
+    <db_path>.v<version>.bak.
+
+    Args:
+        db_path: The SQLite file; created if it doesn't exist
+        database: 'models', 'user', 'data' or 'cache'
+
+    Returns:
+        list: versions applied by this call, oldest first
+    """
+    migrations = MIGRATIONS[database]
+    applied = []
+    conn = get_connection(db_path)
+    try:
+        version = _user_version(conn)
+        if version >= migrations[-1][0]:
+            return applied
+        if backup:
+            _backup(conn, db_path, version)
+
+        for number, description, step in migrations:
+            if number <= version:
+                continue
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                version = _user_version(conn)
+                if number <= version:
+                    conn.rollback()
+                    continue
+                if callable(step):
+                    step(conn)
+                else:
+                    _execute(conn, step)
+                conn.execute(f'PRAGMA user_version = {int(number)}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            version = number
+            applied.append(number)
+            logger.info(f"Migrated '{db_path}' to version {number}: {description}")
+    finally:
+        conn.close()
+    return applied
+
+
+def migrate_databases(models_db_path, user_db_path, data_db_path, backup=True):
+    """
+    Migrate models.db, user.db and data.db
+
+    Returns:
+        dict: versions applied per database, for those that had any pending
+    """
+    applied = {}
+    for database, db_path in (('models', models_db_path), ('user', user_db_path), ('data', data_db_path)):
+        versions = migrate(db_path, database, backup=backup)
+        if versions:
+            applied[database] = versions
+    return applied
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    db_dir = sys.argv[1] if len(sys.argv) > 1 else 'db'
+    paths = {database: os.path.join(db_dir, f'{database}.db') for database in MIGRATIONS}
+    for database in ('models', 'user'):
+        if not os.path.exists(paths[database]):
+            sys.exit(f"Database file not found at '{paths[database]}'")
+    result = migrate_databases(paths['models'], paths['user'], paths['data'])
+    # cache.db only exists where the response cache was turned on; ResponseCache migrates it when it starts
+    if os.path.exists(paths['cache']):
+        versions = migrate(paths['cache'], 'cache', backup=False)
+        if versions:
+            result['cache'] = versions
+    for database in MIGRATIONS:
+        if not os.path.exists(paths[database]):
+            continue
+        versions = result.get(database)
+        if versions:
+            print(f"  - {paths[database]}: applied {', '.join(map(str, versions))}; now at version {latest_version(database)}")
+        else:
+            print(f"  - {paths[database]}: already at version {latest_version(database)}")
@@ -4,6 +4,7 @@
 import { escapeHtml } from './ui.js';
 
 let isFirstMessage = true;
+let currentChatId = null; // Set by the server after the first reply so later turns share history
 
 // DOM elements can be fetched inside the functions that use them
 // to keep this module self-contained.
@@ -37,6 +38,14 @@ function formatBotMessage(content) {
     return formatted;
 }
 
+// Images kept by the server's media store come as a thumbnail (WebP/AVIF when the browser takes it)
+// that links to the full-size image; provider URLs are shown as they are.
+function generatedImageHtml(url) {
+    if (!url.startsWith('/media/files/')) {
+        return `<img src="${url}" alt="Generated image" class="generated-image">`;
+    }
+    return `<a href="${url}" target="_blank" rel="noopener"><img src="${url}?size=thumb" alt="Generated image" class="generated-image" loading="lazy" decoding="async"></a>`;
+}
 
 function addMessage(content, isUser = false) {
     const messagesContainer = document.getElementById('chatMessages');
@@ -54,7 +63,7 @@ function addMessage(content, isUser = false) {
         contentDiv.textContent = content;
     } else {
         if (content.type === 'image' && content.images && content.images.length > 0) {
-            contentDiv.innerHTML = `<img src="${content.images[0]}" alt="Generated image" class="generated-image">`;
+            contentDiv.innerHTML = generatedImageHtml(content.images[0]);
         } else if (content.type === 'video' && content.videos && content.videos.length > 0) {
             contentDiv.innerHTML = `<video src="${content.videos[0]}" class="generated-video" controls autoplay loop muted></video>`;
         } else {
@@ -85,6 +94,54 @@ function removeLoadingDots() {
     if (loadingMessage) loadingMessage.remove();
 }
 
+function startStreamingMessage() {
+    // Swap the loading dots for an empty bot message that tokens are appended to
+    removeLoadingDots();
+    addMessage({ response: '', type: 'text' }, false);
+    const messages = document.querySelectorAll('#chatMessages .message.bot .message-content');
+    return messages[messages.length - 1];
+}
+
+async function readChatStream(response) {
+    // Parses the Server-Sent Events stream from /chat and renders tokens as they arrive
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const messagesContainer = document.getElementById('chatMessages');
+    let buffer = '';
+    let text = '';
+    let contentDiv = null;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const rawEvent of events) {
+            if (!rawEvent.startsWith('data: ')) continue;
+            const event = JSON.parse(rawEvent.slice(6));
+            if (!contentDiv) contentDiv = startStreamingMessage();
+
+            if (event.type === 'token') {
+                text += event.text;
+                contentDiv.innerHTML = formatBotMessage(text);
+            } else if (event.type === 'done') {
+                contentDiv.innerHTML = formatBotMessage(event.response || text);
+                if (event.chat_id) currentChatId = event.chat_id;
+            } else if (event.type === 'error') {
+                contentDiv.innerHTML = formatBotMessage(text ? `${text}\n\n❌ ${event.error}` : `❌ ${event.error}`);
+            }
+            messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        }
+    }
+
+    if (!contentDiv) {
+        removeLoadingDots();
+        addMessage({ response: 'An unexpected error occurred.', type: 'text' }, false);
+    }
+}
+
 export async function sendMessage() {
     const input = document.getElementById('messageInput');
     const message = input.value.trim();
@@ -94,6 +151,8 @@ export async function sendMessage() {
     const modelSelector = document.querySelector('.model-selector');
     const selectedModel = modelSelector.dataset.model;
     const currentMediaType = modelSelector.dataset.mediaType || 'llm';
+    // Text replies are streamed token by token; media generations return one JSON object
+    const stream = currentMediaType === 'llm';
 
     addMessage(message, true);
     input.value = '';
@@ -107,7 +166,9 @@ export async function sendMessage() {
             body: JSON.stringify({ 
                 message: message, 
                 model: selectedModel,
-                mediaType: currentMediaType
+                mediaType: currentMediaType,
+                stream: stream,
+                chat_id: currentChatId
             })
         });
 
@@ -116,8 +177,18 @@ export async function sendMessage() {
             throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
         }
 
-        const data = await response.json();
+        if (stream && response.headers.get('Content-Type').startsWith('text/event-stream')) {
+            await readChatStream(response);
+            return;
+        }
+
+        let data = await response.json();
+        if (data.type === 'job') {
+            // Still generating: follow the background job until it finishes
+            data = await waitForMediaJob(data);
+        }
         removeLoadingDots();
+        if (data.chat_id) currentChatId = data.chat_id;
 
         if (data.error) {
             addMessage({ response: `❌ ${data.error}`, type: 'text' }, false);
@@ -131,6 +202,29 @@ export async function sendMessage() {
     }
 }
 
+// Resolves with the job's result (or { error }) once its events stream reports it done
+function waitForMediaJob(job) {
+    return new Promise((resolve) => {
+        const events = new EventSource(job.events_url);
+        events.onmessage = (e) => {
+            const event = JSON.parse(e.data);
+            if (event.type !== 'done') return;
+            events.close();
+            if (event.job.status === 'succeeded') {
+                resolve(event.job.result);
+            } else {
+                resolve({ error: event.job.error || `Generation ${event.job.status}` });
+            }
+        };
+        events.onerror = () => {
+            // The connection dropped; EventSource reconnects on its own unless the job is gone
+            if (events.readyState === EventSource.CLOSED) {
+                resolve({ error: 'Lost track of the generation. Please try again.' });
+            }
+        };
+    });
+}
+
 export function handleInput() {
     const textarea = document.getElementById('messageInput');
     const sendBtn = document.getElementById('sendBtn');
@@ -175,6 +269,7 @@ export function startNewChat() {
         </div>`;
     chatMessages.innerHTML = welcomeContainerHTML;
     isFirstMessage = true;
+    currentChatId = null;
     handleInput();
 =======
 // static/js/chat.js
@@ -4,6 +4,7 @@
 import { MODEL_LOGOS_SVG, PROVIDER_LOGOS_SELECTOR, CAPABILITY_ICONS, PREMIUM_ICONS_BADGES } from './config.js';
 
 let modelsData = null;
+let modelsRequest = null; // In-flight /models/categorized fetch, shared so reopening the popover doesn't fetch again
 let isPopoverExpandedView = false;
 let openProviderSections = {};
 let currentMediaType = 'llm'; // Default media type
@@ -46,12 +47,19 @@ export function togglePopoverExpandedView(event) {
 
 // --- Model Data and Rendering ---
 
-async function initializeModels() {
+function initializeModels() {
+    if (!modelsRequest) {
+        modelsRequest = loadModels().finally(() => { modelsRequest = null; });
+    }
+    return modelsRequest;
+}
+
+async function loadModels() {
     try {
-        const response = await fetch('/models/categorized');
+        // The server answers with an ETag; 'no-cache' revalidates it and gets a 304 when nothing changed
+        const response = await fetch('/models/categorized', { cache: 'no-cache' });
         if (!response.ok) throw new Error('Failed to fetch models');
         modelsData = await response.json();
-        console.log('Loaded categorized models data:', modelsData);
         renderModelPopoverContent();
     } catch (error) {
         console.error('Error loading models:', error);
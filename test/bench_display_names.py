@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the display-name rule table.
+
+Parses every model name in the catalog with the old if-chain and with
+DisplayNameParser, checks that both give the same (main, sub) names, and
+prints the per-row cost of each.
+
+Usage: python test/bench_display_names.py [path/to/models.db]
+"""
+
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from display_names import DisplayNameParser
+from model_catalog import ModelCatalog
+
+ROUNDS = 200
+
+# Names not in the shipped catalog that exercise rule ordering and the generic fallback
+EXTRA_NAMES = [
+    ('llm', 'O3'), ('llm', 'o3-pro'), ('llm', 'meta-llama/Llama-3.2-3B-Instruct-Turbo'),
+    ('llm', 'deepseek-coder-v2'), ('llm', 'Qwen/Qwen2.5-72B-Instruct'), ('llm', 'mistral'),
+    ('image', 'FLUX.1.1 [pro]'), ('image', 'FLUX.1 Kontext'), ('image', 'Gemini 2.0 Flash Image'),
+    ('audio', 'Gemini 2.5 Pro TTS'), ('audio', 'SONIC'), ('video', 'Veo 3'),
+]
+
+
+def legacy_parse_model_display_name(model_name, model_type):
+    """The original if-chain from app.py, kept here as the baseline."""
+    main_name, sub_name = model_name, ''
+    
+    if model_type == 'llm':
+        # GPT models
+        if 'gpt-4o-mini' in model_name.lower():
+            main_name, sub_name = 'GPT-4o', 'Mini'
+        elif 'gpt-4o' in model_name.lower():
+            main_name, sub_name = 'GPT-4o', ''
+        elif 'gpt-4.1-mini' in model_name.lower():
+            main_name, sub_name = 'GPT-4.1', 'Mini'
+        elif 'gpt-4.1-nano' in model_name.lower():
+            main_name, sub_name = 'GPT-4.1', 'Nano'
+        elif 'gpt-4.1' in model_name.lower():
+            main_name, sub_name = 'GPT-4.1', ''
+        elif 'gpt-4.5' in model_name.lower():
+            main_name, sub_name = 'GPT-4.5', 'Preview'
+        
+        # OpenAI o-series
+        elif 'o1-pro' in model_name.lower():
+            main_name, sub_name = 'o1', 'Pro'
+        elif 'o1-mini' in model_name.lower():
+            main_name, sub_name = 'o1', 'Mini'
+        elif 'o3-mini' in model_name.lower():
+            main_name, sub_name = 'o3', 'Mini'
+        elif 'o4-mini' in model_name.lower():
+            main_name, sub_name = 'o4', 'Mini'
+        elif model_name.lower() == 'o3':
+            main_name, sub_name = 'o3', ''
+        
+        # Claude models
+        elif 'Claude Sonnet 4' in model_name:
+            main_name, sub_name = 'Claude 4', 'Sonnet'
+        elif 'Claude Opus 4' in model_name:
+            main_name, sub_name = 'Claude 4', 'Opus'
+        elif 'Claude Sonnet 3.7' in model_name:
+            main_name, sub_name = 'Claude 3.7', 'Sonnet'
+        elif 'Claude Sonnet 3.5' in model_name:
+            main_name, sub_name = 'Claude 3.5', 'Sonnet'
+        elif 'Claude 3 Opus' in model_name:
+            main_name, sub_name = 'Claude 3', 'Opus'
+        elif 'Claude 3 Sonnet' in model_name:
+            main_name, sub_name = 'Claude 3', 'Sonnet'
+        elif 'Claude 3 Haiku' in model_name:
+            main_name, sub_name = 'Claude 3', 'Haiku'
+        elif 'Claude Haiku 3.5' in model_name:
+            main_name, sub_name = 'Claude 3.5', 'Haiku'
+        
+        # Gemini models
+        elif 'Gemini 2.5 Flash' in model_name:
+            main_name, sub_name = 'Gemini 2.5', 'Flash'
+        elif 'Gemini 2.5 Pro' in model_name:
+            main_name, sub_name = 'Gemini 2.5', 'Pro'
+        elif 'Gemini 2.0 Flash' in model_name:
+            main_name, sub_name = 'Gemini 2.0', 'Flash'
+        elif 'Gemini 1.5 Pro' in model_name:
+            main_name, sub_name = 'Gemini 1.5', 'Pro'
+        elif 'Gemini 1.5 Flash' in model_name:
+            main_name, sub_name = 'Gemini 1.5', 'Flash'
+        
+        # DeepSeek models
+        elif 'DeepSeek-R1' in model_name:
+            main_name, sub_name = 'DeepSeek', 'R1'
+        elif 'deepseek-reasoner' in model_name or 'deepseek-coder' in model_name:
+            main_name, sub_name = 'DeepSeek', 'Coder'
+        elif 'DeepSeek-V3' in model_name:
+            main_name, sub_name = 'DeepSeek', 'V3'
+        
+        # Llama models
+        elif 'Llama-4-Scout' in model_name:
+            main_name, sub_name = 'Llama 4', 'Scout'
+        elif 'Llama-4-Maverick' in model_name:
+            main_name, sub_name = 'Llama 4', 'Maverick'
+        elif 'Llama-3.3-70B' in model_name:
+            main_name, sub_name = 'Llama 3.3', '70B'
+        elif 'Llama-3.2-90B' in model_name:
+            main_name, sub_name = 'Llama 3.2', '90B Vision'
+        elif 'Llama-3.2-11B' in model_name:
+            main_name, sub_name = 'Llama 3.2', '11B Vision'
+        elif 'Llama-3.2-3B' in model_name:
+            main_name, sub_name = 'Llama 3.2', '3B'
+        elif 'Llama-3.1-405B' in model_name:
+            main_name, sub_name = 'Llama 3.1', '405B'
+        elif 'Llama-3.1-70B' in model_name:
+            main_name, sub_name = 'Llama 3.1', '70B'
+        elif 'Llama-3.1-8B' in model_name:
+            main_name, sub_name = 'Llama 3.1', '8B'
+        elif 'Llama-Vision-Free' in model_name:
+            main_name, sub_name = 'Llama Vision', 'Free'
+        
+        # Other models with generic parsing
+        else:
+            # Try to extract version numbers and model types
+            if '/' in model_name:
+                model_name = model_name.split('/')[-1]  # Take the part after the last slash
+            
+            # Look for patterns like ModelName-VersionNumber
+            match = re.match(r'([a-zA-Z0-9\._\-]+?)[\-\s]+([\d\.]+[a-zA-Z]*(?:\-[a-zA-Z0-9]+)*)', model_name, re.IGNORECASE)
+            if match and len(match.groups()) >= 2:
+                base_name = match.groups()[0].replace('-', ' ').replace('_', ' ')
+                version_part = match.groups()[1]
+                main_name = ' '.join(word.capitalize() for word in base_name.split())
+                sub_name = version_part.upper() if len(version_part) <= 5 else version_part.capitalize()
+    
+    elif model_type == 'image':
+        if 'FLUX.1.1' in model_name and 'pro' in model_name.lower():
+            main_name, sub_name = 'FLUX.1.1', 'Pro'
+        elif 'FLUX.1' in model_name:
+            if 'schnell' in model_name.lower():
+                main_name, sub_name = 'FLUX.1', 'Schnell'
+            elif 'dev' in model_name.lower():
+                main_name, sub_name = 'FLUX.1', 'Dev'
+            elif 'redux' in model_name.lower():
+                main_name, sub_name = 'FLUX.1', 'Redux'
+            elif 'depth' in model_name.lower():
+                main_name, sub_name = 'FLUX.1', 'Depth'
+            elif 'canny' in model_name.lower():
+                main_name, sub_name = 'FLUX.1', 'Canny'
+            else:
+                main_name, sub_name = 'FLUX.1', ''
+        elif 'Imagen 3' in model_name:
+            main_name, sub_name = 'Imagen', '3'
+        elif 'gpt-image-1' in model_name:
+            main_name, sub_name = 'GPT Image', '1'
+        elif 'Gemini 2.0 Flash' in model_name and 'Image' in model_name:
+            main_name, sub_name = 'Gemini 2.0', 'Image Gen'
+    
+    elif model_type == 'audio':
+        if 'sonic-2' in model_name.lower():
+            main_name, sub_name = 'Sonic', '2'
+        elif 'sonic' in model_name.lower():
+            main_name, sub_name = 'Sonic', '1'
+        elif 'gpt-4o-audio' in model_name:
+            main_name, sub_name = 'GPT-4o', 'Audio'
+        elif 'gpt-4o-mini-audio' in model_name:
+            main_name, sub_name = 'GPT-4o Mini', 'Audio'
+        elif 'gpt-4o-realtime' in model_name:
+            main_name, sub_name = 'GPT-4o', 'Realtime'
+        elif 'gpt-4o-mini-realtime' in model_name:
+            main_name, sub_name = 'GPT-4o Mini', 'Realtime'
+        elif 'Gemini 2.5' in model_name and 'TTS' in model_name:
+            main_name, sub_name = 'Gemini 2.5', 'TTS'
+        elif 'Gemini 2.5' in model_name and 'Audio' in model_name:
+            main_name, sub_name = 'Gemini 2.5', 'Audio'
+        elif 'Gemini 2.0 Flash Live' in model_name:
+            main_name, sub_name = 'Gemini 2.0', 'Live'
+    
+    elif model_type == 'video':
+        if 'Veo 2' in model_name:
+            main_name, sub_name = 'Veo', '2'
+
+    return main_name, sub_name
+
+
+def main():
+    db_path = sys.argv[1] if len(sys.argv) > 1 else "db/models.db"
+    if not os.path.exists(db_path):
+        print(f"❌ Database not found: {db_path}")
+        return 1
+
+    catalog = ModelCatalog.load(db_path)
+    rows = [(model['model_name'], model['model_type']) for model in catalog.all_models()]
+    print(f"Catalog rows: {len(rows)}")
+
+    # Same answers for every row
+    parser = DisplayNameParser()
+    mismatches = [
+        (name, model_type, legacy_parse_model_display_name(name, model_type), parser.parse(name, model_type))
+        for name, model_type in rows + [(name, model_type) for model_type, name in EXTRA_NAMES]
+        if legacy_parse_model_display_name(name, model_type) != parser.parse(name, model_type)
+    ]
+    for name, model_type, old, new in mismatches:
+        print(f"❌ {model_type} {name!r}: if-chain {old} != rule table {new}")
+    if not mismatches:
+        print("✅ Rule table matches the if-chain on every row")
+
+    def run_legacy():
+        for name, model_type in rows:
+            legacy_parse_model_display_name(name, model_type)
+
+    cold = DisplayNameParser()
+
+    def run_rules_cold():
+        # Every name misses the memo, as on the first payload build after a catalog reload
+        cold._memo.clear()
+        for name, model_type in rows:
+            cold.parse(name, model_type)
+
+    def run_rules_memoized():
+        for name, model_type in rows:
+            parser.parse(name, model_type)
+
+    per_row = ROUNDS * len(rows)
+    for label, fn in (
+        ("if-chain", run_legacy),
+        ("rule table (cold memo)", run_rules_cold),
+        ("rule table (memoized)", run_rules_memoized),
+    ):
+        seconds = min(timeit.repeat(fn, number=ROUNDS, repeat=3))
+        print(f"{label:<36} {seconds / per_row * 1e6:8.2f} µs/row")
+
+    seconds = min(timeit.repeat(DisplayNameParser, number=ROUNDS, repeat=3))
+    print(f"{'compiling the rule table':<36} {seconds / ROUNDS * 1e6:8.2f} µs once per catalog load")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark for password hashing.
+
+1. Times one hash at several pbkdf2 work factors, to pick PASSWORD_HASH_METHOD
+   (aim for the largest that stays around 100-250 ms on production hardware).
+2. Fires a burst of logins from threads, hashing inline vs. through
+   PasswordHasher, while another thread measures how late a 10 ms timer
+   wakes up - a stand-in for the latency /chat handlers see during the burst.
+
+Usage: python test/bench_password_hash.py [burst_size]
+"""
+
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from password_hasher import PasswordHasher, HasherBusy, PASSWORD_HASH_METHOD
+
+WORK_FACTORS = (100000, 300000, 600000, 1000000)
+REQUEST_THREADS = 16
+
+
+def time_work_factors():
+    print("Single hash cost:")
+    for iterations in WORK_FACTORS:
+        method = f'pbkdf2:sha256:{iterations}'
+        started = time.perf_counter()
+        generate_password_hash('correct horse battery staple', method)
+        print(f"  {method:<24} {(time.perf_counter() - started) * 1000:7.1f} ms")
+
+
+def measure_lag(stop, lags):
+    """How late a 10 ms sleep returns while hashing is going on"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        time.sleep(0.01)
+        lags.append(time.perf_counter() - started - 0.01)
+
+
+def burst(label, verify, burst_size):
+    stop = threading.Event()
+    lags = []
+    watcher = threading.Thread(target=measure_lag, args=(stop, lags))
+    watcher.start()
+
+    rejected = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(REQUEST_THREADS) as pool:
+        for result in pool.map(lambda _: verify(), range(burst_size)):
+            rejected += result is None
+    elapsed = time.perf_counter() - started
+    stop.set()
+    watcher.join()
+
+    lags.sort()
+    # A burst shorter than one timer tick leaves no samples
+    p50 = lags[len(lags) // 2] if lags else 0
+    p99 = lags[max(0, int(len(lags) * 0.99) - 1)] if lags else 0
+    print(f"  {label:<10} {burst_size / elapsed:7.1f} logins/s  "
+          f"rejected {rejected:3d}  timer lag p50 {p50 * 1000:6.1f} ms  p99 {p99 * 1000:6.1f} ms")
+
+
+def main():
+    burst_size = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    time_work_factors()
+
+    stored = generate_password_hash('hunter22', PASSWORD_HASH_METHOD)
+    hasher = PasswordHasher()
+    hasher.verify(stored, 'hunter22')  # start the worker processes
+
+    def pooled():
+        try:
+            return hasher.verify(stored, 'hunter22')
+        except HasherBusy:
+            return None
+
+    print(f"\nBurst of {burst_size} logins from {REQUEST_THREADS} threads ({PASSWORD_HASH_METHOD}):")
+    burst('inline', lambda: check_password_hash(stored, 'hunter22'), burst_size)
+    burst('pooled', pooled, burst_size)
+    print(f"  pool stats: {hasher.stats()}")
+    hasher.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: how long importing the app takes, and what it imports.
+
+Runs `python -X importtime -c "import app"` in fresh interpreters and reports
+the median import time, the slowest top-level imports, and whether any module
+in provider_sdks.LAZY_MODULES (provider SDKs, PIL, flask_dance) got imported.
+Those are meant to load on first use, so the script exits non-zero if one
+shows up at startup - run it after touching imports to keep cold starts fast.
+
+Usage: python test/bench_startup.py [module] [runs]
+"""
+
+import os
+import sys
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from provider_sdks import LAZY_MODULES
+
+TOP_IMPORTS = 15
+
+
+def import_once(module):
+    """One cold import; returns ({module: cumulative us}, {top-level module: cumulative us})"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    cumulative = {}
+    top_level = {}
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package", nesting shown by indentation
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        cumulative[name.strip()] = int(cumulative_us)
+        if len(name) - len(name.lstrip()) == 1:
+            top_level[name.strip()] = int(cumulative_us)
+    return cumulative, top_level
+
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else 'app'
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    totals = []
+    for _ in range(runs):
+        cumulative, top_level = import_once(module)
+        totals.append(cumulative.get(module, 0))
+
+    print(f"import {module}: median {statistics.median(totals) / 1000:.0f} ms over {runs} runs "
+          f"(min {min(totals) / 1000:.0f} ms, max {max(totals) / 1000:.0f} ms)")
+
+    print("\nSlowest top-level imports (last run):")
+    for name, us in sorted(top_level.items(), key=lambda item: -item[1])[:TOP_IMPORTS]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    eager = [name for name in LAZY_MODULES if name in cumulative]
+    if eager:
+        print(f"\nFAIL: imported at startup but should load on first use: {', '.join(eager)}")
+        sys.exit(1)
+    print(f"\nOK: none of {', '.join(LAZY_MODULES)} imported at startup")
+
+
+if __name__ == '__main__':
+    main()
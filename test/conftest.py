@@ -0,0 +1,5 @@
+# conftest.py - pytest settings for test/
+
+# Scripts that call the real provider APIs or benchmark; run them directly, not under pytest
+collect_ignore = ['test_ai.py', 'test_api_keys.py', 'debug_chat.py']
+collect_ignore_glob = ['bench_*.py']
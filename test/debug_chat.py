@@ -26,16 +26,16 @@ def check_database():
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
         
-        # Check if llm_models table exists and has data
-        cursor.execute("SELECT COUNT(*) FROM llm_models WHERE is_active = 1")
+        # Check the models table has active LLMs
+        cursor.execute("SELECT COUNT(*) FROM models WHERE model_type = 'llm' AND is_active = 1")
         active_models = cursor.fetchone()[0]
         print(f"✅ Found {active_models} active LLM models")
         
         # Get a sample of available models
         cursor.execute("""
             SELECT provider_name, model_name, api_name 
-            FROM llm_models 
-            WHERE is_active = 1 
+            FROM models 
+            WHERE model_type = 'llm' AND is_active = 1 
             LIMIT 5
         """)
         sample_models = cursor.fetchall()
@@ -135,8 +135,8 @@ def test_model_selection():
             # Try to find model by display name or similar
             cursor.execute("""
                 SELECT model_name, api_name, provider_name 
-                FROM llm_models 
-                WHERE model_name LIKE ? OR model_name = ?
+                FROM models 
+                WHERE model_type = 'llm' AND (model_name LIKE ? OR model_name = ?)
                 AND is_active = 1
                 LIMIT 1
             """, (f"%{display_name}%", display_name))
@@ -0,0 +1,117 @@
+"""
+Tests for ConversationStore keyset pagination and the write queue
+
+Run with: python -m pytest test/
+"""
+
+import os
+import sys
+import sqlite3
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema_migrations import migrate
+from conversation_store import ConversationStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    db_path = str(tmp_path / 'data.db')
+    migrate(db_path, 'data', backup=False)
+    # A long flush interval leaves writes queued until a read flushes them
+    store = ConversationStore(db_path, flush_interval=60)
+    yield store
+    store.close()
+
+
+def all_pages(store, chat_id, limit):
+    pages = []
+    cursor = None
+    while True:
+        messages, cursor = store.get_page(chat_id, limit=limit, before=cursor)
+        pages.append([message['message_text'] for message in messages])
+        if cursor is None:
+            return pages
+
+
+def test_pages_newest_first(store):
+    chat_id = store.create_session('u1', title='Test')
+    for i in range(7):
+        store.append(chat_id, 'user' if i % 2 == 0 else 'ai', f'message {i}')
+
+    # Each page is oldest-first; pages go back in time
+    assert all_pages(store, chat_id, 3) == [
+        ['message 4', 'message 5', 'message 6'],
+        ['message 1', 'message 2', 'message 3'],
+        ['message 0'],
+    ]
+
+
+def test_exact_multiple_of_page_size(store):
+    chat_id = store.create_session('u1')
+    for i in range(6):
+        store.append(chat_id, 'user', f'message {i}')
+
+    # A full last page can't tell there's nothing older, so one empty page follows
+    assert all_pages(store, chat_id, 3) == [
+        ['message 3', 'message 4', 'message 5'],
+        ['message 0', 'message 1', 'message 2'],
+        [],
+    ]
+
+
+def test_equal_timestamps_break_ties_on_rowid(store):
+    chat_id = store.create_session('u1')
+    store.flush()
+    conn = sqlite3.connect(store.db_path)
+    try:
+        with conn:
+            conn.executemany(
+                '''INSERT INTO chat_messages (message_id, chat_id, sender_type, message_text, timestamp)
+                   VALUES (?, ?, 'user', ?, '2025-06-01 12:00:00')''',
+                [(f'm{i}', chat_id, f'message {i}') for i in range(5)]
+            )
+    finally:
+        conn.close()
+
+    assert sum(reversed(all_pages(store, chat_id, 2)), []) == [f'message {i}' for i in range(5)]
+
+
+def test_new_messages_dont_shift_older_pages(store):
+    chat_id = store.create_session('u1')
+    for i in range(5):
+        store.append(chat_id, 'user', f'message {i}')
+
+    latest, cursor = store.get_page(chat_id, limit=2)
+    assert [message['message_text'] for message in latest] == ['message 3', 'message 4']
+    store.append(chat_id, 'ai', 'message 5')
+
+    older, _ = store.get_page(chat_id, limit=2, before=cursor)
+    assert [message['message_text'] for message in older] == ['message 1', 'message 2']
+
+
+def test_chats_are_paged_separately(store):
+    first = store.create_session('u1')
+    second = store.create_session('u2')
+    store.append_turn(first, 'hello', 'hi there', model_used='GPT-4o', tokens_used=12)
+    store.append(second, 'user', 'other chat')
+
+    messages, cursor = store.get_page(first, limit=10)
+    assert cursor is None
+    assert [(message['sender_type'], message['message_text']) for message in messages] == [
+        ('user', 'hello'), ('ai', 'hi there')
+    ]
+    assert messages[1]['model_used'] == 'GPT-4o'
+    assert messages[1]['token_estimate'] == 12
+    assert store.get_session(first)['user_id'] == 'u1'
+
+
+def test_recent_messages_include_queued(store):
+    chat_id = store.create_session('u1')
+    store.append(chat_id, 'user', 'written')
+    store.flush()
+    store.append(chat_id, 'ai', 'still queued')
+
+    assert [message['message_text'] for message in store.recent_messages(chat_id)] == ['written', 'still queued']
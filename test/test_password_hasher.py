@@ -0,0 +1,96 @@
+"""
+Tests for PasswordHasher: inline and pooled hashing, admission limits and rehash checks
+
+Run with: python -m pytest test/
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('werkzeug')
+
+from password_hasher import PasswordHasher, HasherBusy
+
+# Cheap enough that the tests don't spend their time hashing
+FAST_METHOD = 'pbkdf2:sha256:1000'
+
+
+@pytest.fixture
+def pooled():
+    hasher = PasswordHasher(method=FAST_METHOD, workers=1, queue_size=0, admit_seconds=0.05, timeout=10)
+    yield hasher
+    hasher.close()
+
+
+def test_inline_hash_and_verify():
+    hasher = PasswordHasher(method=FAST_METHOD, workers=0)
+    hashed = hasher.hash('correct horse')
+    assert hashed.startswith(FAST_METHOD + '$')
+    assert hasher.verify(hashed, 'correct horse')
+    assert not hasher.verify(hashed, 'wrong horse')
+    assert hasher.stats()['hashed'] == 1
+    assert hasher.stats()['verified'] == 2
+
+
+def test_inline_hash_async():
+    hasher = PasswordHasher(method=FAST_METHOD, workers=0)
+    future = hasher.hash_async('correct horse')
+    assert future.done()
+    assert hasher.verify(future.result(), 'correct horse')
+
+
+def test_pooled_hash_and_verify(pooled):
+    hashed = pooled.hash('correct horse')
+    assert pooled.verify(hashed, 'correct horse')
+    stats = pooled.stats()
+    assert stats['completed'] == 2
+    assert stats['in_flight'] == 0
+    assert stats['rejected'] == 0
+
+
+def test_full_pool_turns_hashes_away(pooled):
+    # The pool's one slot (1 worker, no queue) is taken by a slow call
+    blocker = pooled._pool.submit(time.sleep, 1)
+    assert blocker is not None
+
+    started = time.monotonic()
+    with pytest.raises(HasherBusy):
+        pooled.hash('correct horse')
+    # Turned away after admit_seconds, not after the blocker finished
+    assert time.monotonic() - started < 0.5
+    # Work nobody waits on is hashed inline rather than dropped
+    future = pooled.hash_async('correct horse')
+    assert future.done()
+    assert future.result().startswith(FAST_METHOD + '$')
+    assert pooled.stats()['rejected'] == 2
+
+    blocker.result()
+    assert pooled.verify(pooled.hash('correct horse'), 'correct horse')
+
+
+def test_slow_hash_times_out():
+    hasher = PasswordHasher(method=FAST_METHOD, workers=1, queue_size=1, admit_seconds=0.05, timeout=0.05)
+    try:
+        blocker = hasher._pool.submit(time.sleep, 1)
+        with pytest.raises(HasherBusy):
+            hasher.hash('correct horse')
+        assert hasher.stats()['timed_out'] == 1
+        blocker.result()
+    finally:
+        hasher.close()
+
+
+def test_needs_rehash():
+    old = PasswordHasher(method='pbkdf2:sha256:500', workers=0)
+    new = PasswordHasher(method=FAST_METHOD, workers=0)
+    hashed = old.hash('correct horse')
+    assert new.needs_rehash(hashed)
+    assert not old.needs_rehash(hashed)
+    # An old hash still verifies, so the login can go on to rehash it
+    assert new.verify(hashed, 'correct horse')
+    assert not new.needs_rehash(new.hash('correct horse'))
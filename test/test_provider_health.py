@@ -0,0 +1,161 @@
+"""
+Tests for ProviderHealth: when circuits open, and how probes and trial requests close them
+
+Run with: python -m pytest test/
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import provider_health
+from provider_health import (
+    ProviderHealth, ProviderUnavailable, CLOSED, OPEN, HALF_OPEN,
+    HEALTH_CONSECUTIVE_FAILURES, CIRCUIT_OPEN_SECONDS
+)
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+@pytest.fixture(autouse=True)
+def no_probe_thread(monkeypatch):
+    # Tests step the prober by hand, via _probe() and _half_open()
+    monkeypatch.setattr(ProviderHealth, '_start_prober', lambda self: None)
+
+
+def open_circuit(health, provider_key='test'):
+    for _ in range(HEALTH_CONSECUTIVE_FAILURES):
+        health.record_failure(provider_key, ServerError('down'))
+    return health._circuits[provider_key]
+
+
+def test_opens_after_consecutive_failures():
+    health = ProviderHealth(name='test')
+    for _ in range(HEALTH_CONSECUTIVE_FAILURES - 1):
+        health.record_failure('test', ServerError('down'))
+    health.check('test')
+    assert health.is_available('test')
+
+    health.record_failure('test', ServerError('down'))
+    with pytest.raises(ProviderUnavailable):
+        health.check('test')
+    assert not health.is_available('test')
+    assert health.stats()['test']['state'] == OPEN
+    # Other providers keep going
+    health.check('other')
+
+
+def test_success_resets_consecutive_failures():
+    health = ProviderHealth(name='test')
+    for _ in range(HEALTH_CONSECUTIVE_FAILURES - 1):
+        health.record_failure('test', ServerError('down'))
+    health.record_success('test', 0.1)
+    health.record_failure('test', ServerError('down'))
+    health.check('test')
+
+
+def test_client_errors_dont_count():
+    health = ProviderHealth(name='test')
+    for _ in range(HEALTH_CONSECUTIVE_FAILURES * 2):
+        health.record_failure('test', BadRequest('bad request'))
+        health.record_failure('test', ValueError('our own validation'))
+    health.check('test')
+
+
+def test_opens_on_failure_rate(monkeypatch):
+    monkeypatch.setattr(provider_health, 'HEALTH_CONSECUTIVE_FAILURES', 1000)
+    health = ProviderHealth(name='test')
+    for _ in range(provider_health.HEALTH_MIN_CALLS):
+        health.record_success('test', 0.1)
+        health.record_failure('test', ServerError('down'))
+    assert health._circuits['test'].state == OPEN
+
+
+def test_successful_probe_closes():
+    probed = []
+    health = ProviderHealth(probe=probed.append, name='test')
+    open_circuit(health)
+
+    health._probe('test')
+    assert probed == ['test']
+    assert health._circuits['test'].state == CLOSED
+    health.check('test')
+    # Failures from before the probe don't re-open it straight away
+    health.record_failure('test', ServerError('down'))
+    health.check('test')
+
+
+def test_failed_probe_backs_off():
+    def probe(provider_key):
+        raise ServerError('still down')
+
+    health = ProviderHealth(probe=probe, name='test')
+    circuit = open_circuit(health)
+
+    health._probe('test')
+    assert circuit.state == OPEN
+    assert circuit.open_seconds == CIRCUIT_OPEN_SECONDS * 2
+    assert circuit.last_error == 'still down'
+    health._probe('test')
+    assert circuit.open_seconds == CIRCUIT_OPEN_SECONDS * 4
+
+
+def test_half_open_without_probe_lets_one_request_through():
+    health = ProviderHealth(name='test')
+    circuit = open_circuit(health)
+
+    health._half_open('test')
+    assert circuit.state == HALF_OPEN
+    assert health.is_available('test')
+    health.check('test')
+    with pytest.raises(ProviderUnavailable):
+        health.check('test')
+
+    health.record_success('test', 0.1)
+    assert circuit.state == CLOSED
+    health.check('test')
+    health.check('test')
+
+
+def test_failed_trial_reopens_with_longer_backoff():
+    health = ProviderHealth(name='test')
+    circuit = open_circuit(health)
+
+    health._half_open('test')
+    health.check('test')
+    health.record_failure('test', ServerError('still down'))
+    assert circuit.state == OPEN
+    assert circuit.open_seconds == CIRCUIT_OPEN_SECONDS * 2
+    with pytest.raises(ProviderUnavailable):
+        health.check('test')
+
+
+def test_trial_without_verdict_lets_another_through():
+    health = ProviderHealth(name='test')
+    circuit = open_circuit(health)
+
+    health._half_open('test')
+    health.check('test')
+    # A 4xx says nothing about the provider, so the next request gets to try
+    health.record_failure('test', BadRequest('bad request'))
+    assert circuit.state == HALF_OPEN
+    health.check('test')
+
+
+def test_abandoned_trial_expires():
+    health = ProviderHealth(name='test')
+    circuit = open_circuit(health)
+
+    health._half_open('test')
+    health.check('test')
+    circuit.trial_started -= provider_health.PROVIDER_TIMEOUT + 1
+    health.check('test')
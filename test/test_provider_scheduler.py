@@ -0,0 +1,130 @@
+"""
+Tests for ProviderScheduler: priority order, deadlines, rate limits and Retry-After back-off
+
+Run with: python -m pytest test/
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from provider_scheduler import (
+    ProviderScheduler, ProviderBusy, retry_after_seconds,
+    PRIORITY_INTERACTIVE, PRIORITY_BULK, RATE_LIMIT_BACKOFF
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f'HTTP {status_code}')
+        self.status_code = status_code
+        self.response = FakeResponse(status_code, headers)
+
+
+def test_priority_order():
+    async def run():
+        scheduler = ProviderScheduler(rps=1000, burst=1000, max_in_flight=1, queue_timeout=5)
+        order = []
+
+        async def request(name, priority):
+            await scheduler.acquire('test', priority=priority)
+            order.append(name)
+            scheduler.release('test')
+
+        await scheduler.acquire('test')
+        tasks = [
+            asyncio.create_task(request('bulk-1', PRIORITY_BULK)),
+            asyncio.create_task(request('bulk-2', PRIORITY_BULK)),
+            asyncio.create_task(request('chat', PRIORITY_INTERACTIVE)),
+        ]
+        await asyncio.sleep(0.01)
+        assert scheduler.stats()['test']['queued_now'] == 3
+        scheduler.release('test')
+        await asyncio.gather(*tasks)
+        return order
+
+    # Interactive goes first even though it queued last; bulk keeps arrival order
+    assert asyncio.run(run()) == ['chat', 'bulk-1', 'bulk-2']
+
+
+def test_deadline_raises_provider_busy():
+    async def run():
+        scheduler = ProviderScheduler(rps=1000, burst=1000, max_in_flight=1, queue_timeout=5)
+        await scheduler.acquire('test')
+
+        started = time.monotonic()
+        with pytest.raises(ProviderBusy):
+            await scheduler.acquire('test', deadline=time.monotonic() + 0.05)
+        assert time.monotonic() - started < 1
+
+        # The timed-out waiter doesn't hold on to the slot once it frees up
+        scheduler.release('test')
+        await asyncio.wait_for(scheduler.acquire('test'), 1)
+        return scheduler.stats()['test']
+
+    stats = asyncio.run(run())
+    assert stats['timed_out'] == 1
+    assert stats['admitted'] == 2
+    assert stats['in_flight'] == 1
+
+
+def test_token_bucket_spaces_requests():
+    async def run():
+        scheduler = ProviderScheduler(rps=20, burst=1, max_in_flight=10, queue_timeout=5)
+        started = time.monotonic()
+        for _ in range(3):
+            await scheduler.acquire('test')
+        return time.monotonic() - started
+
+    # One from the burst, then one per 50 ms
+    assert asyncio.run(run()) >= 0.09
+
+
+def test_backoff_pauses_provider():
+    async def run():
+        scheduler = ProviderScheduler(rps=1000, burst=1000, max_in_flight=10, queue_timeout=5)
+        scheduler.backoff('test', 0.2)
+        started = time.monotonic()
+        await scheduler.acquire('test')
+        waited = time.monotonic() - started
+
+        # Other providers are unaffected
+        started = time.monotonic()
+        await scheduler.acquire('other')
+        return waited, time.monotonic() - started, scheduler.stats()['test']
+
+    waited, other_waited, stats = asyncio.run(run())
+    assert waited >= 0.18
+    assert other_waited < 0.05
+    assert stats['rate_limited'] == 1
+
+
+def test_backoff_past_deadline_raises():
+    async def run():
+        scheduler = ProviderScheduler(rps=1000, burst=1000, max_in_flight=10, queue_timeout=5)
+        scheduler.backoff('test', 10)
+        with pytest.raises(ProviderBusy):
+            await scheduler.acquire('test', deadline=time.monotonic() + 0.05)
+
+    asyncio.run(run())
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(FakeAPIError(429, {'retry-after': '3'})) == 3.0
+    assert retry_after_seconds(FakeAPIError(429, {'retry-after-ms': '1500', 'retry-after': '3'})) == 1.5
+    assert retry_after_seconds(FakeAPIError(429)) == RATE_LIMIT_BACKOFF
+    assert retry_after_seconds(FakeAPIError(503, {'retry-after': '7'})) == 7.0
+    assert retry_after_seconds(FakeAPIError(503)) is None
+    assert retry_after_seconds(FakeAPIError(500, {'retry-after': '3'})) is None
+    assert retry_after_seconds(ValueError('not an HTTP error')) is None
@@ -0,0 +1,197 @@
+"""
+Tests for schema_migrations.migrate on new, baseline (pre-versioning) and up-to-date databases
+
+Run with: python -m pytest test/
+"""
+
+import os
+import sys
+import sqlite3
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from schema_migrations import migrate, migrate_databases, latest_version, MIGRATIONS
+
+CREATE_SCRIPTS = {
+    'models': os.path.join(ROOT, 'db', 'create_models_db.sql'),
+    'user': os.path.join(ROOT, 'db', 'create_user_db.sql'),
+    'data': os.path.join(ROOT, 'database', 'scripts', 'create_data_db.sql'),
+}
+
+# The schemas as they were before user_version was tracked (user_version 0)
+BASELINE_SCHEMAS = {
+    'models': '''
+        CREATE TABLE llm_models (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            provider_name VARCHAR(255) NOT NULL,
+            model_name VARCHAR(255) NOT NULL,
+            api_name VARCHAR(255),
+            context_window_max_tokens INT,
+            supports_images_input BOOLEAN DEFAULT FALSE,
+            supports_pdfs_input BOOLEAN DEFAULT FALSE,
+            multimodal_input BOOLEAN DEFAULT FALSE,
+            reasoning_enabled BOOLEAN DEFAULT TRUE,
+            usd_per_million_input_tokens DECIMAL(10, 5),
+            usd_per_million_output_tokens DECIMAL(10, 5),
+            is_active BOOLEAN DEFAULT TRUE,
+            notes TEXT
+        );
+        INSERT INTO llm_models (provider_name, model_name, api_name) VALUES ('openai', 'GPT-4o', 'gpt-4o');
+    ''',
+    'user': '''
+        CREATE TABLE user_accounts (
+            user_id TEXT PRIMARY KEY,
+            email TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            hashed_password TEXT NOT NULL,
+            subscription_plan TEXT NOT NULL DEFAULT 'free',
+            token_quota INTEGER,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            timezone TEXT
+        );
+        INSERT INTO user_accounts (user_id, email, name, hashed_password) VALUES ('u1', 'a@example.com', 'A', 'x');
+    ''',
+    'data': '''
+        CREATE TABLE chat_sessions (
+            chat_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            title TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            system_prompt TEXT
+        );
+        CREATE TABLE chat_messages (
+            message_id TEXT PRIMARY KEY,
+            chat_id TEXT NOT NULL,
+            sender_type TEXT NOT NULL CHECK (sender_type IN ('user', 'ai')),
+            message_text TEXT NOT NULL,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            tokens_used INTEGER NOT NULL DEFAULT 0,
+            model_used TEXT
+        );
+        CREATE TABLE usage_metrics (
+            usage_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            model_name TEXT NOT NULL,
+            tokens_used INTEGER NOT NULL,
+            status_code TEXT NOT NULL
+        );
+        INSERT INTO chat_sessions (chat_id, user_id) VALUES ('c1', 'u1');
+        INSERT INTO chat_messages (message_id, chat_id, sender_type, message_text) VALUES ('m1', 'c1', 'user', 'hi');
+    ''',
+    'cache': '''
+        CREATE TABLE response_cache (
+            cache_key TEXT PRIMARY KEY,
+            model_name TEXT NOT NULL,
+            value TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX idx_response_cache_last_used ON response_cache (last_used);
+    ''',
+}
+
+
+def build(db_path, script):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(script)
+    finally:
+        conn.close()
+
+
+def schema(db_path):
+    """Everything migrate() could change: user_version and the definition of every object"""
+    conn = sqlite3.connect(db_path)
+    try:
+        objects = conn.execute('SELECT type, name, sql FROM sqlite_master ORDER BY type, name').fetchall()
+        return conn.execute('PRAGMA user_version').fetchone()[0], objects
+    finally:
+        conn.close()
+
+
+def columns(db_path, table):
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[1] for row in conn.execute(f'PRAGMA table_info({table})').fetchall()]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('database', sorted(MIGRATIONS))
+def test_new_database(tmp_path, database):
+    db_path = str(tmp_path / f'{database}.db')
+    versions = [number for number, _, _ in MIGRATIONS[database]]
+    assert migrate(db_path, database) == versions
+    assert schema(db_path)[0] == latest_version(database)
+    # Nothing to back up in an empty file
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.bak')]
+
+
+@pytest.mark.parametrize('database', sorted(MIGRATIONS))
+def test_baseline_database_migrates_once(tmp_path, database):
+    db_path = str(tmp_path / f'{database}.db')
+    build(db_path, BASELINE_SCHEMAS[database])
+
+    assert migrate(db_path, database) == [number for number, _, _ in MIGRATIONS[database]]
+    migrated = schema(db_path)
+    assert migrated[0] == latest_version(database)
+    assert os.path.exists(f'{db_path}.v0.bak')
+
+    # Running it again, as every worker does at startup, changes nothing
+    assert migrate(db_path, database) == []
+    assert migrate(db_path, database, backup=False) == []
+    assert schema(db_path) == migrated
+
+
+def test_baseline_data_kept(tmp_path):
+    paths = {database: str(tmp_path / f'{database}.db') for database in MIGRATIONS}
+    for database, db_path in paths.items():
+        build(db_path, BASELINE_SCHEMAS[database])
+    migrate_databases(paths['models'], paths['user'], paths['data'])
+
+    assert 'google_id' in columns(paths['user'], 'user_accounts')
+    assert 'token_estimate' in columns(paths['data'], 'chat_messages')
+    assert 'variants_done' in columns(paths['data'], 'media_files')
+    conn = sqlite3.connect(paths['models'])
+    try:
+        assert conn.execute('SELECT model_type, model_name FROM models').fetchall() == [('llm', 'GPT-4o')]
+    finally:
+        conn.close()
+    conn = sqlite3.connect(paths['data'])
+    try:
+        assert conn.execute('SELECT message_id FROM chat_messages').fetchall() == [('m1',)]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('database', sorted(CREATE_SCRIPTS))
+def test_create_script_is_latest(tmp_path, database):
+    """A database built by its create_*.sql script needs no migrations"""
+    db_path = str(tmp_path / f'{database}.db')
+    with open(CREATE_SCRIPTS[database], encoding='utf-8') as f:
+        build(db_path, f.read())
+    built = schema(db_path)
+    assert built[0] == latest_version(database)
+    assert migrate(db_path, database) == []
+    assert schema(db_path) == built
+
+
+def test_failed_migration_keeps_previous_version(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'data.db')
+    build(db_path, BASELINE_SCHEMAS['data'])
+
+    def broken(conn):
+        conn.execute('CREATE TABLE half_done (id INTEGER)')
+        raise sqlite3.OperationalError('boom')
+
+    monkeypatch.setitem(MIGRATIONS, 'data', MIGRATIONS['data'][:1] + ((2, 'Broken', broken),))
+    with pytest.raises(sqlite3.OperationalError):
+        migrate(db_path, 'data', backup=False)
+    version, objects = schema(db_path)
+    assert version == 1
+    assert 'half_done' not in [name for _, name, _ in objects]
@@ -0,0 +1,158 @@
+"""
+Tests for UsageMeter: batched flushes, rollups, quota counters and retries after a failed write
+
+Run with: python -m pytest test/
+"""
+
+import os
+import sys
+import sqlite3
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema_migrations import migrate
+from usage_meter import UsageMeter, ROLLUPS
+
+
+@pytest.fixture
+def paths(tmp_path):
+    data_db_path = str(tmp_path / 'data.db')
+    user_db_path = str(tmp_path / 'user.db')
+    migrate(data_db_path, 'data', backup=False)
+    migrate(user_db_path, 'user', backup=False)
+    conn = sqlite3.connect(user_db_path)
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT INTO user_accounts (user_id, email, name, hashed_password, token_quota) VALUES (?, ?, ?, 'x', ?)",
+                [('u1', 'a@example.com', 'A', None), ('u2', 'b@example.com', 'B', 100)]
+            )
+    finally:
+        conn.close()
+    return data_db_path, user_db_path
+
+
+@pytest.fixture
+def meter(paths):
+    # A long flush interval leaves flushing to the tests
+    meter = UsageMeter(*paths, flush_interval=60)
+    yield meter
+    meter.close()
+
+
+def query(db_path, sql, params=()):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def token_quota(user_db_path, user_id):
+    return query(user_db_path, 'SELECT token_quota FROM user_accounts WHERE user_id = ?', (user_id,))[0][0]
+
+
+def test_record_only_touches_memory(meter, paths):
+    data_db_path, user_db_path = paths
+    assert meter.record('u1', 'GPT-4o', {'input_tokens': 10, 'output_tokens': 5}) == 15
+    assert query(data_db_path, 'SELECT COUNT(*) FROM usage_metrics') == [(0,)]
+    assert token_quota(user_db_path, 'u1') is None
+    assert meter.stats()['pending_rows'] == 1
+    # Quota checks already see the unwritten tokens
+    assert meter.tokens_used('u1') == 15
+
+
+def test_flush_writes_rows_and_quotas(meter, paths):
+    data_db_path, user_db_path = paths
+    meter.record('u1', 'GPT-4o', {'input_tokens': 10, 'output_tokens': 5})
+    meter.record('u1', 'GPT-4o', {'input_tokens': 1, 'output_tokens': 1})
+    meter.record('u2', 'Claude', {'input_tokens': 20, 'output_tokens': 0})
+    meter.record('u2', 'Claude', None, status_code='error')
+    meter.flush()
+
+    assert query(data_db_path, 'SELECT COUNT(*) FROM usage_metrics') == [(4,)]
+    assert token_quota(user_db_path, 'u1') == 17
+    assert token_quota(user_db_path, 'u2') == 120
+    assert meter.stats()['pending_rows'] == 0
+    assert meter.stats()['pending_users'] == 0
+    assert meter.tokens_used('u2') == 120
+
+    # Nothing left to write, so a second flush changes nothing
+    meter.flush()
+    assert token_quota(user_db_path, 'u2') == 120
+    assert meter.stats()['rows_written'] == 4
+
+
+def test_rollups_match_usage_rows(meter, paths):
+    data_db_path, _ = paths
+    meter.record('u1', 'GPT-4o', {'input_tokens': 10, 'output_tokens': 5})
+    meter.record('u1', 'GPT-4o', {'input_tokens': 1, 'output_tokens': 1}, status_code='cached')
+    meter.record('u1', 'GPT-4o', None, status_code='error')
+    meter.flush()
+    meter.record('u1', 'GPT-4o', {'input_tokens': 3, 'output_tokens': 0})
+    meter.flush()
+
+    for table, time_column, _ in ROLLUPS:
+        assert query(
+            data_db_path,
+            f'SELECT requests, errors, cached, input_tokens, output_tokens, tokens_used FROM {table}'
+        ) == [(4, 1, 1, 14, 6, 20)]
+
+    daily = meter.daily_usage(days=1)
+    assert len(daily) == 1
+    assert daily[0]['tokens_used'] == 20
+    assert meter.usage_by('model_name')[0]['model_name'] == 'GPT-4o'
+    assert sum(row['requests'] for row in meter.hourly_usage(hours=2)) == 4
+
+    # Recomputing from usage_metrics gives the same totals as the incremental upserts
+    before = query(data_db_path, 'SELECT * FROM usage_rollup_daily')
+    meter.rebuild_rollups()
+    assert query(data_db_path, 'SELECT * FROM usage_rollup_daily') == before
+
+
+def test_failed_quota_write_is_retried_once(meter, paths, tmp_path):
+    data_db_path, user_db_path = paths
+    meter.record('u2', 'Claude', {'input_tokens': 20, 'output_tokens': 5})
+
+    # user.db without user_accounts makes the quota update fail after the usage rows are in
+    meter.user_db_path = str(tmp_path / 'missing-user.db')
+    meter.flush()
+    assert meter.stats()['failed_flushes'] == 1
+    assert meter.stats()['pending_rows'] == 0
+    assert meter.stats()['pending_users'] == 1
+
+    meter.user_db_path = user_db_path
+    meter.record('u2', 'Claude', {'input_tokens': 1, 'output_tokens': 0})
+    meter.flush()
+    assert token_quota(user_db_path, 'u2') == 126
+    # The retry didn't write the first batch's rows or rollups again
+    assert query(data_db_path, 'SELECT COUNT(*) FROM usage_metrics') == [(2,)]
+    assert query(data_db_path, 'SELECT requests, tokens_used FROM usage_rollup_daily') == [(2, 26)]
+
+
+def test_failed_usage_write_keeps_rows(meter, paths, tmp_path):
+    data_db_path, user_db_path = paths
+    meter.record('u1', 'GPT-4o', {'input_tokens': 10, 'output_tokens': 0})
+
+    meter.data_db_path = str(tmp_path / 'missing-data.db')
+    meter.flush()
+    assert meter.stats()['failed_flushes'] == 1
+    assert meter.stats()['pending_rows'] == 1
+    # Quotas wait for the usage rows, so neither is written
+    assert token_quota(user_db_path, 'u1') is None
+
+    meter.data_db_path = data_db_path
+    meter.flush()
+    assert query(data_db_path, 'SELECT COUNT(*) FROM usage_metrics') == [(1,)]
+    assert token_quota(user_db_path, 'u1') == 10
+
+
+def test_close_flushes(paths):
+    data_db_path, user_db_path = paths
+    meter = UsageMeter(data_db_path, user_db_path, flush_interval=60)
+    meter.record('u1', 'GPT-4o', {'input_tokens': 2, 'output_tokens': 2})
+    meter.close()
+    assert query(data_db_path, 'SELECT COUNT(*) FROM usage_metrics') == [(1,)]
+    assert token_quota(user_db_path, 'u1') == 4
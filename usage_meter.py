@@ -0,0 +1,385 @@
+# usage_meter.py - Per-user token accounting with write-behind batching
+
+import os
+import time
+import uuid
+import sqlite3
+import threading
+import atexit
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from database.lib.database_manager import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Tokens each plan may spend; 0 means unlimited
+PLAN_TOKEN_LIMITS = {
+    'free': int(os.getenv("TOKEN_LIMIT_FREE", "10000")),
+    'pro': int(os.getenv("TOKEN_LIMIT_PRO", "1000000")),
+}
+TOKEN_LIMIT_DEFAULT = int(os.getenv("TOKEN_LIMIT_DEFAULT", "10000"))
+# How long a worker trusts its in-memory counter before re-reading token_quota,
+# which picks up what other workers have spent in the meantime
+USAGE_COUNTER_TTL = float(os.getenv("USAGE_COUNTER_TTL", "30"))
+USAGE_COUNTER_SIZE = int(os.getenv("USAGE_COUNTER_SIZE", "10000"))
+
+# (table, time column, length of the timestamp prefix that names the bucket)
+ROLLUPS = (
+    ('usage_rollup_hourly', 'hour', 13),  # '2025-06-01 14'
+    ('usage_rollup_daily', 'day', 10),  # '2025-06-01'
+)
+ROLLUP_COUNTERS = ('requests', 'errors', 'cached', 'input_tokens', 'output_tokens', 'tokens_used', 'cost_usd')
+
+def token_limit(plan):
+    """Token allowance for a subscription plan, or None if unlimited"""
+    limit = PLAN_TOKEN_LIMITS.get(plan, TOKEN_LIMIT_DEFAULT)
+    return limit or None
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def _since(timedelta_kwargs, prefix_length):
+    """Oldest bucket to include, as a timestamp prefix"""
+    since = datetime.now(timezone.utc) - timedelta(**timedelta_kwargs)
+    return since.strftime('%Y-%m-%d %H:%M:%S')[:prefix_length]
+
+
+def rollup_deltas(rows):
+    """Sum usage rows per (user, model, bucket) for each rollup table"""
+    deltas = {}
+    for table, _, prefix_length in ROLLUPS:
+        buckets = {}
+        for row in rows:
+            key = (row['user_id'], row['model_name'], row['timestamp'][:prefix_length])
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = dict.fromkeys(ROLLUP_COUNTERS, 0)
+            bucket['requests'] += 1
+            bucket['errors'] += row['status_code'] == 'error'
+            bucket['cached'] += row['status_code'] == 'cached'
+            bucket['input_tokens'] += row['input_tokens']
+            bucket['output_tokens'] += row['output_tokens']
+            bucket['tokens_used'] += row['tokens_used']
+            bucket['cost_usd'] += row['cost_usd']
+        deltas[table] = buckets
+    return deltas
+
+
+def upsert_rollups(conn, deltas):
+    """Add per-bucket deltas onto the rollup tables"""
+    updates = ', '.join(f'{counter} = {counter} + excluded.{counter}' for counter in ROLLUP_COUNTERS)
+    for table, time_column, _ in ROLLUPS:
+        conn.executemany(
+            f'''INSERT INTO {table} (user_id, model_name, {time_column}, {', '.join(ROLLUP_COUNTERS)})
+                VALUES (?, ?, ?, {', '.join('?' * len(ROLLUP_COUNTERS))})
+                ON CONFLICT (user_id, model_name, {time_column}) DO UPDATE SET {updates}''',
+            [key + tuple(bucket[counter] for counter in ROLLUP_COUNTERS) for key, bucket in deltas[table].items()]
+        )
+
+
+class UsageMeter:
+    """
+    Records provider token usage per user and keeps a running total per user.
+
+    record() only touches memory. A background writer inserts the queued
+    usage_metrics rows into data.db and adds each user's new tokens to
+    user_accounts.token_quota in user.db, each in one batched transaction, so
+    no request waits on SQLite. Quota checks read the in-memory counter,
+    which is refreshed from token_quota every `counter_ttl` seconds.
+
+    The same data.db transaction adds each batch onto hourly and daily
+    rollups keyed by (user_id, model_name, bucket), priced at the time of
+    use, so reports read O(days) rollup rows instead of every request.
+    """
+
+    def __init__(self, data_db_path, user_db_path, catalog=None, batch_size=256, flush_interval=2.0,
+                 counter_ttl=USAGE_COUNTER_TTL, counter_size=USAGE_COUNTER_SIZE):
+        self.data_db_path = data_db_path
+        self.user_db_path = user_db_path
+        self.catalog = catalog  # CatalogHolder, for per-token prices
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.counter_ttl = counter_ttl
+        self.counter_size = counter_size
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending_rows = []  # usage_metrics rows in record order
+        self._pending_tokens = {}  # user_id -> tokens not yet added to token_quota
+        self._counters = OrderedDict()  # user_id -> [tokens_used, loaded_at]
+        self._stats = {'recorded': 0, 'flushes': 0, 'rows_written': 0, 'failed_flushes': 0}
+        self._closed = False
+
+        conn = get_connection(self.data_db_path)
+        try:
+            if not conn.execute('SELECT 1 FROM usage_rollup_daily LIMIT 1').fetchone():
+                self.rebuild_rollups(conn)
+        finally:
+            conn.close()
+
+        self._writer = threading.Thread(target=self._writer_loop, name='usage-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    # --- Recording ---
+
+    def record(self, user_id, model_name, usage=None, status_code='200'):
+        """
+        Queue one provider response for accounting
+
+        Args:
+            user_id: Who the request was made for
+            model_name: The model that answered
+            usage: The result's {'input_tokens', 'output_tokens'}, or None if the provider reported none
+            status_code: '200', 'cached' or 'error'
+        """
+        usage = usage or {}
+        input_tokens = int(usage.get('input_tokens') or 0)
+        output_tokens = int(usage.get('output_tokens') or 0)
+        tokens = input_tokens + output_tokens
+        row = {
+            'usage_id': str(uuid.uuid4()),
+            'user_id': user_id,
+            'timestamp': _now(),
+            'model_name': model_name or 'unknown',
+            'tokens_used': tokens,
+            'status_code': str(status_code),
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'cost_usd': self.cost(model_name, input_tokens, output_tokens)
+        }
+        with self._lock:
+            self._pending_rows.append(row)
+            if tokens:
+                self._pending_tokens[user_id] = self._pending_tokens.get(user_id, 0) + tokens
+                counter = self._counters.get(user_id)
+                if counter:
+                    counter[0] += tokens
+            self._stats['recorded'] += 1
+            queued = len(self._pending_rows)
+        if queued >= self.batch_size:
+            self._wakeup.set()
+        return tokens
+
+    def cost(self, model_name, input_tokens, output_tokens):
+        """USD cost of a call at the model's current per-million-token prices"""
+        model = self.catalog.current.get(model_name) if self.catalog and model_name else None
+        if not model:
+            return 0.0
+        input_price = float(model.get('usd_per_million_input_tokens') or 0)
+        output_price = float(model.get('usd_per_million_output_tokens') or 0)
+        return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+    def flush(self):
+        """Write everything queued so far"""
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._pending_rows)
+                tokens = dict(self._pending_tokens)
+            if not rows and not tokens:
+                return
+
+            # The two databases commit separately; each step drops only what it committed,
+            # so a retry never adds a batch to the rollups or a user's quota twice
+            if rows:
+                try:
+                    conn = get_connection(self.data_db_path)
+                    try:
+                        with conn:
+                            conn.executemany(
+                                '''INSERT OR IGNORE INTO usage_metrics
+                                   (usage_id, user_id, timestamp, model_name, tokens_used, status_code,
+                                    input_tokens, output_tokens, cost_usd)
+                                   VALUES (:usage_id, :user_id, :timestamp, :model_name, :tokens_used, :status_code,
+                                           :input_tokens, :output_tokens, :cost_usd)''',
+                                rows
+                            )
+                            upsert_rollups(conn, rollup_deltas(rows))
+                    finally:
+                        conn.close()
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to write {len(rows)} usage records: {e}")
+                    with self._lock:
+                        self._stats['failed_flushes'] += 1
+                    return
+
+                with self._lock:
+                    del self._pending_rows[:len(rows)]
+                    self._stats['flushes'] += 1
+                    self._stats['rows_written'] += len(rows)
+
+            if tokens:
+                try:
+                    conn = get_connection(self.user_db_path)
+                    try:
+                        with conn:
+                            # Add rather than overwrite, so concurrent workers never lose each other's tokens
+                            conn.executemany(
+                                'UPDATE user_accounts SET token_quota = COALESCE(token_quota, 0) + ? WHERE user_id = ?',
+                                [(amount, user_id) for user_id, amount in tokens.items()]
+                            )
+                    finally:
+                        conn.close()
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to update token quotas for {len(tokens)} users: {e}")
+                    with self._lock:
+                        self._stats['failed_flushes'] += 1
+                    return
+
+                # More may have been recorded meanwhile; only subtract what was committed
+                with self._lock:
+                    for user_id, amount in tokens.items():
+                        remaining = self._pending_tokens.get(user_id, 0) - amount
+                        if remaining > 0:
+                            self._pending_tokens[user_id] = remaining
+                        else:
+                            self._pending_tokens.pop(user_id, None)
+
+    def rebuild_rollups(self, conn=None):
+        """Recompute both rollup tables from usage_metrics, e.g. for rows written before rollups existed"""
+        own_conn = conn is None
+        if own_conn:
+            conn = get_connection(self.data_db_path)
+        try:
+            with self._flush_lock, conn:
+                for table, time_column, prefix_length in ROLLUPS:
+                    conn.execute(f'DELETE FROM {table}')
+                    conn.execute(
+                        f'''INSERT INTO {table} (user_id, model_name, {time_column}, {', '.join(ROLLUP_COUNTERS)})
+                            SELECT user_id, model_name, substr(timestamp, 1, {prefix_length}),
+                                   COUNT(*),
+                                   SUM(status_code = 'error'),
+                                   SUM(status_code = 'cached'),
+                                   SUM(input_tokens), SUM(output_tokens), SUM(tokens_used), SUM(cost_usd)
+                            FROM usage_metrics
+                            GROUP BY user_id, model_name, substr(timestamp, 1, {prefix_length})'''
+                    )
+        finally:
+            if own_conn:
+                conn.close()
+
+    def _writer_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Flush outstanding records and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join(timeout=5)
+        self.flush()
+
+    # --- Quotas ---
+
+    def tokens_used(self, user_id):
+        """Tokens the user has spent, including ones not yet written to user.db"""
+        now = time.monotonic()
+        with self._lock:
+            counter = self._counters.get(user_id)
+            if counter and now - counter[1] < self.counter_ttl:
+                self._counters.move_to_end(user_id)
+                return counter[0]
+
+        # Holding the flush lock keeps pending tokens from moving into token_quota mid-read
+        with self._flush_lock:
+            conn = get_connection(self.user_db_path)
+            try:
+                row = conn.execute(
+                    'SELECT token_quota FROM user_accounts WHERE user_id = ?', (user_id,)
+                ).fetchone()
+            finally:
+                conn.close()
+            with self._lock:
+                used = int(row[0] or 0) if row else 0
+                used += self._pending_tokens.get(user_id, 0)
+                self._counters[user_id] = [used, now]
+                self._counters.move_to_end(user_id)
+                while len(self._counters) > self.counter_size:
+                    self._counters.popitem(last=False)
+        return used
+
+    def tokens_remaining(self, user_id, plan):
+        """Tokens left in the user's plan, or None if the plan is unlimited"""
+        limit = token_limit(plan)
+        if limit is None:
+            return None
+        return max(0, limit - self.tokens_used(user_id))
+
+    # --- Reports (rollups only) ---
+
+    def _query(self, sql, params):
+        conn = get_connection(self.data_db_path)
+        try:
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+        finally:
+            conn.close()
+
+    def daily_usage(self, days=30, user_id=None):
+        """Totals per day, oldest first, for one user or everyone"""
+        totals = ', '.join(f'SUM({counter}) AS {counter}' for counter in ROLLUP_COUNTERS)
+        user_filter = 'AND user_id = ?' if user_id else ''
+        params = (_since({'days': days - 1}, 10),) + ((user_id,) if user_id else ())
+        return self._query(
+            f'''SELECT day, {totals} FROM usage_rollup_daily
+                WHERE day >= ? {user_filter}
+                GROUP BY day ORDER BY day''',
+            params
+        )
+
+    def hourly_usage(self, hours=48, user_id=None):
+        """Totals per hour ('YYYY-MM-DD HH', UTC), oldest first"""
+        totals = ', '.join(f'SUM({counter}) AS {counter}' for counter in ROLLUP_COUNTERS)
+        user_filter = 'AND user_id = ?' if user_id else ''
+        params = (_since({'hours': hours - 1}, 13),) + ((user_id,) if user_id else ())
+        return self._query(
+            f'''SELECT hour, {totals} FROM usage_rollup_hourly
+                WHERE hour >= ? {user_filter}
+                GROUP BY hour ORDER BY hour''',
+            params
+        )
+
+    def usage_by(self, group='model_name', days=30, user_id=None):
+        """Totals per model_name or user_id over the last `days` days, most expensive first"""
+        if group not in ('model_name', 'user_id'):
+            raise ValueError(f"Can't group usage by '{group}'")
+        totals = ', '.join(f'SUM({counter}) AS {counter}' for counter in ROLLUP_COUNTERS)
+        user_filter = 'AND user_id = ?' if user_id else ''
+        params = (_since({'days': days - 1}, 10),) + ((user_id,) if user_id else ())
+        return self._query(
+            f'''SELECT {group}, {totals} FROM usage_rollup_daily
+                WHERE day >= ? {user_filter}
+                GROUP BY {group} ORDER BY cost_usd DESC, tokens_used DESC''',
+            params
+        )
+
+    def usage_by_provider(self, days=30, user_id=None):
+        """usage_by('model_name') folded into providers via the catalog"""
+        providers = {}
+        for row in self.usage_by('model_name', days, user_id):
+            model = self.catalog.current.get(row['model_name']) if self.catalog else None
+            provider_name = model['provider_name'] if model else 'unknown'
+            totals = providers.setdefault(provider_name, dict.fromkeys(ROLLUP_COUNTERS, 0))
+            for counter in ROLLUP_COUNTERS:
+                totals[counter] += row[counter] or 0
+        return sorted(
+            ({'provider_name': provider_name, **totals} for provider_name, totals in providers.items()),
+            key=lambda row: (-row['cost_usd'], -row['tokens_used'])
+        )
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._stats,
+                pending_rows=len(self._pending_rows),
+                pending_users=len(self._pending_tokens),
+                cached_counters=len(self._counters)
+            )
@@ -0,0 +1,5 @@
+# wsgi.py - WSGI entry point for servers that take a module-level app (uwsgi --module wsgi:app)
+
+from app import create_app
+
+app = create_app()